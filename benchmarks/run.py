@@ -0,0 +1,242 @@
+#!/usr/bin/env python
+"""Benchmarks of mtibattery on synthetic analyzer output files.
+
+A synthetic file is generated (see synthetic.py) and each benchmark is
+run in a fresh process, so that its peak resident memory is measured
+alone. For each benchmark the best time of several runs is reported,
+along with the throughput in records/s and MB/s of input file, the peak
+RSS of the process and its increase over the RSS before the benchmark.
+A last, untimed run is traced with tracemalloc to report the peak memory
+allocated by the benchmark itself and the memory still held by its
+result, e.g. by the Cycle and Step objects of a readings for lazy_open.
+
+Usage::
+
+    python benchmarks/run.py --cycles 1000 --steps 3 --records 300
+    python benchmarks/run.py --dialect V --only parse lazy_open
+"""
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+import collections
+import multiprocessing
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import synthetic
+
+
+#--- Benchmarks: each one gets the input file and a scratch directory,
+#    runs setup (untimed) and returns the timed callable, whose result is
+#    kept alive while measuring the memory it holds
+
+def bench_parse(filename, scratch):
+    import mtibattery
+    return lambda: mtibattery.CellReadings(filename)
+
+
+def bench_parse_python(filename, scratch):
+    import mtibattery
+    return lambda: mtibattery.CellReadings(filename, engine='python')
+
+
+def bench_parse_workers(filename, scratch):
+    import mtibattery
+    workers = min(4, os.cpu_count() or 1)
+    return lambda: mtibattery.CellReadings(filename, workers=workers)
+
+
+def bench_parse_columns(filename, scratch):
+    import mtibattery
+    return lambda: mtibattery.CellReadings(filename,
+                                           columns=['id', 'volt'])
+
+
+def bench_parse_mmap(filename, scratch):
+    #--- Each readings maps its own subdirectory of scratch, removed with it
+    import mtibattery
+    return lambda: mtibattery.CellReadings(filename, mmap=scratch)
+
+
+def bench_lazy_open(filename, scratch):
+    import mtibattery
+    return lambda: mtibattery.CellReadings(filename, lazy=True)
+
+
+def bench_summary(filename, scratch):
+    import mtibattery
+    return lambda: mtibattery.CellReadings.summary(filename)
+
+
+def bench_lazy_access(filename, scratch):
+    #--- Records of every tenth cycle of a lazy readings
+    import mtibattery
+
+    def run():
+        readings = mtibattery.CellReadings(filename, lazy=True)
+        for cycle in readings.cycles[::10]:
+            for step in cycle.steps:
+                step.records['volt']
+        return readings
+    return run
+
+
+def bench_cache_load(filename, scratch):
+    import mtibattery
+    directory = os.path.join(scratch, 'cache')
+    mtibattery.CellReadings(filename, cache=directory)
+    return lambda: mtibattery.CellReadings(filename, cache=directory)
+
+
+def bench_metrics(filename, scratch):
+    import mtibattery
+    readings = mtibattery.CellReadings(filename)
+
+    def run():
+        readings._tables = None  # rebuild the tables every run
+        return (readings.get_efficiency(),
+                readings.get_coulombic_efficiency(),
+                readings.get_capacity_fade())
+    return run
+
+
+def bench_export_npy(filename, scratch):
+    import mtibattery
+    readings = mtibattery.CellReadings(filename)
+    return lambda: readings.export(os.path.join(scratch, 'npy'))
+
+
+def bench_save_records(filename, scratch):
+    import mtibattery
+    readings = mtibattery.CellReadings(filename)
+    return lambda: readings.save_records(os.path.join(scratch,
+                                                      'records.dat'))
+
+
+def bench_plot(filename, scratch):
+    #--- Render the standard plots to PNG files
+    import mtibattery
+    from mtibattery import report
+    readings = mtibattery.CellReadings(filename)
+
+    def run():
+        readings._plots = {}  # decimate again every run
+        report.render(readings, scratch)
+    return run
+
+
+BENCHMARKS = collections.OrderedDict([
+    ('parse', bench_parse), ('parse_python', bench_parse_python),
+    ('parse_workers', bench_parse_workers),
+    ('parse_columns', bench_parse_columns), ('parse_mmap', bench_parse_mmap),
+    ('lazy_open', bench_lazy_open), ('summary', bench_summary),
+    ('lazy_access', bench_lazy_access),
+    ('cache_load', bench_cache_load), ('metrics', bench_metrics),
+    ('export_npy', bench_export_npy), ('save_records', bench_save_records),
+    ('plot', bench_plot)])
+
+
+def run_benchmark(name, filename, repeat):
+    """ Runs a benchmark (in a fresh worker process).
+
+    Parameters
+    ----------
+    name : str
+        Name of the benchmark, see BENCHMARKS
+    filename : str
+        Input file
+    repeat : int
+        Number of timed runs
+
+    Returns
+    -------
+    tuple
+        (best time in s, peak RSS in MB, peak RSS before the benchmark,
+        peak memory allocated by a traced run and memory held by its
+        result in MB)
+    """
+    scratch = tempfile.mkdtemp(prefix='mtibench-')
+    try:
+        import mtibattery  # imports are not part of the benchmark
+        from mtibattery.stats import peak_memory
+        baseline = peak_memory()
+        function = BENCHMARKS[name](filename, scratch)
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            best = min(best, time.perf_counter() - start)
+        peak = peak_memory()
+
+        tracemalloc.start()
+        result = function()
+        held, allocated = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del result
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+    return best, peak, baseline, allocated/2**20, held/2**20
+
+
+def main(argv=None):
+    arguments = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    arguments.add_argument('--cycles', type=int, default=500)
+    arguments.add_argument('--steps', type=int, default=3)
+    arguments.add_argument('--records', type=int, default=200,
+                           help='records per step')
+    arguments.add_argument('--dialect', choices=sorted(synthetic.DIALECTS),
+                           default='mV')
+    arguments.add_argument('--repeat', type=int, default=3)
+    arguments.add_argument('--file', help='benchmark an existing file '
+                           'instead of a synthetic one')
+    arguments.add_argument('--only', nargs='+', choices=list(BENCHMARKS),
+                           help='benchmarks to run, all if not given')
+    options = arguments.parse_args(argv)
+
+    scratch = tempfile.mkdtemp(prefix='mtibench-')
+    try:
+        filename = options.file
+        if filename is None:
+            filename = os.path.join(scratch, 'synthetic.txt')
+            start = time.perf_counter()
+            synthetic.write_file(filename, options.cycles, options.steps,
+                                 options.records, options.dialect)
+            print('Generated {} in {:.2f} s'.format(
+                filename, time.perf_counter() - start))
+
+        import mtibattery
+        readings = mtibattery.CellReadings(filename, lazy=True)
+        records = sum(step.record_end - step.record_start
+                      for cycle in readings.cycles for step in cycle.steps)
+        size = os.path.getsize(filename)/2**20
+        print('{} cycles, {} records, {:.1f} MB, dialect {}\n'.format(
+            len(readings.cycles), records, size, readings.schema.dialect))
+
+        row = '{:<16}{:>10}{:>14}{:>10}{:>12}{:>12}{:>12}{:>12}'
+        print(row.format('benchmark', 'time (s)', 'records/s', 'MB/s',
+                         'peak (MB)', 'delta (MB)', 'alloc (MB)',
+                         'held (MB)'))
+        context = multiprocessing.get_context('spawn')
+        for name in options.only or BENCHMARKS:
+            with context.Pool(1) as pool:
+                best, peak, baseline, allocated, held = pool.apply(
+                    run_benchmark, (name, filename, options.repeat))
+            print(row.format(
+                name, '{:.4f}'.format(best), '{:.3g}'.format(records/best),
+                '{:.1f}'.format(size/best),
+                '-' if peak is None else '{:.0f}'.format(peak),
+                '-' if peak is None else '{:.0f}'.format(peak - baseline),
+                '{:.1f}'.format(allocated), '{:.1f}'.format(held)))
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
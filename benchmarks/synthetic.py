@@ -0,0 +1,191 @@
+"""Synthetic MtiCorp Battery Analyzer output files.
+
+Files follow the analyzer output format (three column header lines, then
+cycle header, step header and record lines told apart by their leading
+tabs, CRLF newlines and a trailing tab), in either dialect:
+
+* 'mV': voltages in mV and times as H:M:S:ms, like the CuHcF files
+* 'V': voltages in V and times in decimal hours, like CuNP.txt
+
+Steps cycle through rest, charge and discharge. Voltages ramp linearly
+during charge and discharge steps and capacities grow linearly with time.
+"""
+
+import numpy as np
+
+from mtibattery.schema import DEFAULT_HEADERS
+
+#--- Labels of the steps of a cycle, repeated if a cycle has more steps
+LABELS = ('Rest', 'CC_Chg', 'CC_DChg')
+
+#--- Dialects: (voltage unit, voltage scale, time unit)
+DIALECTS = {'mV': ('mV', 1000.0, 'H:M:S:ms'), 'V': ('V', 1.0, 'H')}
+
+#--- Seconds between two records
+INTERVAL = 5
+
+#--- Voltage range of charge and discharge steps (V)
+VOLTAGES = (0.0, 0.4)
+
+#--- Current (mA) and active mass (g) of the synthetic cell
+CURRENT = 0.1
+MASS = 0.001
+
+#--- First date of the records
+START = np.datetime64('2016-01-01T00:00:00', 's')
+
+
+def column_headers(dialect='mV'):
+    """ Returns the column header lines of a dialect.
+
+    Parameters
+    ----------
+    dialect : str {'mV', 'V'}
+        Units of the file
+
+    Returns
+    -------
+    list of str
+        First three lines of the file, with CRLF newlines
+    """
+    lines = [line.replace('\n', '\r\n') for line in DEFAULT_HEADERS]
+    if dialect == 'V':
+        lines = [line.replace('(mV)', '(V)').replace('(H:M:S:ms)', '(H)')
+                 for line in lines]
+    elif dialect != 'mV':
+        raise ValueError("'dialect' argument accepts only {} parameters."
+                         .format(', '.join(repr(elem) for elem in DIALECTS)))
+    return lines
+
+
+def format_times(seconds, dialect):
+    """ Formats elapsed times as written by the analyzer.
+
+    Parameters
+    ----------
+    seconds : np.ndarray
+        Elapsed times in seconds
+    dialect : str {'mV', 'V'}
+        Units of the file
+
+    Returns
+    -------
+    list of str
+        'H:M:S:ms' times for the 'mV' dialect, decimal hours otherwise
+    """
+    if DIALECTS[dialect][2] == 'H':
+        return ['%.4f' % value for value in (seconds/3600).tolist()]
+    ms = np.round(np.asarray(seconds)*1000).astype(np.int64)
+    fields = np.column_stack((ms // 3600000, ms // 60000 % 60,
+                              ms // 1000 % 60, ms % 1000))
+    return (('%d:%02d:%02d:%03d\n'*len(ms)) % tuple(fields.ravel().tolist())
+            ).split('\n')[:-1]
+
+
+def step_records(label, first_id, start, records, dialect):
+    """ Returns the record lines of a step.
+
+    Parameters
+    ----------
+    label : str
+        Step type, see LABELS
+    first_id : int
+        Record ID of the first record
+    start : np.datetime64
+        Date of the first record
+    records : int
+        Number of records
+    dialect : str {'mV', 'V'}
+        Units of the file
+
+    Returns
+    -------
+    str
+        Record lines
+    """
+    scale = DIALECTS[dialect][1]
+    seconds = np.arange(records)*float(INTERVAL)
+    ramp = np.linspace(0, 1, records)
+    low, high = VOLTAGES
+    if label == 'CC_Chg':
+        volt, current = low + (high - low)*ramp, CURRENT
+    elif label == 'CC_DChg':
+        volt, current = high - (high - low)*ramp, -CURRENT
+    else:
+        volt, current = np.full(records, (low + high)/2), 0.0
+    capacity = abs(current)*seconds/3600  # mAh
+    dates = np.datetime_as_string(start + seconds.astype('timedelta64[s]'))
+
+    rows = np.empty((records, 9), dtype=object)
+    rows[:, 0] = np.arange(first_id, first_id + records)
+    rows[:, 1] = format_times(seconds, dialect)
+    rows[:, 2] = volt*scale
+    rows[:, 3] = current
+    rows[:, 4] = capacity
+    rows[:, 5] = capacity/MASS
+    rows[:, 6] = capacity*volt
+    rows[:, 7] = capacity*volt/MASS
+    rows[:, 8] = [date.replace('T', ' ') for date in dates.tolist()]
+    line = ('\t\t%d\t%s\t%.4f\t%.4f\t0.0\t%.4f\t%.4f\t%.4f\t%.4f\t%s\t\r\n'
+            if scale == 1 else
+            '\t\t%d\t%s\t%.1f\t%.4f\t0.0\t%.4f\t%.4f\t%.4f\t%.4f\t%s\t\r\n')
+    return (line*records) % tuple(rows.ravel().tolist())
+
+
+def write_file(filename, cycles=100, steps=3, records=100, dialect='mV'):
+    """ Writes a synthetic analyzer output file.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the output file
+    cycles : int
+        Number of cycles
+    steps : int
+        Number of steps of each cycle
+    records : int
+        Number of records of each step
+    dialect : str {'mV', 'V'}
+        Units of the file, see DIALECTS
+
+    Returns
+    -------
+    int
+        Number of records written
+    """
+    headers = column_headers(dialect)
+    scale = DIALECTS[dialect][1]
+    duration = format_times(np.array([(records - 1)*INTERVAL]), dialect)[0]
+    capacity = CURRENT*(records - 1)*INTERVAL/3600
+    volt = '%.4f' % (sum(VOLTAGES)/2*scale)
+    record_id = 1
+    date = START
+
+    with open(filename, 'w', encoding='utf-8', newline='') as output:
+        output.writelines(headers)
+        for cycle in range(1, cycles + 1):
+            output.write(
+                '%d\t%.4f\t%.4f\t%.4f\t%.4f\t100.00\t%.4f\t%.4f\t%s\t0.0000\t'
+                '0.00\t%.4f\t%.4f\t100.00\t0:00:00\t0.0000\t0.0000\t0.0000\t'
+                '%.4f\t%.4f\t100.00%%\t\r\n'
+                % (cycle, capacity, capacity, capacity/MASS, capacity/MASS,
+                   capacity*0.2, capacity*0.2, volt, capacity, capacity/MASS,
+                   capacity*0.2/MASS, capacity*0.2/MASS))
+            for index in range(steps):
+                label = LABELS[index % len(LABELS)]
+                start, end = {'CC_Chg': VOLTAGES,
+                              'CC_DChg': VOLTAGES[::-1]}.get(
+                                  label, (sum(VOLTAGES)/2,)*2)
+                step_capacity = 0.0 if label == 'Rest' else capacity
+                output.write(
+                    '\t%d\t%s\t%s\t%.4f\t%.4f\t%.4f\t%.4f\t0.0\t%.4f\t%.4f\t'
+                    '0.0\t0.0\t\r\n'
+                    % (index + 1, label, duration, step_capacity,
+                       step_capacity/MASS, step_capacity*0.2,
+                       step_capacity*0.2/MASS, start*scale, end*scale))
+                output.write(step_records(label, record_id, date, records,
+                                          dialect))
+                record_id += records
+                date += np.timedelta64(records*INTERVAL, 's')
+
+    return cycles*steps*records
@@ -1,4 +1,11 @@
 from mtibattery.mtibattery import CellReadings
 from mtibattery.mtibattery import Cycle
 from mtibattery.mtibattery import Step
-
+from mtibattery.cache import FileCache
+from mtibattery.loader import load_many
+from mtibattery.schema import Schema
+from mtibattery.export import read_export
+from mtibattery.report import render_many
+from mtibattery.stats import ParseStats
+from mtibattery.collection import CellCollection
+from mtibattery.aio import Monitor
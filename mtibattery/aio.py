@@ -0,0 +1,142 @@
+"""Loading and refreshing files from asyncio code.
+
+Parsing blocks, so the coroutines of CellReadings (aload, arefresh,
+afollow) and of Monitor run it on a bounded thread pool, keeping the event
+loop responsive. Threads are used rather than processes as the
+CellReadings objects are updated in place.
+"""
+
+import os
+import asyncio
+import threading
+import concurrent.futures
+
+#--- Threads of the default executor
+MAX_WORKERS = min(4, os.cpu_count() or 1)
+
+#--- Bytes read from a file by each refresh of a Monitor
+CHUNK_BYTES = 2**22
+
+_executor = None
+_lock = threading.Lock()
+
+
+def default_executor():
+    """ Returns the executor shared by the coroutines of the package.
+
+    Returns
+    -------
+    concurrent.futures.ThreadPoolExecutor
+        Pool of MAX_WORKERS threads, created on first use
+    """
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(
+                MAX_WORKERS, thread_name_prefix='mtibattery')
+    return _executor
+
+
+class Monitor(object):
+    """ Refreshes many files, fairly and with bounded concurrency.
+
+    A refresh reads at most max_bytes of each file, so that a file with a
+    lot of new lines does not delay the others: files with lines left are
+    refreshed again in the following rounds, after every other file had
+    its turn. At most 'concurrency' files are parsed at the same time,
+    refreshes of the same file are never run concurrently and a refresh
+    requested while one is running waits for it instead of starting
+    another (requests are coalesced).
+    """
+
+    def __init__(self, readings, executor=None, concurrency=MAX_WORKERS,
+                 max_bytes=CHUNK_BYTES):
+        """ Initialize a Monitor object.
+
+        Parameters
+        ----------
+        readings : list of CellReadings
+            Files to be refreshed
+        executor : concurrent.futures.Executor, optional
+            Thread pool running the refreshes, default_executor() if None
+        concurrency : int
+            Maximum number of files refreshed at the same time
+        max_bytes : int
+            Bytes read from a file by each refresh (the last line read is
+            always completed)
+        """
+
+        self.readings = list(readings)
+        self.executor = executor
+        self.concurrency = concurrency
+        self.max_bytes = max_bytes
+        self._round = None  # running refresh of all the files
+
+    async def _refresh_one(self, readings, slots):
+        #--- Refresh a file by at most max_bytes, return (new, more left)
+        async with slots:
+            position = readings._position
+            new = await readings.arefresh(self.executor, self.max_bytes)
+        return new, readings._position - position >= self.max_bytes
+
+    async def _refresh_all(self):
+        #--- Rounds of refreshes until every file is up to date
+        slots = asyncio.Semaphore(self.concurrency)
+        results = [[] for _ in self.readings]
+        pending = list(range(len(self.readings)))
+        while pending:
+            outcomes = await asyncio.gather(*[
+                self._refresh_one(self.readings[index], slots)
+                for index in pending])
+            more = []
+            for index, (new, left) in zip(pending, outcomes):
+                # the last known step is returned again if it grew
+                if results[index] and new and new[0] is results[index][-1]:
+                    new = new[1:]
+                results[index].extend(new)
+                if left:
+                    more.append(index)
+            pending = more
+        return results
+
+    async def refresh(self):
+        """ Parses the lines appended to the files since the last refresh.
+
+        Returns
+        -------
+        list of list
+            Objects created for each file, see CellReadings.refresh
+        """
+        if self._round is None or self._round.done():
+            self._round = asyncio.ensure_future(self._refresh_all())
+        return await asyncio.shield(self._round)
+
+    async def follow(self, interval=1.0, timeout=None):
+        """ Yields cycles and steps as they are appended to the files.
+
+        Parameters
+        ----------
+        interval : float
+            Seconds to wait before checking the files again when no new
+            lines are found
+        timeout : float, optional
+            Stop once no new lines are found for timeout seconds. If None,
+            follow the files forever.
+
+        Yields
+        ------
+        tuple
+            (readings, obj) for each Cycle or Step object returned by
+            refresh, readings being the CellReadings object it belongs to
+        """
+        idle = 0.0
+        while timeout is None or idle < timeout:
+            results = await self.refresh()
+            if any(results):
+                idle = 0.0
+                for readings, new in zip(self.readings, results):
+                    for obj in new:
+                        yield readings, obj
+            else:
+                await asyncio.sleep(interval)
+                idle += interval
@@ -0,0 +1,256 @@
+"""On-disk cache of parsed battery analyzer files.
+
+Each cached file is stored in its own directory, containing a .npy file
+for each record column and a JSON file with the column headers, the cycle
+and step header lines and the signature of the source file. An entry is
+discarded as soon as the size, the modification time or the content digest
+of the source file changes.
+"""
+
+import os
+import json
+import shutil
+import logging
+import hashlib
+import tempfile
+
+import numpy as np
+
+#--- Default maximum size of the cache directory (bytes)
+MAX_SIZE = 2 * 2**30
+
+#--- Bytes hashed at the beginning and at the end of a source file
+DIGEST_SPAN = 2**20
+
+#--- Version of the layout of cache entries
+VERSION = 5
+
+logger = logging.getLogger(__name__)
+
+
+def default_directory():
+    """ Returns the default cache directory.
+
+    Returns
+    -------
+    str
+        $XDG_CACHE_HOME/mtibattery, ~/.cache/mtibattery if unset
+    """
+    root = os.environ.get('XDG_CACHE_HOME',
+                          os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(root, 'mtibattery')
+
+
+def signature(filename):
+    """ Returns size, modification time and content digest of a file.
+
+    The digest covers the first and the last DIGEST_SPAN bytes of the file,
+    so that it can be computed in constant time.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the file
+
+    Returns
+    -------
+    dict
+        Contains 'size', 'mtime_ns' and 'digest' of the file
+    """
+    stat = os.stat(filename)
+    digest = hashlib.blake2b(digest_size=16)
+
+    with open(filename, 'rb') as data:
+        digest.update(data.read(DIGEST_SPAN))
+        if stat.st_size > DIGEST_SPAN:
+            data.seek(max(DIGEST_SPAN, stat.st_size - DIGEST_SPAN))
+            digest.update(data.read())
+
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns,
+            'digest': digest.hexdigest()}
+
+
+class FileCache(object):
+    """ Size-bounded, least recently used cache of parsed files.
+    """
+
+    def __init__(self, directory=None, max_size=MAX_SIZE):
+        """ Initialize a FileCache object.
+
+        Parameters
+        ----------
+        directory : str, optional
+            Cache directory, default_directory() if None
+        max_size : int
+            Maximum size of the cache directory in bytes. Least recently
+            used entries are evicted once it is exceeded.
+        """
+
+        self.directory = directory or default_directory()
+        self.max_size = max_size
+
+    def _entry(self, filename, variant=''):
+        #--- Directory of the cache entry of a file
+        key = os.path.abspath(filename) + '\0' + variant
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, name)
+
+    def load(self, filename, variant=''):
+        """ Loads a parsed file from the cache.
+
+        Parameters
+        ----------
+        filename : str
+            Name of the source file
+        variant : str
+            Distinguishes entries of the same file parsed with different
+            options
+
+        Returns
+        -------
+        tuple or None
+            (column_headers, headers, columns, position, tail) as given to
+            save,
+            with columns memory mapped from the cache. None if the file is
+            not cached or if the entry is stale.
+        """
+        entry = self._entry(filename, variant)
+        try:
+            with open(os.path.join(entry, 'meta.json'), 'r',
+                      encoding='utf-8') as meta_file:
+                meta = json.load(meta_file)
+        except (OSError, ValueError):
+            return None
+
+        if (meta.get('version') != VERSION
+                or meta['signature'] != signature(filename)):
+            shutil.rmtree(entry, ignore_errors=True)
+            return None
+
+        columns = [(name, np.load(os.path.join(entry, name + '.npy'),
+                                  mmap_mode='r' if size else None))
+                   for name, size in meta['columns']]
+
+        #--- Mark entry as recently used
+        os.utime(os.path.join(entry, 'meta.json'))
+
+        return (meta['column_headers'], meta['headers'], columns,
+                meta['position'], meta['tail'])
+
+    def save(self, filename, column_headers, headers, columns, position,
+             variant='', sig=None, tail=None):
+        """ Stores a parsed file in the cache and evicts old entries.
+
+        Parameters
+        ----------
+        filename : str
+            Name of the source file
+        column_headers : list of str
+            First three lines of the file
+        headers : list
+            (kind, line, n_records) for each cycle and step header line
+        columns : collections.OrderedDict
+            Contains an array for each record column
+        position : int
+            Byte offset in the file following the last complete line parsed
+        variant : str
+            Distinguishes entries of the same file parsed with different
+            options
+        sig : dict, optional
+            Signature of the source file when it was read, computed now if
+            None
+        tail : int, optional
+            Kind of the last line of the file if it has no newline and was
+            parsed after position
+
+        Returns
+        -------
+        bool
+            False if the entry could not be written (e.g. full disk or
+            read-only cache directory), which is logged as a warning
+        """
+        entry = self._entry(filename, variant)
+
+        #--- Write to a temporary directory and move it into place
+        tmp = None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = tempfile.mkdtemp(dir=self.directory, prefix='.tmp-')
+            for name, column in columns.items():
+                np.save(os.path.join(tmp, name + '.npy'), column)
+
+            meta = {'version': VERSION,
+                    'source': os.path.abspath(filename),
+                    'signature': sig or signature(filename),
+                    'column_headers': column_headers,
+                    'headers': [list(header) for header in headers],
+                    'columns': [(name, len(column))
+                                for name, column in columns.items()],
+                    'position': position,
+                    'tail': tail}
+            with open(os.path.join(tmp, 'meta.json'), 'w',
+                      encoding='utf-8') as meta_file:
+                meta_file.write(json.dumps(meta))
+
+            shutil.rmtree(entry, ignore_errors=True)
+            os.rename(tmp, entry)
+        except OSError as error:
+            if tmp is not None:
+                shutil.rmtree(tmp, ignore_errors=True)
+            logger.warning("Could not cache file %s in %s: %s", filename,
+                           self.directory, error)
+            return False
+
+        self.evict(keep=entry)
+        return True
+
+    def entries(self):
+        """ Returns the entries of the cache.
+
+        Returns
+        -------
+        list of tuple
+            (path, size, last_used) of each entry, least recently used first
+        """
+        if not os.path.isdir(self.directory):
+            return []
+
+        entries = []
+        for name in os.listdir(self.directory):
+            entry = os.path.join(self.directory, name)
+            meta = os.path.join(entry, 'meta.json')
+            if name.startswith('.') or not os.path.isfile(meta):
+                continue
+            try:
+                size = sum(os.path.getsize(os.path.join(entry, elem))
+                           for elem in os.listdir(entry))
+                entries.append((entry, size, os.path.getmtime(meta)))
+            except OSError:
+                continue  # removed meanwhile, e.g. by another process
+
+        return sorted(entries, key=lambda elem: elem[2])
+
+    def evict(self, keep=None):
+        """ Removes least recently used entries exceeding max_size.
+
+        Parameters
+        ----------
+        keep : str, optional
+            Entry that must not be evicted
+        """
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+
+        for entry, size, _ in entries:
+            if total <= self.max_size:
+                break
+            if entry == keep:
+                continue
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= size
+
+    def clear(self):
+        """ Removes all the entries of the cache.
+        """
+        for entry, _, _ in self.entries():
+            shutil.rmtree(entry, ignore_errors=True)
@@ -0,0 +1,470 @@
+"""Summary metrics of many cells, stacked for fleet-wide comparisons.
+
+A CellCollection keeps the cycle and step tables of many files (see
+metrics.build_tables) concatenated into single tables, with the cell of
+each row. Metrics of all the cells are computed at once on these tables,
+and grouped by cell, by cycle (or bucket of cycles) or by step type with
+whole-array operations. Records are not kept: they are loaded from the
+per-file cache when needed, see CellCollection.readings.
+"""
+
+import os
+import warnings
+
+import numpy as np
+
+from . import metrics
+from .cache import FileCache
+from .loader import load_many
+from .mtibattery import CellReadings, Cycle
+
+#--- Per-cycle metrics computed from the cycle table, besides its fields
+METRICS = ('retention', 'capacity_fade', 'coulombic_efficiency',
+           'efficiency', 'hysteresis')
+
+#--- Reductions of group_by (q percentiles are given apart)
+STATISTICS = {'mean': np.nanmean, 'median': np.nanmedian, 'min': np.nanmin,
+              'max': np.nanmax, 'std': np.nanstd, 'sum': np.nansum}
+
+
+def group_by(keys, values, statistic='mean', q=None):
+    """ Reduces values by group.
+
+    Values are laid out in a (groups, largest group) array padded with nan,
+    which is reduced along its rows, so that every statistic (percentiles
+    included) is computed with a single call.
+
+    Parameters
+    ----------
+    keys : np.ndarray or list of np.ndarray
+        Group of each value. Several arrays of keys group by their
+        combinations.
+    values : np.ndarray
+        Values to be reduced, nan values are ignored
+    statistic : str
+        Reduction, see STATISTICS, 'count' (number of values that are not
+        nan) or 'percentile'
+    q : float or sequence of float
+        Percentiles (0-100) if statistic is 'percentile'
+
+    Returns
+    -------
+    groups : np.ndarray
+        Sorted unique keys (a structured array with fields 'f0', 'f1'...
+        for several arrays of keys)
+    result : np.ndarray
+        Reduction of each group, with one column per percentile if q is a
+        sequence
+    """
+    if statistic not in STATISTICS and statistic not in ('count',
+                                                         'percentile'):
+        raise ValueError("'statistic' argument accepts only {} parameters."
+                         .format(', '.join(repr(elem) for elem in
+                                           list(STATISTICS)
+                                           + ['count', 'percentile'])))
+    if statistic == 'percentile' and q is None:
+        raise ValueError("'q' argument is needed for percentiles.")
+
+    values = np.asarray(values, dtype=np.float64)
+    if isinstance(keys, (list, tuple)):
+        combined = np.empty(len(values), dtype=[
+            ('f{}'.format(index), np.asarray(key).dtype)
+            for index, key in enumerate(keys)])
+        for index, key in enumerate(keys):
+            combined['f{}'.format(index)] = key
+        keys = combined
+    groups, inverse = np.unique(np.asarray(keys), return_inverse=True)
+    inverse = inverse.ravel()
+
+    if statistic == 'count':
+        return groups, np.bincount(inverse, weights=~np.isnan(values),
+                                   minlength=len(groups)).astype(np.int64)
+
+    #--- Padded (groups, largest group) array
+    order = np.argsort(inverse, kind='stable')
+    counts = np.bincount(inverse, minlength=len(groups))
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    rows = inverse[order]
+    padded = np.full((len(groups), counts.max() if len(counts) else 0),
+                     np.nan)
+    padded[rows, np.arange(len(values)) - starts[rows]] = values[order]
+
+    with warnings.catch_warnings():
+        # all-nan groups give nan
+        warnings.simplefilter('ignore', RuntimeWarning)
+        if statistic == 'percentile':
+            result = np.nanpercentile(padded, q, axis=1)
+            return groups, result.T if np.ndim(q) else result
+        return groups, STATISTICS[statistic](padded, axis=1)
+
+
+class CellCollection(object):
+    """ Summary data of many battery analyzer files.
+
+    Attributes
+    ----------
+    names : list of str
+        Name of each cell
+    paths : list of str
+        Input file of each cell
+    cycle_table : np.ndarray
+        Cycle tables of all the cells, one after the other
+    step_table : np.ndarray
+        Step tables of all the cells. Their 'cycle_index' field is the row
+        of the cycle in cycle_table.
+    cycle_cells, step_cells : np.ndarray
+        Cell of each row of cycle_table and step_table
+    offsets : np.ndarray
+        First row of each cell in cycle_table, followed by its length
+    errors : dict
+        Exception raised by each file that failed to load, by path
+    """
+
+    def __init__(self, paths, names=None, workers=None, cache=True,
+                 progress=None):
+        """ Load the summary data of many files.
+
+        Only cycle and step headers are read (see load_many), records are
+        never parsed here.
+
+        Parameters
+        ----------
+        paths : list of str
+            Names of the input files
+        names : list of str, optional
+            Name of each cell, file names without extension if None
+        workers : int, optional
+            Number of worker processes, see load_many
+        cache : bool, str or FileCache
+            Cache from which records are loaded by readings, see
+            CellReadings. If False, files are parsed again each time.
+        progress : callable, optional
+            Called as progress(done, total, filename, error), see load_many
+        """
+
+        self._set_cache(cache)
+        if names is None:
+            names = [os.path.splitext(os.path.basename(path))[0]
+                     for path in paths]
+        readings, self.errors = load_many(paths, workers, summary=True,
+                                          cache=False, progress=progress)
+        loaded = [index for index, elem in enumerate(readings)
+                  if elem is not None]
+        self._build([paths[index] for index in loaded],
+                    [names[index] for index in loaded],
+                    [readings[index] for index in loaded])
+
+    @classmethod
+    def from_readings(cls, readings, names=None, cache=False):
+        """ Build a CellCollection from loaded files.
+
+        Parameters
+        ----------
+        readings : list of CellReadings
+            Loaded files, which are not kept
+        names : list of str, optional
+            Name of each cell, file names without extension if None
+        cache : bool, str or FileCache
+            Cache from which records are loaded by readings
+
+        Returns
+        -------
+        CellCollection
+        """
+        collection = cls.__new__(cls)
+        collection._set_cache(cache)
+        collection.errors = {}
+        paths = [elem.filename for elem in readings]
+        if names is None:
+            names = [os.path.splitext(os.path.basename(path))[0]
+                     for path in paths]
+        collection._build(paths, list(names), readings)
+        return collection
+
+    def _set_cache(self, cache):
+        if cache is True:
+            cache = FileCache()
+        elif isinstance(cache, str):
+            cache = FileCache(cache)
+        self.cache = cache or None  # FileCache or None
+
+    def _build(self, paths, names, readings):
+        #--- Concatenate the tables of the cells, dropping their readings
+        self.paths = paths
+        self.names = names
+        cycle_tables = [elem.cycle_table for elem in readings]
+        step_tables = [elem.step_table for elem in readings]
+
+        lengths = [len(table) for table in cycle_tables]
+        self.offsets = np.concatenate(([0], np.cumsum(lengths))).astype(
+            np.int64)
+        self.cycle_cells = np.repeat(np.arange(len(paths)), lengths)
+        self.step_cells = np.repeat(np.arange(len(paths)),
+                                    [len(table) for table in step_tables])
+
+        dtype = metrics.cycle_dtype(Cycle.head_entries)
+        self.cycle_table = np.concatenate(cycle_tables) if cycle_tables \
+            else np.empty(0, dtype=dtype)
+        self.step_table = np.concatenate(step_tables) if step_tables \
+            else np.empty(0, dtype=metrics.STEP_FIELDS)
+        self.step_table['cycle_index'] += self.offsets[self.step_cells]
+        self._metrics = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __repr__(self):
+        return 'CellCollection({} cells, {} cycles)'.format(
+            len(self), len(self.cycle_table))
+
+    def cell(self, name):
+        """ Returns the index of a cell.
+
+        Parameters
+        ----------
+        name : str or int
+            Name of the cell, or its index
+
+        Returns
+        -------
+        int
+            Index of the cell
+
+        Raises
+        ------
+        KeyError
+            If there is no cell with this name
+        """
+        if isinstance(name, (int, np.integer)):
+            return int(name)
+        try:
+            return self.names.index(name)
+        except ValueError:
+            raise KeyError("No cell named '{}'".format(name)) from None
+
+    @property
+    def cycle_positions(self):
+        """ np.ndarray: position of each row of cycle_table in its cell.
+        """
+        return np.arange(len(self.cycle_table)) \
+            - self.offsets[self.cycle_cells]
+
+    def metric(self, name, reference=0):
+        """ Returns a per-cycle metric of all the cells.
+
+        Parameters
+        ----------
+        name : str
+            One of METRICS or a field of cycle_table:
+
+            * 'retention': discharge capacity over that of the reference
+              cycle of the cell
+            * 'capacity_fade': 1 - retention
+            * 'coulombic_efficiency': see CellReadings
+            * 'efficiency': discharge over charge time, see CellReadings
+            * 'hysteresis': mean charge voltage minus mean discharge
+              voltage (energy over capacity), in V
+        reference : int
+            Position of the reference cycle in each cell (retention and
+            capacity_fade), nan for cells with fewer cycles
+
+        Returns
+        -------
+        np.ndarray
+            Value for each row of cycle_table
+        """
+        table = self.cycle_table
+        if name not in METRICS:
+            if name not in table.dtype.names:
+                raise KeyError("Unknown metric '{}', metrics are {} and the "
+                               "fields of cycle_table".format(name, METRICS))
+            return table[name]
+
+        key = (name, reference if name in ('retention', 'capacity_fade')
+               else None)
+        if key not in self._metrics:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                if name in ('retention', 'capacity_fade'):
+                    capacity = table['discharge_capacity_sp']
+                    rows = self.offsets[:-1] + reference
+                    valid = rows < self.offsets[1:]
+                    first = np.full(len(self), np.nan)
+                    first[valid] = capacity[rows[valid]]
+                    values = capacity/first[self.cycle_cells]
+                    if name == 'capacity_fade':
+                        values = 1 - values
+                elif name == 'coulombic_efficiency':
+                    values = metrics.coulombic_efficiency(table)
+                elif name == 'efficiency':
+                    values = metrics.efficiency(table, self.step_table)
+                else:
+                    values = (table['charge_energy']/table['charge_capacity']
+                              - table['discharge_energy']
+                              / table['discharge_capacity'])
+            self._metrics[key] = values
+        return self._metrics[key]
+
+    def padded(self, values, fill=np.nan):
+        """ Lays out per-cycle values as a (cells, cycles) array.
+
+        Parameters
+        ----------
+        values : str or np.ndarray
+            Metric (see metric) or value for each row of cycle_table
+        fill : float
+            Value after the last cycle of shorter cells
+
+        Returns
+        -------
+        np.ndarray
+            Array with a row per cell and as many columns as the cycles of
+            the longest cell
+        """
+        if isinstance(values, str):
+            values = self.metric(values)
+        lengths = np.diff(self.offsets)
+        table = np.full((len(self), lengths.max() if len(lengths) else 0),
+                        fill, dtype=np.result_type(values, type(fill)))
+        table[self.cycle_cells, self.cycle_positions] = values
+        return table
+
+    def ragged(self, values):
+        """ Splits per-cycle values by cell.
+
+        Parameters
+        ----------
+        values : str or np.ndarray
+            Metric (see metric) or value for each row of cycle_table
+
+        Returns
+        -------
+        list of np.ndarray
+            Values of each cell (views of values)
+        """
+        if isinstance(values, str):
+            values = self.metric(values)
+        return np.split(values, self.offsets[1:-1])
+
+    def _keys(self, by, cells, positions, labels=None, bucket=1):
+        #--- Arrays of keys of group_by
+        if isinstance(by, str):
+            by = (by,)
+        keys = []
+        for name in by:
+            if name == 'cell':
+                keys.append(cells)
+            elif name == 'cycle':
+                keys.append(positions // bucket)
+            elif name == 'label' and labels is not None:
+                keys.append(labels)
+            else:
+                raise ValueError("'by' argument accepts only 'cell', 'cycle'"
+                                 "{} parameters.".format(
+                                     " or 'label'" if labels is not None
+                                     else ''))
+        return keys if len(keys) > 1 else keys[0]
+
+    def group_cycles(self, values, by='cycle', bucket=1, statistic='mean',
+                     q=None):
+        """ Reduces per-cycle values over groups of cycles.
+
+        For example the mean retention curve of the cells is
+        group_cycles('retention'), its 10th and 90th percentiles
+        group_cycles('retention', statistic='percentile', q=[10, 90]) and the
+        median efficiency of each cell group_cycles('efficiency', 'cell',
+        statistic='median').
+
+        Parameters
+        ----------
+        values : str or np.ndarray
+            Metric (see metric) or value for each row of cycle_table
+        by : str or tuple of str {'cell', 'cycle'}
+            Groups cycles by cell, by position in their cell, or both
+        bucket : int
+            Number of consecutive cycles grouped together by 'cycle'
+        statistic : str
+            Reduction, see group_by
+        q : float or sequence of float
+            Percentiles, see group_by
+
+        Returns
+        -------
+        groups : np.ndarray
+            Groups: cell indices, first cycle positions // bucket, or a
+            structured array of both
+        result : np.ndarray
+            Reduction of each group
+        """
+        if isinstance(values, str):
+            values = self.metric(values)
+        keys = self._keys(by, self.cycle_cells, self.cycle_positions,
+                          bucket=bucket)
+        return group_by(keys, values, statistic, q)
+
+    def group_steps(self, field, by='label', bucket=1, statistic='mean',
+                    q=None, label=None):
+        """ Reduces a step field over groups of steps.
+
+        For example the mean duration of each step type is
+        group_steps('duration') and the mean discharge capacity of each
+        cell group_steps('capacity', 'cell', label='CC_DChg').
+
+        Parameters
+        ----------
+        field : str or np.ndarray
+            Field of step_table, or value for each of its rows
+        by : str or tuple of str {'cell', 'cycle', 'label'}
+            Groups steps by cell, by position of their cycle in the cell, by
+            step type, or by combinations of them
+        bucket : int
+            Number of consecutive cycles grouped together by 'cycle'
+        statistic : str
+            Reduction, see group_by
+        q : float or sequence of float
+            Percentiles, see group_by
+        label : str, optional
+            Only reduce steps with this label
+
+        Returns
+        -------
+        groups : np.ndarray
+            Groups, see group_cycles
+        result : np.ndarray
+            Reduction of each group
+        """
+        table = self.step_table
+        values = table[field] if isinstance(field, str) else field
+        positions = self.cycle_positions[table['cycle_index']]
+        keys = self._keys(by, self.step_cells, positions, table['label'],
+                          bucket)
+        if label is not None:
+            mask = table['label'] == label
+            keys = [key[mask] for key in keys] if isinstance(keys, list) \
+                else keys[mask]
+            values = values[mask]
+        return group_by(keys, values, statistic, q)
+
+    def readings(self, cell, lazy=False, columns=None):
+        """ Loads the records of a cell.
+
+        Records are loaded from the cache of the collection (memory mapped)
+        if available, and saved to it otherwise. The returned object is not
+        kept by the collection.
+
+        Parameters
+        ----------
+        cell : str or int
+            Name or index of the cell
+        lazy : bool
+            If True, records are parsed on first access, see CellReadings
+        columns : list of str, optional
+            Record columns to be loaded, see CellReadings
+
+        Returns
+        -------
+        CellReadings
+            Loaded file
+        """
+        return CellReadings(self.paths[self.cell(cell)],
+                            cache=self.cache or False, lazy=lazy,
+                            columns=columns)
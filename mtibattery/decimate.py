@@ -0,0 +1,111 @@
+"""Decimation of the series drawn by the plot methods.
+
+A plot a few thousand pixels wide cannot show more points than that, but
+matplotlib still processes every point it is given. Series are reduced
+before being plotted by splitting them in buckets of consecutive points
+and keeping, in each bucket, the first and last points and those where x
+and y reach their minimum and maximum. The extremes of the series survive
+decimation, so that the decimated line covers the same pixels as the full
+one.
+"""
+
+import numpy as np
+
+#--- Default number of buckets of a decimated series
+POINTS = 2000
+
+
+def minmax_indices(x, y, points=POINTS):
+    """ Returns the indices of the points kept by min/max decimation.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        Abscissas of the series
+    y : np.ndarray
+        Ordinates of the series
+    points : int
+        Number of buckets the series is split in. Series with less than
+        4*points points are not decimated.
+
+    Returns
+    -------
+    np.ndarray
+        Sorted indices of at most 5*points + 1 points of the series: the
+        first point of each bucket, its extremes and the last point
+    """
+    size = len(y)
+    if size <= 4*points:
+        return np.arange(size)
+
+    #--- Equal buckets, the last one padded with the last point
+    width = -(-size // points)
+    pad = points*width - size
+
+    def extremes(values):
+        table = np.pad(np.asarray(values, dtype=np.float64), (0, pad),
+                       mode='edge').reshape(points, width)
+        return np.concatenate((table.argmin(1), table.argmax(1)))
+
+    starts = np.arange(points)*width
+    offsets = np.concatenate((extremes(x), extremes(y)))
+    indices = np.concatenate((starts, np.tile(starts, 4) + offsets,
+                              [size - 1]))
+    return np.unique(np.minimum(indices, size - 1))
+
+
+def decimate(x, y, points=POINTS):
+    """ Reduces a series to at most 5*points + 1 points (min/max decimation).
+
+    Parameters
+    ----------
+    x : np.ndarray
+        Abscissas of the series
+    y : np.ndarray
+        Ordinates of the series
+    points : int or None
+        Number of buckets, see minmax_indices. If None, the series is
+        returned unchanged.
+
+    Returns
+    -------
+    x : np.ndarray
+        Abscissas of the points kept
+    y : np.ndarray
+        Ordinates of the points kept
+    """
+    if points is None:
+        return x, y
+    indices = minmax_indices(x, y, points)
+    if len(indices) == len(y):
+        return x, y
+    return x[indices], y[indices]
+
+
+def segments(x, y, bounds, points=POINTS):
+    """ Splits a concatenation of series and decimates each one of them.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        Abscissas of the concatenated series
+    y : np.ndarray
+        Ordinates of the concatenated series
+    bounds : list of int
+        Length of each series
+    points : int or None
+        Number of buckets of each series, see decimate
+
+    Returns
+    -------
+    list of np.ndarray
+        (n, 2) array of the points of each non-empty series, as expected by
+        matplotlib.collections.LineCollection
+    """
+    ends = np.cumsum(bounds)
+    result = []
+    for start, end in zip(ends - bounds, ends):
+        if end > start:
+            xs, ys = decimate(x[start:end], y[start:end], points)
+            result.append(np.column_stack((xs, ys)))
+    return result
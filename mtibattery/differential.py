@@ -0,0 +1,475 @@
+"""Differential analysis of steps: incremental capacity (dQ/dV) and
+differential voltage (dV/dQ).
+
+A derivative dy/dx is computed on a uniform grid of x (voltage for dQ/dV,
+capacity for dV/dQ), for many rows (cycles) at once:
+
+* 'binned': the increments of y between consecutive records are summed in
+  the bin of the grid containing their midpoint x and divided by the bin
+  width, with a single np.bincount for all the rows. Robust to noisy,
+  non-monotonic x.
+* 'resampled': y is interpolated on the grid and differentiated along it.
+
+The result can be smoothed along the grid with a Savitzky-Golay filter
+('savgol') or a moving average ('mean'). Both are computed with numpy
+only. Derivatives are signed: dQ/dV is negative on discharge.
+"""
+
+import numpy as np
+
+#--- Default number of points of a grid
+POINTS = 200
+
+#--- Smoothing methods
+SMOOTHINGS = (None, 'savgol', 'mean')
+
+#--- Differentiation methods
+METHODS = ('binned', 'resampled')
+
+#--- Derivatives: kind -> (x, y), 'capacity' standing for the capacity
+#    record column
+KINDS = {'dqdv': ('volt', 'capacity'), 'dvdq': ('capacity', 'volt')}
+
+#--- Step attribute holding the total of each capacity record column
+STEP_CAPACITIES = {'capacity': 'capacity', 'sp_capacity': 'specific_capacity'}
+
+
+def uniform_grid(low, high, points=POINTS):
+    """ Returns a uniform grid covering an interval.
+
+    Parameters
+    ----------
+    low : float
+        First point of the grid
+    high : float
+        Last point of the grid
+    points : int
+        Number of points
+
+    Returns
+    -------
+    np.ndarray
+        Centers of the bins of the grid
+    """
+    return np.linspace(low, high, points)
+
+
+def _spacing(grid):
+    #--- Spacing of a uniform grid
+    grid = np.asarray(grid, dtype=np.float64)
+    if grid.ndim != 1 or len(grid) < 2:
+        raise ValueError("'grid' must be a 1d array of at least 2 points.")
+    spacing = (grid[-1] - grid[0])/(len(grid) - 1)
+    if not spacing > 0:
+        raise ValueError("'grid' must be increasing.")
+    return grid, spacing
+
+
+def _polynomial_rows(positions, order, deriv=0):
+    #--- Rows evaluating the deriv-th derivative of a polynomial at positions
+    positions = np.asarray(positions, dtype=np.float64)[:, None]
+    powers = np.arange(order + 1)
+    factors = np.ones(order + 1)
+    for step in range(deriv):
+        factors *= np.maximum(powers - step, 0)
+    return factors*positions**np.maximum(powers - deriv, 0)
+
+
+def savgol_coefficients(window, order, deriv=0):
+    """ Returns the coefficients of a Savitzky-Golay filter.
+
+    Parameters
+    ----------
+    window : int
+        Odd number of points of the filter
+    order : int
+        Order of the fitted polynomial, lower than window
+    deriv : int
+        Order of the derivative computed by the filter (for a unit spacing)
+
+    Returns
+    -------
+    np.ndarray
+        Coefficients to be correlated with the data
+    """
+    if window % 2 != 1 or window <= order:
+        raise ValueError("'window' must be odd and larger than 'order'.")
+    half = window // 2
+    powers = np.arange(-half, half + 1)[:, None] ** np.arange(order + 1)
+    # row deriv of the pseudo-inverse fits the deriv-th coefficient
+    factorial = np.prod(np.arange(1, deriv + 1))
+    return np.linalg.pinv(powers)[deriv]*factorial
+
+
+def _valid_range(table):
+    #--- First and last non-nan column and number of non-nan values per row
+    valid = ~np.isnan(table)
+    points = table.shape[1]
+    first = valid.argmax(1)
+    last = points - 1 - valid[:, ::-1].argmax(1)
+    return valid, first, last, valid.sum(1)
+
+
+def _gradient(table, first, last, count):
+    #--- Derivative along the rows, one-sided at the ends of the valid range
+    if table.shape[1] < 2:
+        return np.full(table.shape, np.nan)
+    result = np.gradient(table, axis=1)
+    rows = np.flatnonzero(count >= 2)
+    start, end = first[rows], last[rows]
+    result[rows, start] = table[rows, start + 1] - table[rows, start]
+    result[rows, end] = table[rows, end] - table[rows, end - 1]
+    return result
+
+
+def _savgol_edges(table, result, first, last, count, window, order, deriv):
+    #--- Fits the first and last windows of the valid range of each row,
+    #    like the 'interp' mode of scipy.signal.savgol_filter
+    half = window // 2
+    fit = np.linalg.pinv(_polynomial_rows(np.arange(window), order))
+    heads = _polynomial_rows(np.arange(half), order, deriv).dot(fit)
+    tails = _polynomial_rows(np.arange(window - half, window), order,
+                             deriv).dot(fit)
+
+    rows = np.flatnonzero(count >= window)
+    offsets = np.arange(window)
+    for start, edge, columns in (
+            (first[rows], heads, np.arange(half)),
+            (last[rows] - window + 1, tails, np.arange(window - half,
+                                                       window))):
+        values = table[rows[:, None], start[:, None] + offsets]
+        result[rows[:, None], start[:, None] + columns] = values.dot(edge.T)
+
+    #--- Rows shorter than the window: a single fit of lower order
+    for row in np.flatnonzero((count > 0) & (count < window)):
+        start, end = first[row], last[row] + 1
+        positions = np.arange(end - start)
+        degree = min(order, len(positions) - 1)
+        coefficients = np.linalg.pinv(_polynomial_rows(positions, degree))
+        result[row, start:end] = _polynomial_rows(
+            positions, degree, deriv).dot(coefficients).dot(
+                table[row, start:end])
+    return result
+
+
+def smooth(table, smoothing='savgol', window=9, order=2, deriv=0):
+    """ Smooths (and differentiates) the rows of a table.
+
+    Each row is smoothed within its range of values, nan values being only
+    allowed before and after it. Near the ends of the range, the
+    Savitzky-Golay filter evaluates the polynomial fitted to the first (or
+    last) window of values, and the moving average is taken over a window
+    narrowed to stay centered within the range.
+
+    Parameters
+    ----------
+    table : np.ndarray
+        2d array, one series per row
+    smoothing : str {'savgol', 'mean'} or None
+        Savitzky-Golay filter or moving average. If None, the table is
+        returned unchanged (or differentiated with np.gradient).
+    window : int
+        Odd number of points of the filter
+    order : int
+        Order of the Savitzky-Golay polynomial
+    deriv : int {0, 1}
+        If 1, return the derivative along the rows (for a unit spacing)
+
+    Returns
+    -------
+    np.ndarray
+        Smoothed table, same shape as table, nan outside the range of each
+        row
+    """
+    if smoothing not in SMOOTHINGS:
+        raise ValueError("'smoothing' argument accepts only {} parameters."
+                         .format(', '.join(repr(elem)
+                                           for elem in SMOOTHINGS)))
+    table = np.asarray(table, dtype=np.float64)
+    if table.shape[1] == 0:
+        return table
+    valid, first, last, count = _valid_range(table)
+    if smoothing is None:
+        return _gradient(table, first, last, count) if deriv else table
+    if window % 2 != 1:
+        raise ValueError("'window' must be odd.")
+
+    half = window // 2
+    if smoothing == 'savgol':
+        # windows crossing the end of the range give nan, fitted apart
+        padded = np.pad(table, ((0, 0), (half, half)),
+                        constant_values=np.nan)
+        windows = np.lib.stride_tricks.sliding_window_view(padded, window,
+                                                           axis=1)
+        result = windows.dot(savgol_coefficients(window, order, deriv))
+        result = _savgol_edges(table, result, first, last, count, window,
+                               order, deriv)
+    else:
+        #--- Centered windows, narrowed near the ends of the range
+        position = np.arange(table.shape[1])
+        width = np.minimum(half, np.minimum(position - first[:, None],
+                                            last[:, None] - position))
+        width = np.maximum(width, 0)
+        sums = np.zeros((len(table), table.shape[1] + 1))
+        np.cumsum(np.where(valid, table, 0.0), axis=1, out=sums[:, 1:])
+        rows = np.arange(len(table))[:, None]
+        result = ((sums[rows, np.minimum(position + width + 1,
+                                         table.shape[1])]
+                   - sums[rows, np.maximum(position - width, 0)])
+                  / (2*width + 1))
+        if deriv:
+            result[~valid] = np.nan
+            result = _gradient(result, first, last, count)
+    result[~valid] = np.nan
+    return result
+
+
+def binned(x, y, rows, n_rows, signs, grid):
+    """ Differentiates y with respect to x by summing increments in bins.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        Abscissas of the records of all the rows, concatenated
+    y : np.ndarray
+        Ordinates of the records of all the rows, concatenated
+    rows : np.ndarray
+        Row of each increment between consecutive records (len(x) - 1
+        values), negative for increments crossing two series
+    n_rows : int
+        Number of rows
+    signs : np.ndarray
+        Sign of each increment: the direction of x over its series
+    grid : np.ndarray
+        Centers of the bins, uniform
+
+    Returns
+    -------
+    np.ndarray
+        (n_rows, len(grid)) array of dy/dx, 0 in the bins without
+        increments within the range of x of a row, nan outside. The first and
+        last bins of a row are divided by the part of their width covered
+        by x.
+    """
+    grid, spacing = _spacing(grid)
+    points = len(grid)
+    table = np.zeros(n_rows*points)
+    counts = np.zeros(n_rows*points, dtype=np.int64)
+    if len(x) > 1:
+        middle = (x[1:] + x[:-1])/2
+        bins = np.floor((middle - grid[0])/spacing + 0.5).astype(np.int64)
+        valid = (rows >= 0) & (bins >= 0) & (bins < points)
+        flat = rows[valid]*points + bins[valid]
+        table = np.bincount(flat, weights=(np.diff(y)*signs)[valid],
+                            minlength=n_rows*points)
+        counts = np.bincount(flat, minlength=n_rows*points)
+        widths = np.bincount(flat, weights=np.abs(np.diff(x))[valid],
+                             minlength=n_rows*points)
+    table = table.reshape(n_rows, points)/spacing
+
+    #--- Bins outside the range covered by each row are undefined
+    filled = counts.reshape(n_rows, points) > 0
+    first = filled.argmax(1)
+    last = points - 1 - filled[:, ::-1].argmax(1)
+    position = np.arange(points)
+    outside = ((position < first[:, None]) | (position > last[:, None])
+               | ~filled.any(1)[:, None])
+    table[outside] = np.nan
+
+    #--- The first and last bins of a row are partly covered by x
+    if len(x) > 1:
+        widths = widths.reshape(n_rows, points)
+        rows = np.flatnonzero(filled.any(1))
+        for edge in (first[rows], last[rows]):
+            covered = np.minimum(widths[rows, edge]/spacing, 1.0)
+            table[rows, edge] /= np.where(covered > 0, covered, 1.0)
+    return table
+
+
+def resampled(series, grid):
+    """ Interpolates series on a grid.
+
+    Parameters
+    ----------
+    series : list of tuple
+        (x, y) arrays of each row
+    grid : np.ndarray
+        Points of the grid
+
+    Returns
+    -------
+    np.ndarray
+        (len(series), len(grid)) array of y on the grid, nan outside the
+        range of x of each row
+    """
+    table = np.full((len(series), len(grid)), np.nan)
+    for row, (x, y) in enumerate(series):
+        if len(x) < 2:
+            continue
+        order = np.argsort(x, kind='stable')
+        table[row] = np.interp(grid, x[order], y[order], left=np.nan,
+                               right=np.nan)
+    return table
+
+
+def differentiate(x, y, bounds, rows, n_rows, grid, method='binned',
+                  smoothing='savgol', window=9, order=2):
+    """ Computes dy/dx on a grid for several rows of concatenated series.
+
+    Parameters
+    ----------
+    x : np.ndarray
+        Abscissas of all the series, concatenated
+    y : np.ndarray
+        Ordinates of all the series, concatenated
+    bounds : list of int
+        Length of each series
+    rows : list of int
+        Row of each series. Series of the same row are added up.
+    n_rows : int
+        Number of rows
+    grid : np.ndarray
+        Points of the grid, uniform
+    method : str {'binned', 'resampled'}
+        See module docstring
+    smoothing : str {'savgol', 'mean'} or None
+        Smoothing along the grid, see smooth
+    window : int
+        Odd number of grid points of the smoothing filter
+    order : int
+        Order of the Savitzky-Golay polynomial
+
+    Returns
+    -------
+    np.ndarray
+        (n_rows, len(grid)) array of dy/dx
+    """
+    grid, spacing = _spacing(grid)
+    bounds = np.asarray(bounds, dtype=np.int64)
+    ends = np.cumsum(bounds)
+    starts = ends - bounds
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+
+    if method == 'binned':
+        #--- Row and sign of the increments, -1 across series
+        nonempty = bounds > 0
+        signs = np.where(x[ends[nonempty] - 1] >= x[starts[nonempty]],
+                         1.0, -1.0)
+        increments = np.repeat(np.asarray(rows, dtype=np.int64)[nonempty],
+                               bounds[nonempty])[:-1]
+        increments[ends[nonempty][:-1] - 1] = -1
+        table = binned(x, y, increments, n_rows,
+                       np.repeat(signs, bounds[nonempty])[:-1], grid)
+
+        return smooth(table, smoothing, window, order)
+
+    if method == 'resampled':
+        #--- Series of the same row are concatenated
+        parts = [[] for _ in range(n_rows)]
+        for row, start, end in zip(rows, starts.tolist(), ends.tolist()):
+            parts[row].append((start, end))
+        series = [(np.concatenate([x[start:end] for start, end in part]),
+                   np.concatenate([y[start:end] for start, end in part]))
+                  if part else (x[:0], y[:0]) for part in parts]
+        table = resampled(series, grid)
+        return smooth(table, smoothing, window, order, deriv=1)/spacing
+
+    raise ValueError("'method' argument accepts only {} parameters."
+                     .format(', '.join(repr(elem) for elem in METHODS)))
+
+
+def columns(kind, capacity='capacity'):
+    """ Returns the record columns of a derivative.
+
+    Parameters
+    ----------
+    kind : str {'dqdv', 'dvdq'}
+        dQ/dV or dV/dQ
+    capacity : str {'capacity', 'sp_capacity'}
+        Capacity record column
+
+    Returns
+    -------
+    tuple
+        (x, y) record column names
+    """
+    if kind not in KINDS:
+        raise ValueError("'kind' argument accepts only 'dqdv' or 'dvdq' "
+                         "parameters.")
+    if capacity not in STEP_CAPACITIES:
+        raise ValueError("'capacity' argument accepts only 'capacity' or "
+                         "'sp_capacity' parameters.")
+    return tuple(capacity if name == 'capacity' else name
+                 for name in KINDS[kind])
+
+
+def default_grid(steps, kind, capacity='capacity', points=POINTS):
+    """ Returns a grid covering steps, from their header values.
+
+    Parameters
+    ----------
+    steps : list of Step
+        Steps to be covered
+    kind : str {'dqdv', 'dvdq'}
+        Voltage grid (start and end voltages of the steps) for dQ/dV,
+        capacity grid (from 0 to the largest step capacity) for dV/dQ
+    capacity : str {'capacity', 'sp_capacity'}
+        Capacity record column
+    points : int
+        Number of points
+
+    Returns
+    -------
+    np.ndarray
+        Uniform grid
+    """
+    if not steps:
+        return uniform_grid(0.0, 1.0, points)
+    if kind == 'dqdv':
+        values = [value for step in steps
+                  for value in (step.voltage_start, step.voltage_end)]
+        low, high = min(values), max(values)
+    else:
+        low = 0.0
+        high = max(getattr(step, STEP_CAPACITIES[capacity])
+                   for step in steps)
+    if not high > low:
+        high = low + 1.0
+    return uniform_grid(low, high, points)
+
+
+def from_store(store, groups, kind, grid, capacity='capacity',
+               method='binned', smoothing='savgol', window=9, order=2):
+    """ Computes a derivative for groups of records of a store.
+
+    Parameters
+    ----------
+    store : RecordStore or LazyRecordStore
+        Store of the records
+    groups : list of list
+        (start, end) offsets of the record runs of each row, e.g. the
+        steps of each cycle
+    kind : str {'dqdv', 'dvdq'}
+        dQ/dV or dV/dQ
+    grid : np.ndarray
+        Uniform grid of voltages (dQ/dV) or capacities (dV/dQ)
+    capacity : str {'capacity', 'sp_capacity'}
+        Capacity record column
+    method, smoothing, window, order
+        See differentiate
+
+    Returns
+    -------
+    np.ndarray
+        (len(groups), len(grid)) array
+    """
+    x_name, y_name = columns(kind, capacity)
+    ranges = [span for group in groups for span in group]
+    if not ranges:
+        return np.full((len(groups), len(grid)), np.nan)
+    rows = [row for row, group in enumerate(groups) for _ in group]
+    bounds = [end - start for start, end in ranges]
+    return differentiate(store.take(ranges, x_name),
+                         store.take(ranges, y_name), bounds, rows,
+                         len(groups), grid, method, smoothing, window, order)
@@ -0,0 +1,608 @@
+"""Binary export of parsed battery analyzer files.
+
+Records are written in chunks of consecutive steps, taken from the record
+store as views whenever possible, so that exporting never builds a copy of
+all the records. Each record gets the cycle_id and step_id of its step.
+The cycle and step tables are exported alongside the records.
+
+Formats:
+
+* 'npy': a directory with a .npy file per record column, readable back
+  with memory maps
+* 'hdf5': a single file with chunked datasets (requires h5py)
+* 'arrow' and 'parquet': a directory with Arrow IPC or Parquet files
+  (requires pyarrow). Arrow IPC files are read back with memory maps.
+
+Records and cycles can also be saved as delimited text, see write_text.
+"""
+
+import io
+import os
+import json
+import gzip
+import importlib
+import contextlib
+import collections
+
+import numpy as np
+
+#--- Version of the layout of exports
+VERSION = 1
+
+#--- Number of records written at once
+CHUNK_ROWS = 2**20
+
+#--- Number of records formatted at once by the text writers
+TEXT_CHUNK_ROWS = 2**16
+
+#--- Export formats
+FORMATS = ('npy', 'hdf5', 'arrow', 'parquet')
+
+#--- Compressions of text files, by file extension
+COMPRESSIONS = {'.gz': 'gzip', '.zst': 'zstd'}
+
+
+def _require(module, format):
+    #--- Imports an optional dependency of a format
+    try:
+        return importlib.import_module(module)
+    except ImportError as error:
+        raise ImportError("The '{}' export format requires {}.".format(
+            format, module.split('.')[0])) from error
+
+
+def iter_chunks(readings, rows=None):
+    """ Iterates over the records of all the steps, in chunks.
+
+    Parameters
+    ----------
+    readings : CellReadings
+        Parsed file
+    rows : int, optional
+        Minimum number of records of a chunk (except the last one),
+        CHUNK_ROWS if None. Steps are never split.
+
+    Yields
+    ------
+    collections.OrderedDict
+        Contains 'cycle_id', 'step_id' and each record column for the
+        records of consecutive steps. Columns are views of the store if
+        the steps are adjacent in it.
+    """
+    rows = rows or CHUNK_ROWS
+    names = [name for name, _ in readings.record_columns]
+    ranges, cycle_ids, step_ids, lengths = [], [], [], []
+    count = 0  # records of the pending steps
+
+    def chunk():
+        columns = collections.OrderedDict()
+        columns['cycle_id'] = np.repeat(np.array(cycle_ids, np.int64),
+                                        lengths)
+        columns['step_id'] = np.repeat(np.array(step_ids, np.int64), lengths)
+        for name in names:
+            columns[name] = readings.store.take(ranges, name)
+        return columns
+
+    for cycle in readings.cycles:
+        for step in cycle.steps:
+            ranges.append((step.record_start, step.record_end))
+            cycle_ids.append(step.parent_cycle_id)
+            step_ids.append(step.step_id)
+            lengths.append(step.record_end - step.record_start)
+            count += lengths[-1]
+            if count >= rows:
+                yield chunk()
+                ranges, cycle_ids, step_ids, lengths = [], [], [], []
+                count = 0
+
+    if ranges:
+        yield chunk()
+
+
+def _dtypes(readings):
+    #--- (name, dtype) of the exported record columns
+    dtypes = [('cycle_id', np.dtype(np.int64)),
+              ('step_id', np.dtype(np.int64))]
+    return dtypes + [(name, np.dtype(dtype))
+                     for name, dtype in readings.record_columns]
+
+
+def _size(readings):
+    #--- Number of records of all the steps
+    return sum(step.record_end - step.record_start
+               for cycle in readings.cycles for step in cycle.steps)
+
+
+def _meta(readings, format, size):
+    #--- Description of an export
+    return {'version': VERSION, 'format': format,
+            'source': os.path.abspath(readings.filename),
+            'column_headers': readings.headers, 'size': size,
+            'columns': [name for name, _ in _dtypes(readings)],
+            'dtypes': [dtype.str for _, dtype in _dtypes(readings)]}
+
+
+def _write_meta(directory, meta):
+    with open(os.path.join(directory, 'meta.json'), 'w',
+              encoding='utf-8') as meta_file:
+        meta_file.write(json.dumps(meta))
+
+
+def write_npy(readings, directory):
+    """ Exports a parsed file to a directory of .npy files.
+
+    The directory contains a .npy file for each record column (plus
+    cycle_id and step_id), cycles.npy and steps.npy with the cycle and step
+    tables, and meta.json.
+
+    Parameters
+    ----------
+    readings : CellReadings
+        Parsed file
+    directory : str
+        Output directory, created if needed
+    """
+    os.makedirs(directory, exist_ok=True)
+    size = _size(readings)
+
+    files = collections.OrderedDict()
+    try:
+        for name, dtype in _dtypes(readings):
+            files[name] = open(os.path.join(directory, name + '.npy'), 'wb')
+            np.lib.format.write_array_header_1_0(files[name], {
+                'descr': np.lib.format.dtype_to_descr(dtype),
+                'fortran_order': False, 'shape': (size,)})
+
+        for chunk in iter_chunks(readings):
+            for name, column in chunk.items():
+                np.ascontiguousarray(column).tofile(files[name])
+    finally:
+        for handle in files.values():
+            handle.close()
+
+    np.save(os.path.join(directory, 'cycles.npy'), readings.cycle_table)
+    np.save(os.path.join(directory, 'steps.npy'), readings.step_table)
+    _write_meta(directory, _meta(readings, 'npy', size))
+
+
+def _bytes_table(table):
+    #--- Structured array with unicode fields stored as bytes (for HDF5)
+    dtype = [(name, 'S{}'.format(table.dtype[name].itemsize // 4)
+              if table.dtype[name].kind == 'U' else table.dtype[name])
+             for name in table.dtype.names]
+    return table.astype(dtype)
+
+
+def write_hdf5(readings, filename):
+    """ Exports a parsed file to an HDF5 file.
+
+    The file contains a 'records' group with a chunked dataset for each
+    record column (plus cycle_id and step_id), and 'cycles' and 'steps'
+    datasets with the cycle and step tables. Dates are stored as integers,
+    with their numpy dtype in the 'dtype' attribute.
+
+    Parameters
+    ----------
+    readings : CellReadings
+        Parsed file
+    filename : str
+        Output file
+    """
+    h5py = _require('h5py', 'hdf5')
+    size = _size(readings)
+
+    with h5py.File(filename, 'w') as h5:
+        group = h5.create_group('records')
+        datasets = collections.OrderedDict()
+        for name, dtype in _dtypes(readings):
+            stored = np.dtype(np.int64) if dtype.kind == 'M' else dtype
+            datasets[name] = group.create_dataset(
+                name, shape=(size,), dtype=stored,
+                chunks=(min(size, CHUNK_ROWS),) if size else None)
+            datasets[name].attrs['dtype'] = dtype.str
+
+        start = 0
+        for chunk in iter_chunks(readings):
+            end = start + len(chunk['cycle_id'])
+            for name, column in chunk.items():
+                if column.dtype.kind == 'M':
+                    column = column.view(np.int64)
+                datasets[name][start:end] = column
+            start = end
+
+        h5['cycles'] = _bytes_table(readings.cycle_table)
+        h5['steps'] = _bytes_table(readings.step_table)
+        for key, value in _meta(readings, 'hdf5', size).items():
+            h5.attrs[key] = json.dumps(value)
+
+
+def _arrow_table(pyarrow, table):
+    #--- Converts a structured array to an Arrow table
+    return pyarrow.table(collections.OrderedDict(
+        (name, table[name]) for name in table.dtype.names))
+
+
+def write_arrow(readings, directory, parquet=False):
+    """ Exports a parsed file to Arrow IPC or Parquet files.
+
+    The directory contains records, cycles and steps files (.arrow or
+    .parquet) and meta.json. Records are written in batches of about
+    CHUNK_ROWS records.
+
+    Parameters
+    ----------
+    readings : CellReadings
+        Parsed file
+    directory : str
+        Output directory, created if needed
+    parquet : bool
+        If True, write Parquet files instead of Arrow IPC files
+    """
+    format = 'parquet' if parquet else 'arrow'
+    pyarrow = _require('pyarrow', format)
+    os.makedirs(directory, exist_ok=True)
+
+    def path(name):
+        return os.path.join(directory, name + '.' + format)
+
+    schema = pyarrow.schema([(name, pyarrow.from_numpy_dtype(dtype))
+                             for name, dtype in _dtypes(readings)])
+
+    if parquet:
+        pq = _require('pyarrow.parquet', format)
+        writer = pq.ParquetWriter(path('records'), schema)
+        write = lambda batch: writer.write_table(
+            pyarrow.Table.from_batches([batch]))
+    else:
+        writer = pyarrow.ipc.new_file(path('records'), schema)
+        write = writer.write_batch
+
+    size = 0
+    with writer:
+        for chunk in iter_chunks(readings):
+            write(pyarrow.record_batch(list(chunk.values()), schema=schema))
+            size += len(chunk['cycle_id'])
+
+    for name, table in (('cycles', readings.cycle_table),
+                        ('steps', readings.step_table)):
+        table = _arrow_table(pyarrow, table)
+        if parquet:
+            pq.write_table(table, path(name))
+        else:
+            with pyarrow.ipc.new_file(path(name), table.schema) as writer:
+                writer.write_table(table)
+
+    _write_meta(directory, _meta(readings, format, size))
+
+
+def _zstd_writer(raw):
+    #--- Zstandard stream writing to a binary file object, left open
+    try:
+        from compression import zstd  # Python >= 3.14
+        return zstd.ZstdFile(raw, 'wb')
+    except ImportError:
+        pass
+    zstandard = _require('zstandard', 'zstd')
+    return zstandard.ZstdCompressor().stream_writer(raw, closefd=False)
+
+
+@contextlib.contextmanager
+def open_text(path, compression=None):
+    """ Opens a text output, possibly compressed.
+
+    Parameters
+    ----------
+    path : str or file object
+        Output file name, or a file object opened for writing. Text file
+        objects cannot be compressed.
+    compression : str {'gzip', 'zstd'}, optional
+        Compression of the output. If None, it is inferred from the
+        extension of a file name ('.gz' or '.zst'), none otherwise.
+        'zstd' requires Python >= 3.14 or zstandard.
+
+    Yields
+    ------
+    io.TextIOBase
+        Text stream writing to the output. A given file object is left
+        open.
+    """
+    if compression is None and isinstance(path, (str, os.PathLike)):
+        compression = COMPRESSIONS.get(os.path.splitext(path)[1].lower())
+    if compression not in (None, 'gzip', 'zstd'):
+        raise ValueError("'compression' argument accepts only None, 'gzip' "
+                         "or 'zstd' parameters.")
+
+    if isinstance(path, io.TextIOBase):
+        if compression:
+            raise ValueError("Compressed text requires a binary file object.")
+        yield path
+        return
+
+    owned = not hasattr(path, 'write')
+    raw = open(path, 'wb') if owned else path
+    try:
+        if compression == 'gzip':
+            stream = gzip.GzipFile(fileobj=raw, mode='wb')
+        elif compression == 'zstd':
+            stream = _zstd_writer(raw)
+        else:
+            stream = raw
+        text = io.TextIOWrapper(stream, encoding='utf-8', newline='')
+        yield text
+        text.flush()
+        text.detach()
+        if stream is not raw:
+            stream.close()  # writes the end of the compressed stream
+    finally:
+        if owned:
+            raw.close()
+
+
+def _formatter(columns, delimiter, precision):
+    #--- Format of a line and conversion of each column to Python objects
+    formats, converters = [], []
+    float_format = '%.{}e'.format(precision)
+    for column in columns:
+        kind = column.dtype.kind
+        if kind in 'iub':
+            formats.append('%d')
+            converters.append(None)
+        elif kind == 'f':
+            formats.append(float_format)
+            converters.append(None)
+        elif kind == 'M':
+            formats.append('%s')
+            converters.append(np.datetime_as_string)
+        else:
+            formats.append('%s')
+            converters.append(None)
+    return delimiter.replace('%', '%%').join(formats) + '\n', converters
+
+
+def write_text(stream, columns, delimiter=' ', precision=5, header=None):
+    """ Writes columns as delimited text lines.
+
+    Lines are formatted a chunk of TEXT_CHUNK_ROWS rows at a time, with a
+    single string formatting operation per chunk. Integers are written as
+    such, floats in scientific notation and dates in ISO format, as
+    np.savetxt would with the same formats.
+
+    Parameters
+    ----------
+    stream : io.TextIOBase
+        Output stream
+    columns : list of np.ndarray
+        Columns to be written, all of the same length
+    delimiter : str
+        Separator of the fields of a line
+    precision : int
+        Number of digits after the decimal point of floats
+    header : str, optional
+        Written first, on a line starting with '# '
+
+    Returns
+    -------
+    int
+        Number of lines written, header excluded
+    """
+    if header is not None:
+        stream.write('# ' + header + '\n')
+    if not columns:
+        return 0
+
+    line_format, converters = _formatter(columns, delimiter, precision)
+    size = len(columns[0])
+    for start in range(0, size, TEXT_CHUNK_ROWS):
+        end = min(start + TEXT_CHUNK_ROWS, size)
+        rows = np.empty((end - start, len(columns)), dtype=object)
+        for index, (column, converter) in enumerate(zip(columns,
+                                                        converters)):
+            values = column[start:end]
+            rows[:, index] = converter(values) if converter else values
+        stream.write((line_format*(end - start))
+                     % tuple(rows.ravel().tolist()))
+    return size
+
+
+def _text_header(names):
+    #--- Header line naming the columns of a text export
+    return ' | '.join('{}. {}'.format(index, name)
+                      for index, name in enumerate(names, 1))
+
+
+def save_records(readings, path, names, delimiter=' ', precision=5,
+                 compression=None):
+    """ Saves record columns as delimited text, one line per record.
+
+    Records are read from the store and written in chunks of consecutive
+    steps, so that memory use does not depend on the number of records.
+
+    Parameters
+    ----------
+    readings : CellReadings
+        Parsed file
+    path : str or file object
+        Output, see open_text
+    names : list of str
+        Names of the columns to be written: record columns, 'cycle_id' or
+        'step_id'
+    delimiter : str
+        Separator of the fields of a line
+    precision : int
+        Number of digits after the decimal point of floats
+    compression : str {'gzip', 'zstd'}, optional
+        Compression of the output, see open_text
+
+    Returns
+    -------
+    int
+        Number of records written
+    """
+    available = [name for name, _ in _dtypes(readings)]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ValueError("Unknown record columns {}, expected some of {}"
+                         .format(unknown, available))
+
+    size = 0
+    with open_text(path, compression) as stream:
+        stream.write('# ' + _text_header(names) + '\n')
+        for chunk in iter_chunks(readings, TEXT_CHUNK_ROWS):
+            size += write_text(stream, [chunk[name] for name in names],
+                               delimiter, precision)
+    return size
+
+
+def save_table(table, path, names=None, delimiter=' ', precision=5,
+               compression=None, header=None):
+    """ Saves a structured array (e.g. the cycle table) as delimited text.
+
+    Parameters
+    ----------
+    table : np.ndarray
+        Structured array, one line per row
+    path : str or file object
+        Output, see open_text
+    names : list of str, optional
+        Fields to be written, all of them if None
+    delimiter : str
+        Separator of the fields of a line
+    precision : int
+        Number of digits after the decimal point of floats
+    compression : str {'gzip', 'zstd'}, optional
+        Compression of the output, see open_text
+    header : str, optional
+        Header line, the numbered field names if None
+
+    Returns
+    -------
+    int
+        Number of rows written
+    """
+    names = list(table.dtype.names if names is None else names)
+    with open_text(path, compression) as stream:
+        return write_text(stream, [table[name] for name in names], delimiter,
+                          precision,
+                          _text_header(names) if header is None else header)
+
+
+def export(readings, path, format='npy'):
+    """ Exports a parsed file in a binary format.
+
+    Parameters
+    ----------
+    readings : CellReadings
+        Parsed file
+    path : str
+        Output directory ('npy', 'arrow' and 'parquet') or file ('hdf5')
+    format : str {'npy', 'hdf5', 'arrow', 'parquet'}
+        Export format
+    """
+    if format == 'npy':
+        write_npy(readings, path)
+    elif format == 'hdf5':
+        write_hdf5(readings, path)
+    elif format in ('arrow', 'parquet'):
+        write_arrow(readings, path, format == 'parquet')
+    else:
+        raise ValueError("'format' argument accepts only {} parameters."
+                         .format(', '.join(repr(elem) for elem in FORMATS)))
+
+
+def read_export(path, mmap_mode='r'):
+    """ Reads an export back.
+
+    Parameters
+    ----------
+    path : str
+        Directory or file written by export
+    mmap_mode : str or None
+        Memory map mode of .npy and Arrow IPC exports, see np.load. If
+        None, they are read in memory.
+
+    Returns
+    -------
+    records : collections.OrderedDict
+        Contains an array for cycle_id, step_id and each record column.
+        Arrays are memory mapped from .npy exports and, whenever possible,
+        from Arrow IPC exports.
+    cycle_table : np.ndarray
+        Cycle table, see CellReadings.cycle_table
+    step_table : np.ndarray
+        Step table, see CellReadings.step_table
+    """
+    if not os.path.isdir(path):
+        return _read_hdf5(path)
+
+    with open(os.path.join(path, 'meta.json'), 'r',
+              encoding='utf-8') as meta_file:
+        meta = json.load(meta_file)
+
+    if meta['format'] == 'npy':
+        def load(name, size):
+            # empty arrays cannot be memory mapped
+            return np.load(os.path.join(path, name + '.npy'),
+                           mmap_mode=mmap_mode if size else None)
+
+        records = collections.OrderedDict(
+            (name, load(name, meta['size'])) for name in meta['columns'])
+        # tables are small and read in memory
+        return records, load('cycles', 0), load('steps', 0)
+
+    return _read_arrow(path, meta, mmap_mode)
+
+
+def _read_arrow(path, meta, mmap_mode):
+    #--- Reads an Arrow IPC or Parquet export
+    format = meta['format']
+    pyarrow = _require('pyarrow', format)
+
+    def table(name):
+        filename = os.path.join(path, name + '.' + format)
+        if format == 'parquet':
+            pq = _require('pyarrow.parquet', format)
+            return pq.read_table(filename, memory_map=bool(mmap_mode))
+        source = pyarrow.memory_map(filename) if mmap_mode \
+            else pyarrow.OSFile(filename)
+        return pyarrow.ipc.open_file(source).read_all()
+
+    def column(data, name):
+        return data.column(name).combine_chunks().to_numpy(
+            zero_copy_only=False)
+
+    # Parquet stores dates with at least a millisecond resolution
+    records = table('records')
+    records = collections.OrderedDict(
+        (name, column(records, name).astype(dtype, copy=False))
+        for name, dtype in zip(meta['columns'], meta['dtypes']))
+
+    tables = []
+    for name in ('cycles', 'steps'):
+        data = table(name)
+        fields = [(field, column(data, field)) for field in data.column_names]
+        array = np.empty(data.num_rows, dtype=[
+            (field, 'U24' if values.dtype.kind == 'O' else values.dtype)
+            for field, values in fields])
+        for field, values in fields:
+            array[field] = values
+        tables.append(array)
+
+    return records, tables[0], tables[1]
+
+
+def _read_hdf5(filename):
+    #--- Reads an HDF5 export in memory
+    h5py = _require('h5py', 'hdf5')
+    with h5py.File(filename, 'r') as h5:
+        records = collections.OrderedDict()
+        for name in json.loads(h5.attrs['columns']):
+            dataset = h5['records'][name]
+            records[name] = dataset[...].view(dataset.attrs['dtype'])
+        tables = []
+        for name in ('cycles', 'steps'):
+            table = h5[name][...]
+            tables.append(table.astype([
+                (field, 'U{}'.format(table.dtype[field].itemsize)
+                 if table.dtype[field].kind == 'S' else table.dtype[field])
+                for field in table.dtype.names]))
+    return records, tables[0], tables[1]
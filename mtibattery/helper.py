@@ -2,49 +2,194 @@
 """
 
 import numpy as np
-import datetime as dt
+
+#--- Width of the fields following the hours in H:M:S:ms and H:M:S times
+TIME_FIELDS = {3: (2, 2, 3), 2: (2, 2)}
+
+
+def _as_bytes(column):
+    #--- Returns a column of strings as a 1d array of bytes
+    column = np.atleast_1d(np.asarray(column))
+    if not column.size:
+        return np.empty(0, dtype='S1')
+    if column.dtype.kind == 'U':
+        column = column.astype('S')
+    elif column.dtype.kind == 'O':
+        column = np.array([elem.encode('ascii') if isinstance(elem, str)
+                           else elem for elem in column], dtype='S')
+    if column.dtype.kind != 'S':
+        raise TypeError("Expected a column of strings, got dtype {}".format(
+            column.dtype))
+    return column.ravel()
+
+
+def parse_times(column, unit=None):
+    """ Converts a column of elapsed times to seconds in one pass.
+
+    Times are either written as H:M:S:ms (or H:M:S), where only the number
+    of hours has a variable width, or as decimal hours.
+
+    Parameters
+    ----------
+    column : array_like of bytes or str
+        Contains a time string for each row
+    unit : str {'H:M:S:ms', 'H:M:S', 'H'}, optional
+        Format of the times, guessed from the first row if None
+
+    Returns
+    -------
+    np.ndarray
+        Seconds of each row (float, with millisecond precision)
+
+    Raises
+    ------
+    ValueError
+        If a row does not follow the format of the column
+    """
+    column = _as_bytes(column)
+    if not column.size:
+        return np.empty(0, dtype=np.float64)
+
+    if unit is None:
+        colons = column[0].count(b':')
+    else:
+        colons = unit.count(':')
+    widths = TIME_FIELDS.get(colons)
+    if not colons:
+        #--- Decimal hours
+        return column.astype(np.float64)*3600
+    elif widths is None:
+        raise ValueError("Invalid time {!r}".format(
+            column[0].decode('ascii', 'replace')))
+
+    chars = column.view(np.uint8).reshape(len(column), column.itemsize)
+    lengths = (chars != 0).sum(axis=1)  # strings are padded with 0
+
+    #--- Offset from the end of the string and weight (in ms) of each
+    #    digit, and offset of each colon
+    offsets, weights, colons = [], [], []
+    shift = 0
+    for width, weight in zip(reversed(widths),
+                             (1, 1000, 60000)[-len(widths):]):
+        offsets += range(shift + 1, shift + width + 1)
+        weights += [weight*10**k for k in range(width)]
+        shift += width + 1
+        colons.append(shift)
+    hours_width = int(lengths.max()) - shift
+    offsets += range(shift + 1, shift + hours_width + 1)
+    weights += [3600000*10**k for k in range(hours_width)]
+
+    #--- Gather all digits at once, the number of hour digits varies
+    offsets = np.array(offsets)
+    colons = np.array(colons)
+    if lengths.min() == lengths.max():
+        #--- All strings have the same length
+        positions = np.maximum(int(lengths[0]) - offsets, 0)
+        digits = chars[:, positions] - np.uint8(ord('0'))
+        separators = chars[:, np.maximum(int(lengths[0]) - colons, 0)]
+    else:
+        positions = lengths[:, None] - offsets
+        inside = positions >= 0
+        digits = np.take_along_axis(chars, np.where(inside, positions, 0),
+                                    axis=1) - np.uint8(ord('0'))
+        digits[~inside] = 0
+        separators = np.take_along_axis(
+            chars, np.maximum(lengths[:, None] - colons, 0), axis=1)
+
+    valid = ((lengths > shift) & np.all(digits <= 9, axis=1)
+             & np.all(separators == ord(':'), axis=1))
+    if not valid.all():
+        raise ValueError("Invalid time {!r}".format(
+            column[np.argmin(valid)].decode('ascii', 'replace')))
+
+    return digits.astype(np.int64).dot(np.array(weights, dtype=np.int64))/1000
+
+
+def parse_datetimes(column):
+    """ Converts a column of date and time strings to datetime64.
+
+    Parameters
+    ----------
+    column : array_like of bytes or str
+        Contains a 'YYYY-MM-DD HH:MM:SS' string for each row
+
+    Returns
+    -------
+    np.ndarray
+        datetime64[s] array
+    """
+    column = _as_bytes(column)
+    return column.astype('datetime64[s]')
+
+
+def parse_time(string):
+    """ Converts a single elapsed time to seconds.
+
+    Scalar counterpart of parse_times, accepting the same formats and
+    giving the same results, without the overhead of numpy for one value.
+
+    Parameters
+    ----------
+    string : bytes or str
+        Time as H:M:S:ms, H:M:S or decimal hours
+
+    Returns
+    -------
+    float
+        seconds
+
+    Raises
+    ------
+    ValueError
+        If string is not a valid time
+    """
+    if isinstance(string, bytes):
+        string = string.decode('ascii', 'replace')
+    fields = string.strip().split(':')
+    if len(fields) == 1:
+        #--- Decimal hours
+        return float(fields[0])*3600
+
+    widths = TIME_FIELDS.get(len(fields) - 1)
+    if (widths is None or not fields[0].isdigit()
+            or any(len(field) != width or not field.isdigit()
+                   for field, width in zip(fields[1:], widths))):
+        raise ValueError("Invalid time {!r}".format(string))
+
+    milliseconds = (int(fields[0])*3600 + int(fields[1])*60
+                    + int(fields[2]))*1000
+    if len(fields) == 4:
+        milliseconds += int(fields[3])
+    return milliseconds/1000
+
 
 def bstr2seconds(data):
-    """ Converts a byte string to a timedelta object
+    """ Converts a time string to seconds
 
     Parameters
     ----------
-    data : bytestring
-        Contains a bytestring representing a timedelta
+    data : bytestring or string
+        Contains a time as H:M:S:ms
 
     Returns
     -------
-    dt.timedelta
-        timedelta object
+    float
+        seconds
     """
-    string = str(data)
-    # Use string starting from character 2 in order to remove
-    # the "b'" preceding the string in a byte string
-    hours, minutes, seconds, milliseconds = string[2:].split(':')
-    time = dt.timedelta(hours=int(hours), minutes=int(
-        minutes), seconds=int(seconds)).total_seconds()
-    return time
-    #return np.timedelta64(int(time), 's')
+    return parse_time(data)
 
 
 def str2timedelta(data):
-    """ Converts a string to a timedelta object
+    """ Converts a string to seconds
 
     Parameters
     ----------
     data : string
-        Contains a string representing a timedelta
+        Contains a time as H:M:S
 
     Returns
     -------
-    dt.timedelta
-        timedelta object
+    float
+        seconds
     """
-    string = str(data)
-    # Use string starting from character 2 in order to remove
-    # the "b'" preceding the string in a byte string
-    hours, minutes, seconds = string.split(':')
-    time = dt.timedelta(hours=int(hours), minutes=int(
-        minutes), seconds=int(seconds)).total_seconds()
-    return time
-
+    return parse_time(data)
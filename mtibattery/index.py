@@ -0,0 +1,179 @@
+"""Sorted indexes of the cycles, steps and records of a parsed file.
+
+Lookups by cycle id, record id or date are binary searches (np.searchsorted)
+in sorted arrays built once. Record ids and dates are normally increasing
+in the file, so that their columns are searched in place; they are sorted
+first otherwise.
+"""
+
+import numpy as np
+
+
+class SortedColumn(object):
+    """ Sorted view of a column, searched with np.searchsorted.
+    """
+
+    def __init__(self, values):
+        """ Initialize a SortedColumn object.
+
+        Parameters
+        ----------
+        values : np.ndarray
+            Column to be searched, in store order
+        """
+
+        values = np.asarray(values)
+        diffs = np.diff(values)
+        if values.dtype.kind == 'M':
+            diffs = diffs.astype(np.int64)
+        if (diffs >= 0).all():
+            self.order = None  # already sorted
+            self.values = values
+        else:
+            self.order = np.argsort(values, kind='stable')
+            self.values = values[self.order]
+
+    def __len__(self):
+        return len(self.values)
+
+    @property
+    def sorted(self):
+        """ bool: True if the column was sorted in store order.
+        """
+        return self.order is None
+
+    def find(self, value):
+        """ Returns the position in the store of a value.
+
+        Parameters
+        ----------
+        value : scalar
+            Value to be found
+
+        Returns
+        -------
+        int or None
+            Position of the first occurrence of value, None if missing
+        """
+        index = int(np.searchsorted(self.values, value, 'left'))
+        if index == len(self.values) or self.values[index] != value:
+            return None
+        return index if self.order is None else int(self.order[index])
+
+    def between(self, low=None, high=None):
+        """ Returns the sorted positions of the values in [low, high).
+
+        Parameters
+        ----------
+        low : scalar, optional
+            Lower bound (included), unbounded if None
+        high : scalar, optional
+            Upper bound (excluded), unbounded if None
+
+        Returns
+        -------
+        slice or np.ndarray
+            Slice of the store if the column is sorted, increasing positions
+            in the store otherwise
+        """
+        start = 0 if low is None else int(np.searchsorted(self.values, low,
+                                                          'left'))
+        end = len(self.values) if high is None else \
+            int(np.searchsorted(self.values, high, 'left'))
+        end = max(start, end)
+        if self.order is None:
+            return slice(start, end)
+        return np.sort(self.order[start:end])
+
+
+class ReadingsIndex(object):
+    """ Indexes of the cycles, steps and records of a CellReadings object.
+
+    The cycle and step indexes are built with the index. The record id and
+    date indexes are built on first use, as they need the whole 'id' and
+    'realtime' columns (which parses the whole file in lazy mode).
+    """
+
+    def __init__(self, readings):
+        """ Initialize a ReadingsIndex object.
+
+        Parameters
+        ----------
+        readings : CellReadings
+            Parsed file
+        """
+
+        self.readings = readings
+        self.cycle_ids = SortedColumn([cycle.properties['cycle_id']
+                                       for cycle in readings.cycles])
+
+        #--- Steps in store order, with their first record and their cycle
+        self.steps = []
+        cycles = []
+        for position, cycle in enumerate(readings.cycles):
+            self.steps.extend(cycle.steps)
+            cycles.extend([position]*len(cycle.steps))
+        self.step_cycles = np.array(cycles, dtype=np.int64)
+        self.step_starts = np.array([step.record_start
+                                     for step in self.steps], dtype=np.int64)
+
+        self._columns = {}  # record column name -> SortedColumn
+
+    def column(self, name):
+        """ Returns the sorted index of a record column.
+
+        Parameters
+        ----------
+        name : str
+            Record column, e.g. 'id' or 'realtime'
+
+        Returns
+        -------
+        SortedColumn
+            Index of the column
+
+        Raises
+        ------
+        KeyError
+            If the column was not loaded (see the columns argument of
+            CellReadings)
+        """
+        if name not in self._columns:
+            loaded = [column for column, _ in self.readings.record_columns]
+            if name not in loaded:
+                raise KeyError("Record column '{}' was not loaded, loaded "
+                               "columns are {}".format(name, loaded))
+            self._columns[name] = SortedColumn(
+                self.readings.store.columns[name])
+        return self._columns[name]
+
+    def cycle(self, cycle_id):
+        """ Returns the position of a cycle in CellReadings.cycles.
+
+        Parameters
+        ----------
+        cycle_id : int
+            Id of the cycle
+
+        Returns
+        -------
+        int or None
+            Position of the cycle, None if missing
+        """
+        return self.cycle_ids.find(cycle_id)
+
+    def step(self, offset):
+        """ Returns the step of a record.
+
+        Parameters
+        ----------
+        offset : int
+            Offset of the record in the store
+
+        Returns
+        -------
+        int
+            Position of the step in the steps attribute
+        """
+        # empty steps start where the next step starts: take the last one
+        return int(np.searchsorted(self.step_starts, offset, 'right')) - 1
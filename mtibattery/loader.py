@@ -0,0 +1,143 @@
+"""Parallel loading of many battery analyzer files.
+"""
+
+import concurrent.futures
+
+from . import parser
+from .cache import FileCache, signature
+from .mtibattery import CellReadings
+
+
+def _parse(filename, records, with_signature, columns=None):
+    """ Parses a file into blocks (run by worker processes).
+
+    Only the column headers, the header lines and the record arrays are sent
+    back to the parent process, never Cycle or Step objects.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the input file
+    records : bool
+        If False, records are located but not parsed
+    with_signature : bool
+        If True, also compute the signature of the file for the cache
+    columns : list of tuple, optional
+        Record columns to be parsed, see parser.parse_records
+
+    Returns
+    -------
+    tuple
+        (column_headers, blocks, signature)
+    """
+    sig = signature(filename) if with_signature else None
+    try:
+        column_headers, blocks = parser.read_file(
+            filename, None if records else parser.CHUNK_SIZE, records,
+            columns)
+        blocks = list(blocks)
+    except (ValueError, IndexError, KeyError) as error:
+        raise parser.parse_error(filename, error) from error
+    return column_headers, blocks, sig
+
+
+def load_many(paths, workers=None, summary=False, cache=False,
+              progress=None, columns=None):
+    """ Load many files in parallel.
+
+    Files are parsed by a pool of worker processes, which send back the
+    parsed record arrays and header lines. Cycle and Step objects are built
+    in the calling process. Errors are collected per file and do not stop
+    the other files from loading.
+
+    Parameters
+    ----------
+    paths : list of str
+        Names of the input files
+    workers : int, optional
+        Number of worker processes, as many as the CPUs if None. If 1, files
+        are parsed in the calling process.
+    summary : bool
+        If True, workers only read cycle and step headers and return lazy
+        readings, whose records are parsed on first access.
+    cache : bool, str or FileCache
+        If not False, files are loaded from the cache when possible, and
+        parsed files are saved to it (not in summary mode).
+    progress : callable, optional
+        Called as progress(done, total, filename, error) each time a file
+        is loaded, error being None on success.
+    columns : list of str, optional
+        Record columns to be loaded, see CellReadings
+
+    Returns
+    -------
+    readings : list
+        CellReadings object for each path, None for files that failed
+    errors : dict
+        Exception raised by each file that failed, by path
+    """
+    record_columns = parser.record_columns(columns)
+    if cache is True:
+        cache = FileCache()
+    elif isinstance(cache, str):
+        cache = FileCache(cache)
+
+    readings = [None]*len(paths)
+    errors = {}
+    done = [0]
+
+    def report(index, result, error):
+        #--- Store the outcome of a file and report progress
+        if error is None:
+            readings[index] = result
+        else:
+            errors[paths[index]] = error
+        done[0] += 1
+        if progress is not None:
+            progress(done[0], len(paths), paths[index], error)
+
+    def build(index, parsed):
+        #--- Build a CellReadings object from parsed blocks
+        column_headers, blocks, sig = parsed
+        return CellReadings.from_blocks(paths[index], column_headers, blocks,
+                                        summary, cache, sig, columns)
+
+    #--- Load cached files first
+    pending = []
+    for index, filename in enumerate(paths):
+        try:
+            cached = CellReadings.from_cache(filename, cache, summary,
+                                             columns) if cache else None
+            if cached is not None:
+                report(index, cached, None)
+                continue
+        except Exception as error:
+            report(index, None, error)
+            continue
+        pending.append(index)
+
+    args = (not summary, bool(cache) and not summary, record_columns)
+
+    if workers == 1:
+        for index in pending:
+            try:
+                result = build(index, _parse(paths[index], *args))
+            except Exception as error:
+                report(index, None, error)
+            else:
+                report(index, result, None)
+        return readings, errors
+
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        futures = {pool.submit(_parse, paths[index], *args): index
+                   for index in pending}
+        for future in concurrent.futures.as_completed(futures):
+            index = futures[future]
+            try:
+                result = build(index, future.result())
+            except Exception as error:
+                report(index, None, error)
+            else:
+                report(index, result, None)
+
+    return readings, errors
@@ -0,0 +1,292 @@
+"""Tables of per-cycle and per-step metrics.
+
+The tables are numpy structured arrays with one row per cycle or per step,
+so that metrics of thousands of cycles can be computed with whole-array
+operations instead of looping over Cycle and Step objects.
+"""
+
+import numpy as np
+
+from . import helper
+from . import parser
+
+#--- Fields of the step table (cycle_index is the row of the cycle table)
+STEP_FIELDS = [('cycle_index', np.int64), ('cycle_id', np.int64),
+               ('step_id', np.int64), ('label', 'U24'),
+               ('duration', np.float64), ('capacity', np.float64),
+               ('specific_capacity', np.float64), ('energy', np.float64),
+               ('specific_energy', np.float64), ('capacitance', np.float64),
+               ('voltage_start', np.float64), ('voltage_end', np.float64),
+               ('voltage_delta', np.float64), ('record_start', np.int64),
+               ('record_end', np.int64)]
+
+#--- Labels of charge and discharge steps
+CHARGE = 'CC_Chg'
+DISCHARGE = 'CC_DChg'
+
+
+def cycle_dtype(head_entries):
+    """ Returns the dtype of the cycle table.
+
+    Parameters
+    ----------
+    head_entries : list of tuple
+        (name, converter) of each field of a cycle header, see Cycle
+
+    Returns
+    -------
+    np.dtype
+        One field for each header entry (cycle_id as integer, the others as
+        floats) followed by the total 'duration' of the cycle in seconds
+        and its number of steps 'n_steps'
+    """
+    fields = [(name, np.int64 if name == 'cycle_id' else np.float64)
+              for name, _ in head_entries]
+    fields += [('duration', np.float64), ('n_steps', np.int64)]
+    return np.dtype(fields)
+
+
+def build_tables(cycles, head_entries):
+    """ Builds the cycle and the step tables of a list of cycles.
+
+    Parameters
+    ----------
+    cycles : list of Cycle
+        Cycles to be tabulated
+    head_entries : list of tuple
+        (name, converter) of each field of a cycle header
+
+    Returns
+    -------
+    cycle_table : np.ndarray
+        Structured array with one row per cycle, see cycle_dtype
+    step_table : np.ndarray
+        Structured array with one row per step, see STEP_FIELDS
+    """
+    step_rows = []
+    cycle_rows = []
+    for index, cycle in enumerate(cycles):
+        steps = cycle.steps
+        duration = 0.0
+        for step in steps:
+            seconds = step.duration.total_seconds()
+            duration += seconds
+            step_rows.append((index, step.parent_cycle_id, step.step_id,
+                              step.label, seconds, step.capacity,
+                              step.specific_capacity, step.energy,
+                              step.specific_energy, step.capacitance,
+                              step.voltage_start, step.voltage_end,
+                              step.voltage_delta, step.record_start,
+                              step.record_end))
+        cycle_rows.append(tuple(cycle.properties.values())
+                          + (duration, len(steps)))
+
+    cycle_table = np.array(cycle_rows, dtype=cycle_dtype(head_entries))
+    step_table = np.array(step_rows, dtype=STEP_FIELDS)
+
+    return cycle_table, step_table
+
+
+def _read_columns(lines, columns):
+    #--- Reads (name, column, dtype) columns of header lines at once
+    dtype = [(name, kind) for name, _, kind in columns]
+    if not lines:
+        return np.zeros(0, dtype=dtype)
+    return np.loadtxt(lines, delimiter='\t', comments=None, ndmin=1,
+                      usecols=[column.position for _, column, _ in columns],
+                      dtype=dtype)
+
+
+def tables_from_headers(headers, schema, head_entries, lead=0):
+    """ Builds the cycle and the step tables from header lines.
+
+    Gives the same tables as build_tables, without creating Cycle and Step
+    objects: the fields of all the cycle (step) header lines are read with
+    a single numpy call.
+
+    Parameters
+    ----------
+    headers : list
+        (kind, line, n_records) for each cycle and step header line, in
+        file order
+    schema : schema.Schema
+        Columns of the file
+    head_entries : list of tuple
+        (name, converter) of each field of a cycle header
+    lead : int
+        Number of records preceding the first header line
+
+    Returns
+    -------
+    cycle_table : np.ndarray
+        Structured array with one row per cycle, see cycle_dtype
+    step_table : np.ndarray
+        Structured array with one row per step, see STEP_FIELDS
+
+    Raises
+    ------
+    ValueError
+        If a step header line precedes the first cycle header line
+    """
+    kinds = np.array([kind for kind, _, _ in headers], dtype=np.int64)
+    counts = np.array([count for _, _, count in headers], dtype=np.int64)
+    cycles = kinds == parser.CYCLE
+
+    #--- Cycle header fields, those with a custom converter read as text
+    cycle_table = np.zeros(int(cycles.sum()), dtype=cycle_dtype(head_entries))
+    fields = _read_columns(
+        [line for kind, line, _ in headers if kind == parser.CYCLE],
+        [(name, schema.cycle[name], cycle_table.dtype[name]
+          if convert in (int, float) else 'U64')
+         for name, convert in head_entries])
+    for name, convert in head_entries:
+        values = fields[name]
+        if convert is helper.str2timedelta:
+            values = helper.parse_times(values)
+        elif convert not in (int, float):
+            values = [convert(value) for value in values.tolist()]
+        cycle_table[name] = values
+        if schema.cycle[name].divisor != 1:
+            cycle_table[name] /= schema.cycle[name].divisor
+
+    #--- Cycle of each step and offset of the records of each header
+    cycle_index = (np.cumsum(cycles) - 1)[~cycles]
+    if cycle_index.size and cycle_index[0] < 0:
+        raise ValueError("Step header line before the first cycle header")
+    starts = lead + np.cumsum(counts) - counts
+
+    step_table = np.zeros(len(cycle_index), dtype=STEP_FIELDS)
+    names = ['step_id', 'label', 'duration', 'capacity', 'specific_capacity',
+             'energy', 'specific_energy', 'capacitance', 'voltage_start',
+             'voltage_end']
+    dtype = dict(STEP_FIELDS, duration='S16')
+    fields = _read_columns(
+        [line for kind, line, _ in headers if kind != parser.CYCLE],
+        [(name, schema.step[name], dtype[name]) for name in names])
+    for name in names:
+        if name == 'duration':
+            # rounded to microseconds, like Step.duration
+            step_table[name] = np.round(helper.parse_times(
+                fields[name], schema.step[name].unit)*1e6)/1e6
+            continue
+        step_table[name] = fields[name]
+        if schema.step[name].divisor != 1:
+            step_table[name] /= schema.step[name].divisor
+    step_table['voltage_delta'] = (step_table['voltage_end']
+                                   - step_table['voltage_start'])
+    step_table['cycle_index'] = cycle_index
+    step_table['cycle_id'] = cycle_table['cycle_id'][cycle_index]
+    step_table['record_start'] = starts[~cycles]
+    step_table['record_end'] = starts[~cycles] + counts[~cycles]
+
+    #--- Cycle totals
+    cycle_table['duration'] = np.bincount(cycle_index,
+                                          weights=step_table['duration'],
+                                          minlength=len(cycle_table))
+    cycle_table['n_steps'] = np.bincount(cycle_index,
+                                         minlength=len(cycle_table))
+
+    return cycle_table, step_table
+
+
+def sum_by_cycle(cycle_table, step_table, field, label=None):
+    """ Sums a step field over the steps of each cycle.
+
+    Parameters
+    ----------
+    cycle_table : np.ndarray
+        Cycle table
+    step_table : np.ndarray
+        Step table
+    field : str
+        Field of the step table to be summed
+    label : str, optional
+        Only sum steps with this label
+
+    Returns
+    -------
+    np.ndarray
+        Sum for each cycle, nan for cycles without matching steps
+    """
+    mask = np.ones(len(step_table), dtype=bool) if label is None \
+        else step_table['label'] == label
+    index = step_table['cycle_index'][mask]
+
+    total = np.bincount(index, weights=step_table[field][mask],
+                        minlength=len(cycle_table))
+    count = np.bincount(index, minlength=len(cycle_table))
+    total[count == 0] = np.nan
+
+    return total
+
+
+def efficiency(cycle_table, step_table, mode='standard'):
+    """ Returns the time efficiency of each cycle.
+
+    Parameters
+    ----------
+    cycle_table : np.ndarray
+        Cycle table
+    step_table : np.ndarray
+        Step table
+    mode : str {'standard', 'inverse'}
+        if 'standard', return discharge/charge time, otherwise its inverse.
+
+    Returns
+    -------
+    np.ndarray
+        Efficiency of each cycle, nan for cycles lacking a charge or a
+        discharge step
+    """
+    discharge_time = sum_by_cycle(cycle_table, step_table, 'duration',
+                                  DISCHARGE)
+    charge_time = sum_by_cycle(cycle_table, step_table, 'duration', CHARGE)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if mode == 'standard':
+            return discharge_time/charge_time
+        elif mode == 'inverse':
+            return charge_time/discharge_time
+    raise ValueError(
+        "'mode' argument accepts only 'standard' or 'inverse' parameters.")
+
+
+def coulombic_efficiency(cycle_table):
+    """ Returns the coulombic efficiency of each cycle.
+
+    Parameters
+    ----------
+    cycle_table : np.ndarray
+        Cycle table
+
+    Returns
+    -------
+    np.ndarray
+        Discharge over charge capacity of each cycle, in percent. Specific
+        capacities are used, as they are written with more digits.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (100*cycle_table['discharge_capacity_sp']
+                / cycle_table['charge_capacity_sp'])
+
+
+def capacity_fade(cycle_table, reference=0, field='discharge_capacity_sp'):
+    """ Returns the capacity lost by each cycle with respect to a reference.
+
+    Parameters
+    ----------
+    cycle_table : np.ndarray
+        Cycle table
+    reference : int
+        Row of the reference cycle
+    field : str
+        Capacity field of the cycle table
+
+    Returns
+    -------
+    np.ndarray
+        1 - capacity/reference capacity for each cycle
+    """
+    capacity = cycle_table[field]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 1 - capacity/capacity[reference]
@@ -5,22 +5,76 @@
 """
 
 import sys
-import os.path as path
-from io import StringIO
+import time
+import logging
+import itertools
+import os
+import asyncio
+import functools
+import concurrent.futures
 import collections
 import datetime as dt
 
 import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
 
-from .helper import bstr2seconds, str2timedelta
+from .helper import str2timedelta
+from . import helper
+from . import parser
+from .store import RecordStore, LazyRecordStore
+from .cache import FileCache, signature
+from .schema import get_schema
+from . import metrics
+from . import export
+from . import decimate
+from .stats import ParseStats
+from .index import ReadingsIndex
+from . import differential
+from . import aio
+
+logger = logging.getLogger(__name__)
+
+
+def _variant(record_columns):
+    #--- Name of the cache entries of files parsed with some record columns
+    if record_columns == parser.RECORD_COLUMNS:
+        return ''
+    return 'columns=' + ','.join(name for name, _ in record_columns)
+
+
+def _axes(ax):
+    #--- Axes a plot is drawn on, the current pyplot axes if None
+    return plt.gca() if ax is None else ax
+
+
+def _show(ax, show):
+    #--- Shows pyplot figures, by default only if no axes were given
+    if show or (show is None and ax is None):
+        plt.show()
+
+
+def _steps_differential(steps, kind, grid, capacity, method, smoothing,
+                        window, order):
+    #--- Derivative of the records of some steps, as a single series
+    if grid is None:
+        grid = differential.default_grid(steps, kind, capacity)
+    grid = np.asarray(grid, dtype=np.float64)
+    stored = [step for step in steps if step.store is not None]
+    if not stored:
+        return grid, np.full(len(grid), np.nan)
+    return grid, differential.from_store(
+        stored[0].store, [[(step.record_start, step.record_end)
+                           for step in stored]],
+        kind, grid, capacity, method, smoothing, window, order)[0]
 
 
 class CellReadings(object):
     """ Easy access to data from mticorp battery analyzer output.
     """
 
-    def __init__(self, filename):
+    def __init__(self, filename, engine='numpy', mmap=None, cache=False,
+                 lazy=False, workers=1, columns=None, stats=False):
         """ Initialize a CellReadings object.
         The __init__ method initializes the object with filename
         and  empty lists for cycles. Invokes _read_file method
@@ -30,89 +84,967 @@ class CellReadings(object):
         ----------
         filename : str
             Name of the input file
+        engine : str {'numpy', 'python'}
+            Parser engine. 'numpy' (the default) reads the whole file at
+            once and parses all records with a single vectorized call,
+            'python' reads the file line by line. Both give the same
+            readings.
+        mmap : str or bool, optional
+            Directory where the record columns are written and memory
+            mapped from, so that large files do not need to fit in memory.
+            Each readings gets its own subdirectory, removed with it. If
+            True, the default temporary directory is used.
+        cache : bool, str or FileCache
+            If not False, parsed files are stored in an on-disk cache and
+            loaded from it as long as the file is unchanged. True uses the
+            default cache directory, a str a custom cache directory.
+        lazy : bool
+            If True, the file is only scanned to locate cycle and step
+            headers: cycles and steps are created right away, but the
+            records of a step are parsed when first accessed. Lazy readings
+            are loaded from the cache if available, but never saved to it.
+        workers : int
+            Number of processes parsing the file with the 'numpy' engine.
+            If larger than 1, the file is split in ranges starting with a
+            cycle header, which are parsed in parallel.
+        columns : list of str, optional
+            Record columns to be loaded, among parser.RECORD_DTYPES (e.g.
+            'current', 'energy' or 'realtime'), parser.RECORD_COLUMNS if
+            None. Other fields of the record lines are skipped by the
+            parser, and no record field is read if empty.
+        stats : bool or callable
+            If not False, loads are instrumented in a stats.ParseStats
+            object (the stats attribute): time spent in each phase, bytes,
+            lines and records parsed, parse time of single steps and peak
+            memory. A callable is called as stats(readings.stats) at the
+            end of each load.
+        """
+
+        start = time.perf_counter()
+        if engine not in ('numpy', 'python'):
+            raise ValueError(
+                "'engine' argument accepts only 'numpy' or 'python' parameters.")
+        if lazy and (engine != 'numpy' or mmap):
+            raise ValueError(
+                "'lazy' argument requires the 'numpy' engine and no 'mmap'.")
+        if workers > 1 and engine != 'numpy':
+            raise ValueError(
+                "'workers' argument requires the 'numpy' engine.")
+
+        self._setup(filename, engine, mmap, cache, lazy, workers, columns,
+                    stats)
+
+        if not self._load_cached(start):
+            sig = signature(filename) if self.cache else None
+
+            # Call _read_file function to parse the input file
+            self._finish(self._read_file(filename), sig)
+
+        if self.stats is not None:
+            self.stats.finish(filename, time.perf_counter() - start)
+
+    def _load_cached(self, start):
+        #--- Build cycles and steps from the cache entry, False on a miss
+        cached = self.cache.load(self.filename,
+                                 _variant(self.record_columns)) \
+            if self.cache else None
+        if cached is None:
+            return False
+
+        self.headers, headers, columns, self._position, self._tail = cached
+        self.store = RecordStore(columns=self.record_columns)
+        self.store.append(collections.OrderedDict(columns),
+                          sum(header[2] for header in headers))
+        built = time.perf_counter()
+        self._set_last_step(self._add_headers(headers, 0))
+        self.store.close()
+        self.cycle_number = len(self.cycles)
+        if self.stats is not None:
+            self.stats.add('read', built - start)
+            self.stats.add('objects', time.perf_counter() - built)
+            self._count_entries(headers)
+        logger.info("Loaded file %s from the cache", self.filename)
+        return True
+
+    @classmethod
+    def from_cache(cls, filename, cache, lazy=False, columns=None,
+                   stats=False):
+        """ Build a CellReadings object from the cache only.
+
+        Parameters
+        ----------
+        filename : str
+            Name of the input file
+        cache : bool, str or FileCache
+            Cache, see CellReadings
+        lazy : bool
+            See CellReadings, only matters for later refreshes
+        columns : list of str, optional
+            Record columns, see CellReadings
+        stats : bool or callable
+            See CellReadings
+
+        Returns
+        -------
+        CellReadings or None
+            None if the file is not cached or if its entry is stale
+        """
+        start = time.perf_counter()
+        readings = cls.__new__(cls)
+        readings._setup(filename, 'numpy', None, cache, lazy, 1, columns,
+                        stats)
+        if not readings._load_cached(start):
+            return None
+        if readings.stats is not None:
+            readings.stats.finish(filename, time.perf_counter() - start)
+        return readings
+
+    @classmethod
+    def summary(cls, filename, steps=False):
+        """ Returns the summary tables of a file, without parsing records.
+
+        Only cycle and step header lines are parsed: record lines are
+        counted while scanning the file, never decoded (see lazy), and the
+        tables are built from the header lines without creating Cycle and
+        Step objects.
+
+        Parameters
+        ----------
+        filename : str
+            Name of the input file
+        steps : bool
+            If True, also return the step table
+
+        Returns
+        -------
+        cycle_table : np.ndarray
+            See cycle_table
+        step_table : np.ndarray
+            See step_table, only if steps is True
+
+        Raises
+        ------
+        parser.ParseError
+            If the file does not follow the analyzer output format.
+        """
+        try:
+            column_headers, blocks = parser.read_file(
+                filename, parser.CHUNK_SIZE, False)
+            schema = get_schema(column_headers)
+            blocks = list(blocks)
+            tail = parser.read_tail(filename,
+                                    blocks[-1].end if blocks else None,
+                                    schema)
+            headers = []
+            lead = 0  # records preceding the first header line
+            for block in blocks + ([tail] if tail is not None else []):
+                if headers:
+                    kind, line, count = headers[-1]
+                    headers[-1] = (kind, line, count + block.lead)
+                else:
+                    lead += block.lead
+                headers.extend(block.headers)
+            tables = metrics.tables_from_headers(headers, schema,
+                                                 Cycle.head_entries, lead)
+        except (ValueError, IndexError, KeyError) as error:
+            raise parser.parse_error(filename, error) from error
+        return tables if steps else tables[0]
+
+    @classmethod
+    async def aload(cls, filename, executor=None, **options):
+        """ Load a file without blocking the event loop.
+
+        The file is loaded by a thread of executor.
+
+        Parameters
+        ----------
+        filename : str
+            Name of the input file
+        executor : concurrent.futures.Executor, optional
+            Thread pool loading the file, aio.default_executor() if None
+        **options
+            Arguments of CellReadings
+
+        Returns
+        -------
+        CellReadings
+            Loaded file
         """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            executor or aio.default_executor(),
+            functools.partial(cls, filename, **options))
+
+    @classmethod
+    def from_blocks(cls, filename, column_headers, blocks, lazy=False,
+                    cache=False, sig=None, columns=None):
+        """ Build a CellReadings object from a file parsed elsewhere.
 
+        Parameters
+        ----------
+        filename : str
+            Name of the parsed file
+        column_headers : list of str
+            First three lines of the file
+        blocks : iterable of parser.Block
+            Blocks of the rest of the file, as returned by parser.read_file
+        lazy : bool
+            Must be True if blocks were parsed with records=False
+        cache : bool, str or FileCache
+            Cache where the readings are saved (not lazy readings only)
+        sig : dict, optional
+            Signature of the file when it was read, see cache.signature
+        columns : list of str, optional
+            Record columns the blocks were parsed with
+
+        Returns
+        -------
+        CellReadings
+            Readings built from the blocks
+
+        Raises
+        ------
+        parser.ParseError
+            If the blocks do not follow the analyzer output format.
+        """
+        readings = cls.__new__(cls)
+        readings._setup(filename, 'numpy', None, cache, lazy,
+                        columns=columns)
+        readings.headers = list(column_headers)
+        try:
+            entries = readings._add_blocks(blocks)
+            readings._add_tail(entries)
+        except (ValueError, IndexError, KeyError) as error:
+            raise parser.parse_error(filename, error) from error
+        readings._finish(entries, sig)
+        return readings
+
+    def _setup(self, filename, engine, mmap, cache, lazy, workers=1,
+               columns=None, stats=False):
+        #--- Initialize attributes of an empty CellReadings object
         self.filename = filename  # name of the file
+        self.engine = engine  # parser engine
+        self.lazy = lazy  # parse records on demand
+        self.workers = workers  # processes parsing the file
+        # (name, dtype) of the loaded record columns
+        self.record_columns = parser.record_columns(columns)
         self.cycles = []  # contains cycle objects
         self.headers = [] # contains column headers (probably useless...)
-
-        # Call _read_file function to parse the input file
-        self._read_file(filename)
+        self.cycle_number = 0  # number of cycles
+        # timers and counters of the loads, None if not instrumented
+        self.stats = ParseStats(stats if callable(stats) else None) \
+            if stats else None
+        # contains records of all steps
+        self.store = LazyRecordStore(filename, self.record_columns,
+                                     self.stats) if lazy \
+            else RecordStore(mmap, self.record_columns)
+        self._step = None  # last step, the only one that can grow
+        # byte offset following the last complete line parsed
+        self._position = None
+        # kind of the last line, parsed after _position as it has no newline
+        self._tail = None
+        self._tables = None  # cycle and step tables, built on demand
+        self._plots = {}  # decimated plot series, built on demand
+        self._index = None  # sorted indexes, built on demand
+        self._differentials = {}  # options -> cycle -> (records, row)
+        self._refreshing = None  # running refresh of arefresh
+
+        if cache is True:
+            cache = FileCache()
+        elif isinstance(cache, str):
+            cache = FileCache(cache)
+        self.cache = cache or None  # FileCache or None
+
+    @property
+    def schema(self):
+        """ schema.Schema: columns and units of the file, read from its
+        column headers.
+        """
+        return get_schema(self.headers or None)
+
+    def _finish(self, entries, sig):
+        #--- Close the store once the file is read and save it to the cache
+        self.store.close()
+        if self.cache and not self.lazy:
+            self.cache.save(self.filename, self.headers, entries,
+                            self.store.columns, self._position,
+                            _variant(self.record_columns), sig, self._tail)
         self.cycle_number = len(self.cycles)  # number of cycles
 
     def _read_file(self, filename):
-        """ Read and parse input file.
+        """ Read and parse input file with the selected engine.
 
         Parameters
         ----------
         filename : str
             Name of the input file
 
+        Returns
+        -------
+        list
+            [kind, line, n_records] for each cycle and step header line of
+            the file, as read by parser.parse_block
+
         Raises
         ------
-        EOFError
-            If end of file is reached.
+        parser.ParseError
+            If the file does not follow the analyzer output format.
+        """
+        try:
+            if self.engine == 'numpy':
+                return self._read_file_numpy(filename)
+            else:
+                return self._read_file_python(filename)
+        except (ValueError, IndexError, KeyError) as error:
+            raise parser.parse_error(filename, error) from error
+
+    def _add_headers(self, headers, offset):
+        """ Create cycles and steps from parsed header lines.
+
+        Parameters
+        ----------
+        headers : list
+            (kind, line, n_records) for each header line, in file order
+        offset : int
+            Offset in the store of the records following the first header
+
+        Returns
+        -------
+        list
+            Cycle and Step objects created, in file order
+        """
+        schema = self.schema
+
+        #--- Parse the durations of all the steps at once
+        duration = schema.step['duration']
+        durations = iter(helper.parse_times(
+            [line.split('\t', duration.position + 1)[duration.position]
+             for kind, line, _ in headers if kind != parser.CYCLE],
+            duration.unit).tolist())
+
+        created = []
+        for kind, line, n_records in headers:
+            if kind == parser.CYCLE:
+                #--- Create cycle object
+                self.cycles.append(Cycle(line, schema))
+                created.append(self.cycles[-1])
+            else:
+                #--- Add step object to cycle and give it its records
+                step = self.cycles[-1]._add_step(line, next(durations))
+                step._set_records(self.store, offset, offset + n_records)
+                created.append(step)
+            offset += n_records
+        return created
+
+    def _set_last_step(self, created):
+        #--- Remembers the last step among the created objects
+        for obj in reversed(created):
+            if isinstance(obj, Step):
+                self._step = obj
+                break
+
+    def _add_block(self, block):
+        """ Adds records, cycles and steps of a parsed block.
+
+        Parameters
+        ----------
+        block : parser.Block
+            Block following the last parsed line of the file
+
+        Returns
+        -------
+        list
+            Cycle and Step objects created, in file order, preceded by the
+            last step of the previous block if its records were extended
+        """
+        start = time.perf_counter()
+        offset, _ = self.store.append_block(block)
+        stored = time.perf_counter()
+
+        #--- Records preceding the first header of a block belong
+        #    to the last step of the previous block
+        extended = []
+        if block.lead and self._step is not None:
+            self._step.record_end += block.lead
+            extended.append(self._step)
+
+        created = self._add_headers(block.headers, offset + block.lead)
+        self._set_last_step(created)
+        self._position = block.end
+        self._tables = None
+        self._plots = {}
+        self._index = None
+
+        if self.stats is not None:
+            self.stats.add_block(block)
+            self.stats.add('store', stored - start)
+            self.stats.add('objects', time.perf_counter() - stored)
+
+        return extended + created
+
+    def _read_file_numpy(self, filename):
+        """ Read input file in one go and parse it with numpy.
+
+        Lines are classified by their number of leading tabs and all the
+        records of the file are parsed at once into the record store. Each
+        step gets the offsets of its records in the store. Memory mapped
+        stores are filled chunk by chunk. In lazy mode records are only
+        located, and the file is scanned chunk by chunk. With several
+        workers, ranges of the file made of whole cycles are parsed in
+        parallel and added in file order.
+
+        Parameters
+        ----------
+        filename : str
+            Name of the input file
         """
+        if self.workers > 1:
+            self.headers, ranges = parser.split_file(filename,
+                                                     4*self.workers)
+            with concurrent.futures.ProcessPoolExecutor(self.workers) as pool:
+                entries = self._add_blocks(pool.map(
+                    parser.parse_range, itertools.repeat(filename),
+                    *zip(*ranges), itertools.repeat(not self.lazy),
+                    itertools.repeat(self.schema),
+                    itertools.repeat(self.record_columns)))
+        else:
+            chunked = self.lazy or self.store.directory
+            self.headers, blocks = parser.read_file(
+                filename, parser.CHUNK_SIZE if chunked else None,
+                not self.lazy, self.record_columns)
+            entries = self._add_blocks(blocks)
+        self._add_tail(entries)
+
+        logger.info("Finished reading file %s", filename)
+        return entries
+
+    def _add_blocks(self, blocks):
+        """ Adds records, cycles and steps of consecutive parsed blocks.
+
+        Parameters
+        ----------
+        blocks : iterable of parser.Block
+            Blocks following the last parsed line of the file
+
+        Returns
+        -------
+        list
+            [kind, line, n_records] for each cycle and step header line of
+            the blocks
+        """
+        entries = []
+        for block in blocks:
+            if block.lead and entries:
+                entries[-1][2] += block.lead
+            entries.extend(list(header) for header in block.headers)
+
+            self._add_block(block)
+
+        return entries
+
+    def _records_parsed(self):
+        #--- Whether blocks are parsed with their records, from the store
+        return not isinstance(self.store, LazyRecordStore)
+
+    def _add_tail(self, entries):
+        """ Parses the last line of the file if it has no newline.
+
+        The line is complete if the file was closed without a final newline,
+        but may be cut if the file is still being written. It is parsed if
+        possible, and parsed again by refresh once followed by a newline.
+
+        Parameters
+        ----------
+        entries : list
+            [kind, line, n_records] for each header line parsed so far,
+            extended with those of the last line
+        """
+        if self._position is None:
+            self._position = parser.last_line(self.filename)[0]
+        block = parser.read_tail(self.filename, self._position, self.schema,
+                                 self.record_columns)
+        if block is None:
+            return
+
+        #--- Header lines are checked by creating their cycle or step
+        start = self._position
+        try:
+            self._add_block(block)
+        except (ValueError, IndexError, KeyError) as error:
+            logger.info("Left the last line of file %s to refresh: %r",
+                        self.filename, error)
+            return
+
+        self._position = start
+        self._tail = block.headers[0][0] if block.headers else parser.RECORD
+        if block.lead and entries:
+            entries[-1][2] += block.lead
+        entries.extend(list(header) for header in block.headers)
+
+    def _last_step(self):
+        #--- Last step of the file, None if there is none
+        return next((elem for cycle in reversed(self.cycles)
+                     for elem in reversed(cycle.steps)), None)
+
+    def _drop_tail(self):
+        #--- Removes what was parsed from the last line, before parsing
+        #    it again with the lines that follow it
+        if self._tail == parser.RECORD:
+            if self._step is not None:
+                self._step.record_end -= 1
+            self.store.truncate(self.store.size - 1, self._position)
+        elif self._tail == parser.STEP:
+            cycle = self.cycles[-1]
+            step = cycle.steps.pop()
+            labelled = cycle.steps_by_label[step.label]
+            labelled.pop()
+            if not labelled:
+                del cycle.steps_by_label[step.label]
+            self._step = self._last_step()
+        else:
+            self.cycles.pop()
+        self._tail = None
+
+    def _read_file_python(self, filename):
+        """ Read and parse input file line by line.
+
+        Parameters
+        ----------
+        filename : str
+            Name of the input file
+        """
+        entries = []
+
         with open(filename, 'r', encoding='utf-8') as data:
-            try:
-                #--- Skip first three lines of header
-                self.headers = [data.readline() for i in range(3)]
-
-                #--- Reads cycle header
-                line = data.readline()  # cycle header
-                while True:
-                    #--- Create cycle object
-                    cycle = Cycle(line)
-
-                    #--- Read step header
-                    line = data.readline()  # step header
-
-                    # str: records always have a empty '' cycle entry
-                    #      when a new cycle starts, cycle_test contains
-                    #      the cycle number and thus the loops exits.
-                    cycle_test = ''
-
-                    while cycle_test == '':
-                        #--- Add step object to cycle
-                        # str: contains the step type (charge, discharge, rest)
-                        step_type = cycle._add_step(line)
-
-                        #--- Read first record of current step
-                        line = data.readline()  # contains first step record
-                        # split record line by tabs
+            #--- Read first three lines of header
+            self.headers = [data.readline() for i in range(3)]
+            schema = self.schema
+
+            #--- Reads cycle header, readline() returns '' once EOF is
+            #    reached
+            line = data.readline()  # cycle header
+            while line:
+                #--- Create cycle object
+                cycle = Cycle(line, schema)
+                entries.append([parser.CYCLE, line, 0])
+
+                #--- Read step header
+                line = data.readline()  # step header
+
+                # str: records always have a empty '' cycle entry
+                #      when a new cycle starts, cycle_test contains
+                #      the cycle number and thus the loops exits.
+                cycle_test = ''
+
+                while line and cycle_test == '':
+                    #--- Add step object to cycle
+                    # Step: the step records are added to
+                    step = cycle._add_step(line)
+                    entries.append([parser.STEP, line, 0])
+
+                    #--- Read first record of current step
+                    line = data.readline()  # contains first step record
+                    # split record line by tabs
+                    splitted = line.split('\t')
+                    records = []  # will contain all records of a step
+
+                    #--- Read records of a step
+                    while splitted[1:2] == ['']:  # splitted[1] is empty till
+                                                  # a new step begins
+                        records.append(line)
+                        #--- Read next record and split it
+                        line = data.readline()
                         splitted = line.split('\t')
-                        records = []  # will contain all records of a step
-
-                        #--- Read records of a step
-                        while splitted[1] == '':  # splitted[1] is empty till a new
-                                                 # step begins
-                            # remove two initial empty fields
-                            records.append(line[2:])
-                            #--- Read next record and split it
-                            line = data.readline()
-                            splitted = line.split('\t')
-
-                            #--- If EOF is reached, save data and raise except
-                            #--- readline() returns '' when EOF is reached
-                            if line == '':
-                                cycle.steps[step_type]._add_records(records)
-                                self.cycles.append(cycle)
-                                raise EOFError
-
-                        #--- Adds step to the cycle object
-                        cycle.steps[step_type]._add_records(records)
-                        cycle_test = splitted[0]
-
-                    #--- Once all steps and records have been read and added
-                    # to the cycle object, append the cycle object to
-                    # self.cycles
-                    self.cycles.append(cycle)
-            except EOFError:
-                print("\nFinished reading file")
-            except:
-                print("Unexpected error while reading file:",
-                      sys.exc_info()[0])
-                raise
+
+                    #--- Adds step to the cycle object
+                    step._add_records(records, self.store, schema,
+                                      self.record_columns, self.stats)
+                    entries[-1][2] = len(records)
+                    cycle_test = splitted[0]
+
+                #--- Once all steps and records have been read and added
+                # to the cycle object, append the cycle object to
+                # self.cycles
+                self.cycles.append(cycle)
+
+        logger.info("Finished reading file %s", filename)
+
+        #--- Last step and offset of the last line, parsed again by refresh
+        #    if it has no newline
+        self._step = self._last_step()
+        self._position, line = parser.last_line(filename)
+        self._tail = parser.line_kind(line) if line else None
+
+        if self.stats is not None:
+            self.stats.counters['bytes'] += parser.data_size(filename)
+            self._count_entries(entries)
+
+        return entries
+
+    def _count_entries(self, entries):
+        #--- Counts the lines of header entries and of their records
+        counters = self.stats.counters
+        for kind, _, n_records in entries:
+            counters['steps' if kind else 'cycles'] += 1
+            counters['records'] += n_records
+            counters['lines'] += n_records + 1
+
+    def refresh(self, max_bytes=None):
+        """ Parses the lines appended to the file since the last read.
+
+        Records appended to the last step extend it, new cycle and step
+        header lines create new Cycle and Step objects. A last line without
+        newline is considered incomplete and is parsed by a later refresh
+        (or parsed again, if the load parsed it).
+
+        Parameters
+        ----------
+        max_bytes : int, optional
+            Read at most about max_bytes (up to the end of the line where
+            the limit falls), leaving the next lines to later refreshes.
+            The whole appended data is read if None.
+
+        Returns
+        -------
+        list
+            Cycle and Step objects created, in file order, preceded by the
+            last step already known if new records were appended to it.
+        """
+        start = time.perf_counter()
+        with open(self.filename, 'rb') as data:
+            data.seek(self._position)
+            if max_bytes is None:
+                chunk = data.read()
+            else:
+                chunk = data.read(max_bytes) + data.readline()
+
+        cut = chunk.rfind(b'\n') + 1
+        if not cut:
+            return []
+
+        if self._tail is not None:
+            self._drop_tail()
+        block = parser.parse_block(memoryview(chunk)[:cut], self._position,
+                                   self._records_parsed(), self.schema,
+                                   self.record_columns)
+        new = self._add_block(block)
+        self.store.close()
+        self.cycle_number = len(self.cycles)
+        if self.stats is not None:
+            self.stats.finish(self.filename, time.perf_counter() - start)
+
+        return new
+
+    def follow(self, interval=1.0, timeout=None):
+        """ Yields cycles and steps as they are appended to the file.
+
+        Parameters
+        ----------
+        interval : float
+            Seconds to wait before checking the file again when no new
+            lines are found
+        timeout : float, optional
+            Stop once no new lines are found for timeout seconds. If None,
+            follow the file forever.
+
+        Yields
+        ------
+        Cycle or Step
+            Objects returned by refresh()
+        """
+        idle = 0.0
+        while timeout is None or idle < timeout:
+            new = self.refresh()
+            if new:
+                idle = 0.0
+                for obj in new:
+                    yield obj
+            else:
+                time.sleep(interval)
+                idle += interval
+
+    async def arefresh(self, executor=None, max_bytes=None):
+        """ Parses the appended lines without blocking the event loop.
+
+        The file is refreshed by a thread of executor. If a refresh is
+        already running, waits for it and returns its result instead of
+        starting another one.
+
+        Parameters
+        ----------
+        executor : concurrent.futures.Executor, optional
+            Thread pool refreshing the file, aio.default_executor() if None
+        max_bytes : int, optional
+            See refresh
+
+        Returns
+        -------
+        list
+            Cycle and Step objects created, see refresh
+        """
+        if self._refreshing is None:
+            loop = asyncio.get_running_loop()
+            self._refreshing = loop.run_in_executor(
+                executor or aio.default_executor(),
+                functools.partial(self.refresh, max_bytes))
+            self._refreshing.add_done_callback(
+                lambda _: setattr(self, '_refreshing', None))
+        return await asyncio.shield(self._refreshing)
+
+    async def afollow(self, interval=1.0, timeout=None, executor=None):
+        """ Yields cycles and steps as they are appended to the file.
+
+        Like follow, without blocking the event loop.
+
+        Parameters
+        ----------
+        interval : float
+            Seconds to wait before checking the file again when no new
+            lines are found
+        timeout : float, optional
+            Stop once no new lines are found for timeout seconds. If None,
+            follow the file forever.
+        executor : concurrent.futures.Executor, optional
+            Thread pool refreshing the file, see arefresh
+
+        Yields
+        ------
+        Cycle or Step
+            Objects returned by refresh()
+        """
+        idle = 0.0
+        while timeout is None or idle < timeout:
+            new = await self.arefresh(executor)
+            if new:
+                idle = 0.0
+                for obj in new:
+                    yield obj
+            else:
+                await asyncio.sleep(interval)
+                idle += interval
+
+    @property
+    def cycle_table(self):
+        """ np.ndarray: structured array with one row per cycle.
+
+        Fields are those of Cycle.head_entries, plus the total 'duration'
+        of the cycle in seconds and its number of steps 'n_steps'.
+        """
+        if self._tables is None:
+            self._tables = metrics.build_tables(self.cycles,
+                                                Cycle.head_entries)
+        return self._tables[0]
+
+    @property
+    def step_table(self):
+        """ np.ndarray: structured array with one row per step.
+
+        Fields are listed in metrics.STEP_FIELDS: the row of the cycle in
+        cycle_table, the attributes of the step (duration in seconds) and
+        the offsets of its records in the store.
+        """
+        if self._tables is None:
+            self._tables = metrics.build_tables(self.cycles,
+                                                Cycle.head_entries)
+        return self._tables[1]
+
+    @property
+    def index(self):
+        """ index.ReadingsIndex: sorted indexes of cycles, steps and records,
+        built on first use and rebuilt once new lines are parsed.
+        """
+        if self._index is None:
+            self._index = ReadingsIndex(self)
+        return self._index
+
+    def cycle(self, cycle_id):
+        """ Returns a cycle by id.
+
+        Parameters
+        ----------
+        cycle_id : int
+            Id of the cycle, as written in the file
+
+        Returns
+        -------
+        Cycle
+            Cycle with this id
+
+        Raises
+        ------
+        KeyError
+            If no cycle has this id
+        """
+        position = self.index.cycle(cycle_id)
+        if position is None:
+            raise KeyError("No cycle with id {}".format(cycle_id))
+        return self.cycles[position]
+
+    def locate(self, record_id):
+        """ Returns the cycle and the step of a record.
+
+        Requires the 'id' record column, whose index is built on first use.
+
+        Parameters
+        ----------
+        record_id : int
+            Id of the record, as written in the file (and plotted by
+            plot_voltage)
+
+        Returns
+        -------
+        cycle : Cycle
+            Cycle of the record
+        step : Step
+            Step of the record
+        offset : int
+            Position of the record in the records of the step
+
+        Raises
+        ------
+        KeyError
+            If no record has this id
+        """
+        index = self.index
+        position = index.column('id').find(record_id)
+        step = None if position is None else index.step(position)
+        if step is None or step < 0:
+            raise KeyError("No record with id {}".format(record_id))
+        return (self.cycles[index.step_cycles[step]], index.steps[step],
+                position - index.steps[step].record_start)
+
+    def slice_time(self, start=None, stop=None):
+        """ Returns the records of a time interval.
+
+        Requires the 'realtime' record column, whose index is built on
+        first use.
+
+        Parameters
+        ----------
+        start : str, datetime or np.datetime64, optional
+            First date (included), from the first record if None
+        stop : str, datetime or np.datetime64, optional
+            Last date (excluded), up to the last record if None
+
+        Returns
+        -------
+        collections.OrderedDict
+            Contains each record column for the records dated within
+            [start, stop). Columns are views of the store if dates increase
+            along the file and the records are stored in a single run,
+            copies otherwise.
+        """
+        dtype = dict(self.record_columns).get('realtime', 'datetime64[s]')
+        bounds = [None if date is None else np.datetime64(date).astype(dtype)
+                  for date in (start, stop)]
+        selection = self.index.column('realtime').between(*bounds)
+        if isinstance(selection, slice):
+            return self.store.view(selection.start, selection.stop)
+        return collections.OrderedDict(
+            (name, self.store.columns[name][selection])
+            for name, _ in self.record_columns)
+
+    def _cycle_positions(self, cycles):
+        #--- Positions in self.cycles of the cycles selected by id
+        if cycles is None:
+            return range(len(self.cycles))
+        if isinstance(cycles, slice):
+            selection = self.index.cycle_ids.between(cycles.start,
+                                                     cycles.stop)
+            if isinstance(selection, slice):
+                selection = range(selection.start, selection.stop)
+            return selection[::cycles.step]
+        if isinstance(cycles, (int, np.integer)):
+            cycles = [cycles]
+        positions = [self.index.cycle(cycle_id) for cycle_id in cycles]
+        if None in positions:
+            raise KeyError("No cycle with id {}".format(
+                list(cycles)[positions.index(None)]))
+        return positions
+
+    def select_steps(self, cycles=None, step_type=None):
+        """ Returns the steps of some cycles, without parsing any record.
+
+        Parameters
+        ----------
+        cycles : slice, int or list of int, optional
+            Ids of the cycles, all the cycles if None. A slice selects the
+            ids in [start, stop) and takes every 'step' of them, e.g.
+            slice(100, 201) for cycles 100 to 200 and slice(None, None, 50)
+            for every 50th cycle.
+        step_type : str or list of str, optional
+            Labels of the steps, e.g. 'CC_DChg', all the steps if None
+
+        Returns
+        -------
+        list of Step
+            Selected steps, in file order
+
+        Raises
+        ------
+        KeyError
+            If a cycle id is missing
+        """
+        labels = None if step_type is None else \
+            {step_type} if isinstance(step_type, str) else set(step_type)
+        return [elem for position in self._cycle_positions(cycles)
+                for elem in self.cycles[position].steps
+                if labels is None or elem.label in labels]
+
+    def select(self, cycles=None, step_type=None, where=None, columns=None):
+        """ Returns the records of some cycles and steps.
+
+        Only the records of the selected steps are read from the store: in
+        lazy mode, other steps are never parsed. For example, the records
+        of the discharge steps of cycles 100 to 200 below 1 V are
+
+        >>> readings.select(slice(100, 201), 'CC_DChg',
+        ...                 lambda records: records['volt'] < 1.0)
+
+        Parameters
+        ----------
+        cycles : slice, int or list of int, optional
+            Ids of the cycles, see select_steps
+        step_type : str or list of str, optional
+            Labels of the steps, see select_steps
+        where : callable, optional
+            Called as where(records), records containing each record column
+            of the selected steps, returns a boolean mask of the records to
+            be kept.
+        columns : list of str, optional
+            Record columns to be returned, all the loaded columns if None
+
+        Returns
+        -------
+        collections.OrderedDict
+            Contains each requested column. Columns are views of the store
+            if the selected records are contiguous in the store and where is
+            None, copies otherwise.
+
+        Raises
+        ------
+        KeyError
+            If a cycle id is missing or a column was not loaded
+        """
+        loaded = [name for name, _ in self.record_columns]
+        names = loaded if columns is None else list(columns)
+        for name in names:
+            if name not in loaded:
+                raise KeyError("Record column '{}' was not loaded, loaded "
+                               "columns are {}".format(name, loaded))
+
+        ranges = [(elem.record_start, elem.record_end)
+                  for elem in self.select_steps(cycles, step_type)
+                  if elem.record_end > elem.record_start]
+        records = collections.OrderedDict(
+            (name, self.store.take(ranges, name))
+            for name in (loaded if where is not None else names))
+        if where is None:
+            return records
+
+        mask = np.asarray(where(records), dtype=bool)
+        return collections.OrderedDict((name, records[name][mask])
+                                       for name in names)
 
     def get_duration(self):
         """ Returns total duration of the battery analysis.
@@ -124,35 +1056,265 @@ class CellReadings(object):
 
         """
 
-        return np.sum([cycle.get_duration() for cycle in self.cycles])
+        return dt.timedelta(seconds=float(self.cycle_table['duration'].sum()))
 
-    def save_cycles(self):
-        output = []
-        
-        for cycle in self.cycles:
-            output.append(list(cycle.properties.values()))
+    def get_efficiency(self, mode='standard'):
+        """ Returns the efficiency of each cycle.
+
+        Parameters
+        ----------
+        mode : str {'standard', 'inverse'}
+            if 'standard', return discharge/charge time, otherwise its inverse.
 
-        root = path.splitext(path.basename(self.filename))[0]
-        filename = root+".cycles.dat"
-        header = ""
-        np.savetxt(filename, np.vstack(output), fmt='%.5e', header=header)
+        Returns
+        -------
+        np.ndarray
+            efficiency of each cycle, nan for cycles lacking a charge or a
+            discharge step.
+        """
 
-    def save_records(self):
-        output = []
-        
-        for cycle in self.cycles:
-            for step in cycle.steps.values():
-                step_list = []
-                for record in step.records.values():
-                    step_list.append(record)
-                output.append(np.column_stack(step_list))
-
-        root = path.splitext(path.basename(self.filename))[0]
-        filename = root+".records.dat"
-        header = "1. id | 2. time | 3. volt | 4. capacity | 5. sp_capacity"
-        np.savetxt(filename, np.vstack(output), fmt='%i %.5e %.5e %.5e %.5e', header=header)
-
-    def plot_voltage_delta(self, step_label):
+        return metrics.efficiency(self.cycle_table, self.step_table, mode)
+
+    def get_coulombic_efficiency(self):
+        """ Returns the coulombic efficiency of each cycle.
+
+        Returns
+        -------
+        np.ndarray
+            discharge over charge capacity of each cycle, in percent.
+        """
+
+        return metrics.coulombic_efficiency(self.cycle_table)
+
+    def get_capacity_fade(self, reference=0):
+        """ Returns the discharge capacity lost with respect to a cycle.
+
+        Parameters
+        ----------
+        reference : int
+            Index of the reference cycle
+
+        Returns
+        -------
+        np.ndarray
+            1 - discharge capacity/reference discharge capacity, per cycle.
+        """
+
+        return metrics.capacity_fade(self.cycle_table, reference)
+
+    def _differential(self, kind, label, grid, start, stop, step, capacity,
+                      method, smoothing, window, order):
+        #--- Derivative of the selected cycles, computed once per cycle
+        positions = range(len(self.cycles))[start:stop:step]
+        steps = [self.cycles[position].steps_by_label.get(label, [])
+                 for position in positions]
+        if grid is None:
+            grid = differential.default_grid(
+                [elem for group in steps for elem in group], kind, capacity)
+        grid = np.asarray(grid, dtype=np.float64)
+
+        key = (kind, label, grid.tobytes(), capacity, method, smoothing,
+               window, order)
+        cached = self._differentials.setdefault(key, {})
+
+        #--- Cycles never computed or whose records changed since
+        sizes = [sum(elem.record_end - elem.record_start for elem in group)
+                 for group in steps]
+        missing = [index for index, position in enumerate(positions)
+                   if cached.get(position, (None,))[0] != sizes[index]]
+        if missing:
+            rows = differential.from_store(
+                self.store, [[(elem.record_start, elem.record_end)
+                              for elem in steps[index]]
+                             for index in missing],
+                kind, grid, capacity, method, smoothing, window, order)
+            for index, row in zip(missing, rows):
+                cached[positions[index]] = (sizes[index], row)
+
+        table = np.empty((len(positions), len(grid)))
+        for index, position in enumerate(positions):
+            table[index] = cached[position][1]
+        return grid, table
+
+    def dqdv(self, label='CC_Chg', grid=None, start=0, stop=None, step=1,
+             capacity='capacity', method='binned', smoothing='savgol',
+             window=9, order=2):
+        """ Returns the incremental capacity dQ/dV of the cycles.
+
+        All the selected cycles are computed at once. Results are kept per
+        cycle, so that later calls (e.g. after refresh) only compute the
+        new cycles and the cycles whose records changed, as long as the
+        grid and the options are the same.
+
+        Parameters
+        ----------
+        label : str
+            Type of the steps to be analysed, e.g. 'CC_Chg' or 'CC_DChg'.
+            The steps of a cycle with this label are analysed together.
+        grid : np.ndarray, optional
+            Uniform voltage grid (V). If None, 200 points covering the
+            start and end voltages of the steps.
+        start : int
+            First cycle
+        stop : int
+            Last cycle
+        step : int
+            Read every 'step's cycles.
+        capacity : str {'capacity', 'sp_capacity'}
+            Capacity record column
+        method : str {'binned', 'resampled'}
+            'binned' sums the capacity (voltage) increments in each bin of
+            the grid, 'resampled' interpolates on the grid and
+            differentiates, see differential.differentiate.
+        smoothing : str {'savgol', 'mean'} or None
+            Savitzky-Golay filter or moving average along the grid
+        window : int
+            Odd number of grid points of the smoothing filter
+        order : int
+            Order of the Savitzky-Golay polynomial
+
+        Returns
+        -------
+        grid : np.ndarray
+            Voltage grid
+        table : np.ndarray
+            (cycles, grid) array of dQ/dV, in capacity units per V. Negative
+            on discharge, nan outside the voltage range of a cycle.
+        """
+        return self._differential('dqdv', label, grid, start, stop, step,
+                                  capacity, method, smoothing, window, order)
+
+    def dvdq(self, label='CC_Chg', grid=None, start=0, stop=None, step=1,
+             capacity='capacity', method='binned', smoothing='savgol',
+             window=9, order=2):
+        """ Returns the differential voltage dV/dQ of the cycles.
+
+        Computed and kept per cycle like dqdv.
+
+        Parameters
+        ----------
+        label : str
+            Type of the steps to be analysed, e.g. 'CC_Chg' or 'CC_DChg'
+        grid : np.ndarray, optional
+            Uniform capacity grid. If None, 200 points from 0 to the
+            largest step capacity.
+        start : int
+            First cycle
+        stop : int
+            Last cycle
+        step : int
+            Read every 'step's cycles.
+        capacity, method, smoothing, window, order
+            See CellReadings.dqdv
+
+        Returns
+        -------
+        grid : np.ndarray
+            Capacity grid
+        table : np.ndarray
+            (cycles, grid) array of dV/dQ, in V per capacity unit, nan
+            outside the capacity range of a cycle.
+        """
+        return self._differential('dvdq', label, grid, start, stop, step,
+                                  capacity, method, smoothing, window, order)
+
+    def export(self, path, format='npy'):
+        """ Exports records, cycle table and step table in a binary format.
+
+        Records are written step by step, each one with the cycle_id and
+        step_id of its step, and can be read back with export.read_export,
+        memory mapped for the 'npy' and 'arrow' formats.
+
+        Parameters
+        ----------
+        path : str
+            Output directory ('npy', 'arrow' and 'parquet') or file
+            ('hdf5')
+        format : str {'npy', 'hdf5', 'arrow', 'parquet'}
+            'npy' writes a .npy file per column. 'hdf5' requires h5py,
+            'arrow' (Arrow IPC) and 'parquet' require pyarrow.
+        """
+
+        export.export(self, path, format)
+
+    def save_cycles(self, path=None, delimiter=' ', precision=5,
+                    compression=None):
+        """ Saves the cycle header values as text, one line per cycle.
+
+        Parameters
+        ----------
+        path : str or file object, optional
+            Output file name or file object. If None, the name of the input
+            file with extension '.cycles.dat', in the working directory.
+        delimiter : str
+            Separator of the fields of a line
+        precision : int
+            Number of digits after the decimal point of floats
+        compression : str {'gzip', 'zstd'}, optional
+            Compression of the output, inferred from a '.gz' or '.zst'
+            extension if None. 'zstd' requires Python >= 3.14 or
+            zstandard.
+
+        Returns
+        -------
+        str or file object
+            The output
+        """
+
+        if path is None:
+            root = os.path.splitext(os.path.basename(self.filename))[0]
+            path = root+".cycles.dat"
+
+        names = [name for name, _ in Cycle.head_entries]
+        export.save_table(self.cycle_table, path, names, delimiter,
+                          precision, compression)
+        return path
+
+    def save_records(self, path=None, columns=None, delimiter=' ',
+                     precision=5, compression=None):
+        """ Saves the records as text, one line per record.
+
+        Records are written in chunks of consecutive steps, so that memory
+        use stays bounded whatever the size of the file.
+
+        Parameters
+        ----------
+        path : str or file object, optional
+            Output file name or file object. If None, the name of the input
+            file with extension '.records.dat', in the working directory.
+        columns : list of str, optional
+            Columns to be written, among the record columns, 'cycle_id' and
+            'step_id'. If None, those of id, rel_time, volt, capacity and
+            sp_capacity that were parsed.
+        delimiter : str
+            Separator of the fields of a line
+        precision : int
+            Number of digits after the decimal point of floats
+        compression : str {'gzip', 'zstd'}, optional
+            Compression of the output, inferred from a '.gz' or '.zst'
+            extension if None. 'zstd' requires Python >= 3.14 or
+            zstandard.
+
+        Returns
+        -------
+        str or file object
+            The output
+        """
+
+        if path is None:
+            root = os.path.splitext(os.path.basename(self.filename))[0]
+            path = root+".records.dat"
+        if columns is None:
+            parsed = [name for name, _ in self.record_columns]
+            columns = [name for name in ('id', 'rel_time', 'volt',
+                                         'capacity', 'sp_capacity')
+                       if name in parsed]
+
+        export.save_records(self, path, columns, delimiter, precision,
+                            compression)
+        return path
+
+    def plot_voltage_delta(self, step_label, ax=None, show=None):
         """ Plot difference between initial and final voltage of step type.
 
         The method plot_voltage_delta plots the difference between the initial
@@ -163,22 +1325,37 @@ class CellReadings(object):
         ----------
         step_label : str  {'Rest', 'CC_Charge', 'CC_DChg'}
             Contains step type.
-        """
+        ax : matplotlib.axes.Axes, optional
+            Axes to draw on, the current pyplot axes if None
+        show : bool, optional
+            If True, call plt.show() once drawn. By default, only called
+            if ax is None.
 
-        idx = []  # cycle indices
-        deltas = []  # delta voltages
+        Returns
+        -------
+        list
+            Artists added to the axes
+        """
 
-        #--- Cycle over each cycle
-        for elem in self.cycles:
-            idx.append(elem.cycle_id)
-            deltas.append(elem.steps[step_label].voltage_delta)
+        #--- Select steps of the given type
+        steps = self.step_table[self.step_table['label'] == step_label]
+        idx = steps['cycle_id']  # cycle indices
+        deltas = steps['voltage_delta']  # delta voltages
 
         #--- Plot data with matplotlib
-        plt.scatter(idx, deltas)
-        plt.plot(idx, deltas)
-        plt.show()
-
-    def plot_voltage(self, start=0, stop=None, step=1):
+        axes = _axes(ax)
+        artists = [axes.scatter(idx, deltas)] + axes.plot(idx, deltas)
+        _show(ax, show)
+        return artists
+
+    def _plot_series(self, key, build):
+        #--- Decimated series of a plot, built once per key
+        if key not in self._plots:
+            self._plots[key] = build()
+        return self._plots[key]
+
+    def plot_voltage(self, start=0, stop=None, step=1,
+                     points=decimate.POINTS, ax=None, show=None):
         """ Plot voltage as a function of the record index.
 
         Parameters
@@ -189,24 +1366,46 @@ class CellReadings(object):
             Last cycle to plot
         step : int
             Read every 'step's cycles.
+        points : int or None
+            Resolution of the plot: the records are decimated to at most
+            5*points + 1 points, see decimate.decimate. If None, all records
+            are plotted.
+        ax : matplotlib.axes.Axes, optional
+            Axes to draw on, the current pyplot axes if None
+        show : bool, optional
+            If True, call plt.show() once drawn. By default, only called
+            if ax is None.
+
+        Returns
+        -------
+        list
+            Artists added to the axes
         """
 
-        idx = []  # record indexes
-        voltages = []
+        def build():
+            #--- Gather records of the selected cycles from the store
+            ranges = [(elem.record_start, elem.record_end)
+                      for cycle in self.cycles[start:stop:step]
+                      for elem in cycle.steps]
+            idx = self.store.take(ranges, 'id')  # record indexes
+            voltages = self.store.take(ranges, 'volt')
+            return decimate.decimate(idx, voltages, points)
 
-        #--- Cycle over each cycle
-        for cycle in self.cycles[start:stop:step]:
-            for step in cycle.steps.values():
-                idx.extend(step.records['id'])
-                voltages.extend(step.records['volt'])
+        idx, voltages = self._plot_series(
+            ('voltage', start, stop, step, points), build)
 
         #--- Plot data with matplotlib
-        plt.plot(idx, voltages)
-        plt.show()
+        artists = _axes(ax).plot(idx, voltages)
+        _show(ax, show)
+        return artists
 
-    def plot_spcapacity(self, start=0, stop=None, step=1):
+    def plot_spcapacity(self, start=0, stop=None, step=1,
+                        points=decimate.POINTS, ax=None, show=None):
         """ Plot specific capacity as a function of the voltage.
 
+        Steps of the same kind are drawn as a single LineCollection: charge
+        steps in red, discharge steps in blue and the others in black.
+
         Parameters
         ----------
         start : int
@@ -215,27 +1414,52 @@ class CellReadings(object):
             Last cycle to plot
         step : int
             Read every 'step's cycles.
+        points : int or None
+            Resolution of the plot: the records of each step are decimated
+            to at most 5*points + 1 points, see decimate.decimate. If None,
+            all records are plotted.
+        ax : matplotlib.axes.Axes, optional
+            Axes to draw on, the current pyplot axes if None
+        show : bool, optional
+            If True, call plt.show() once drawn. By default, only called
+            if ax is None.
+
+        Returns
+        -------
+        list
+            Artists added to the axes
         """
-        #--- Cycle over each cycle
-        for cycle in self.cycles[start:stop:step]:
-            for step in cycle.steps.values():
-                if step.label == 'CC_Chg':
-                    # Charge voltage is plotted in red
-                    plt.plot(step.records['volt'],
-                             step.records['sp_capacity'], 'r')
-                elif step.label == 'CC_DChg':
-                    # Discharge voltage is plotted in blue
-                    plt.plot(step.records['volt'],
-                             step.records['sp_capacity'], 'b')
-                else:
-                    # Rest voltage is plotted in black
-                    plt.plot(step.records['volt'],
-                             step.records['sp_capacity'], 'k')
+
+        def build():
+            #--- Gather the steps of each color from the store
+            labels = {'CC_Chg': 'r', 'CC_DChg': 'b'}  # others are black
+            colors = collections.OrderedDict([('r', []), ('b', []),
+                                              ('k', [])])
+            for cycle in self.cycles[start:stop:step]:
+                for elem in cycle.steps:
+                    colors[labels.get(elem.label, 'k')].append(
+                        (elem.record_start, elem.record_end))
+            return [(color, decimate.segments(
+                self.store.take(ranges, 'volt'),
+                self.store.take(ranges, 'sp_capacity'),
+                [end - begin for begin, end in ranges], points))
+                    for color, ranges in colors.items() if ranges]
+
+        series = self._plot_series(
+            ('spcapacity', start, stop, step, points), build)
+
+        #--- Plot one collection per color with matplotlib
+        axes = _axes(ax)
+        artists = [axes.add_collection(LineCollection(lines, colors=color))
+                   for color, lines in series]
+        axes.autoscale_view()
 
         #--- Show the plot
-        plt.show()
+        _show(ax, show)
+        return artists
 
-    def plot_efficiency(self, start=0, stop=None, step=1, mode='standard'):
+    def plot_efficiency(self, start=0, stop=None, step=1, mode='standard',
+                        ax=None, show=None):
         """ Plot battery efficiency as a function of the cycle number.
 
         Parameters
@@ -248,6 +1472,16 @@ class CellReadings(object):
             Read every 'step's cycles.
         mode : str {'standard', 'inverse'}
             Choose whether to compute discharge/charge (standard) or inverse.
+        ax : matplotlib.axes.Axes, optional
+            Axes to draw on, the current pyplot axes if None
+        show : bool, optional
+            If True, call plt.show() once drawn. By default, only called
+            if ax is None.
+
+        Returns
+        -------
+        list
+            Artists added to the axes
 
         Notes
         -----
@@ -255,24 +1489,23 @@ class CellReadings(object):
         and charge time. If mode is set to 'inverse', then it is computes as
         the ratio between the charge and discharge time.
         """
-        idx = []  # cycle indices
-        efficiency = []
-
-        # Cycle over cycles
-        for cycle in self.cycles[start:stop:step]:
-            idx.append(cycle.cycle_id)
-            efficiency.append(cycle.get_efficiency(mode))
+        # Slice the whole-table efficiencies
+        idx = self.cycle_table['cycle_id'][start:stop:step]  # cycle indices
+        efficiency = self.get_efficiency(mode)[start:stop:step]
 
         #--- Plot with matplotlib
-        plt.scatter(idx, efficiency)
-        plt.plot(idx, efficiency)
-        plt.show()
+        axes = _axes(ax)
+        artists = [axes.scatter(idx, efficiency)] + axes.plot(idx, efficiency)
+        _show(ax, show)
+        return artists
 
 
 class Cycle(object):
     """ Contains information of a (rest)-charge-discharge cycle.
     """
 
+    __slots__ = ('schema', 'properties', 'steps', 'steps_by_label')
+
     head_entries = [('cycle_id', int), ('charge_capacity', float),
                     ('discharge_capacity', float), ('charge_capacity_sp', float),
                     ('discharge_capacity_sp', float), ('efficiency', float),
@@ -288,17 +1521,21 @@ class Cycle(object):
                     ('energy_efficiency', lambda x: float(x[:-1]))]
                     
      
-    def __init__(self, cycle_header):
+    def __init__(self, cycle_header, schema=None):
         """ Initialize a Cycle object.
 
         Parameters
         ----------
         cycle_header : str
             Header containing infos about the cycle
+        schema : schema.Schema, optional
+            Columns of the file, those of schema.DEFAULT_HEADERS if None
         """
 
-        self.properties = collections.OrderedDict()
-        self.steps = collections.OrderedDict()
+        self.schema = schema or get_schema()
+        self.properties = {}  # header values, in file order
+        self.steps = []  # steps in file order
+        self.steps_by_label = {}  # label -> steps, in file order
         
         #--- Parse header and populate properties dictionary
         self._parse_header(cycle_header)
@@ -306,39 +1543,146 @@ class Cycle(object):
     def __str__(self):
         #--- Returns pretty representation of a Cycle object
         #    if printed with str.print()
-        return "Cycle_id: " + self.cycle_id
+        return "Cycle_id: " + str(self.properties['cycle_id'])
 
     def _parse_header(self, header_line):
         #--- Split header line
         header = header_line.split('\t')
 
         #--- Populate the properties dictionary with values from header
-        for idx, entry in enumerate(Cycle.head_entries):
-            # entry[1] is a function that converts the string to the right type
-            self.properties[entry[0]] = entry[1](header[idx])
-
-    def _add_step(self, step_header):
+        columns = self.schema.cycle
+        for name, convert in Cycle.head_entries:
+            # convert is a function that converts the string to the right type
+            column = columns[name]
+            value = convert(header[column.position])
+            if column.divisor != 1:
+                value /= column.divisor  # e.g. mV to V
+            self.properties[name] = value
+
+    def _add_step(self, step_header, duration=None):
         #--- Adds a step to the cycle object
 
         #--- Create a step object
-        step = Step(step_header, self.properties['cycle_id'])
+        step = Step(step_header, self.properties['cycle_id'], duration,
+                    self.schema)
 
-        #--- Add it to the steps dictionary in the cycle object
-        self.steps[step.label] = step
+        #--- Add it to the steps list and to the label index
+        self.steps.append(step)
+        self.steps_by_label.setdefault(step.label, []).append(step)
 
-        #--- Return the step label (so that the parser know where to add data)
-        return step.label
+        #--- Return the step (so that the parser know where to add data)
+        return step
 
-    def get_duration(self):
+    def get_steps(self, label=None):
+        """ Returns the steps of the cycle with a given label.
+
+        Parameters
+        ----------
+        label : str, optional
+            Step type (e.g. 'Rest', 'CC_Chg', 'CC_DChg'). All steps if None.
+
+        Returns
+        -------
+        list of Step
+            Matching steps in file order
+
+        Raises
+        ------
+        KeyError
+            If the cycle contains no step with the given label.
+        """
+
+        if label is None:
+            return self.steps
+        return self.steps_by_label[label]
+
+    def get_records(self, label=None):
+        """ Returns the records of all the steps with a given label.
+
+        Parameters
+        ----------
+        label : str, optional
+            Step type (e.g. 'Rest', 'CC_Chg', 'CC_DChg'). All steps if None.
+
+        Returns
+        -------
+        collections.OrderedDict
+            Records of the matching steps, in file order. Columns are views
+            of the record store if the steps are adjacent.
+        """
+
+        steps = self.get_steps(label)
+        if not steps:
+            return collections.OrderedDict()
+        ranges = [(step.record_start, step.record_end) for step in steps]
+        store = steps[0].store
+        return collections.OrderedDict(
+            (name, store.take(ranges, name)) for name in store.columns)
+
+    def dqdv(self, label='CC_Chg', grid=None, capacity='capacity',
+             method='binned', smoothing='savgol', window=9, order=2):
+        """ Returns the incremental capacity dQ/dV of the cycle.
+
+        Parameters
+        ----------
+        label : str
+            Type of the steps to be analysed, e.g. 'CC_Chg' or 'CC_DChg'
+        grid : np.ndarray, optional
+            Uniform voltage grid (V), covering the steps if None
+        capacity, method, smoothing, window, order
+            See CellReadings.dqdv
+
+        Returns
+        -------
+        grid : np.ndarray
+            Voltage grid
+        values : np.ndarray
+            dQ/dV on the grid, see CellReadings.dqdv
+        """
+        return _steps_differential(self.steps_by_label.get(label, []),
+                                   'dqdv', grid, capacity, method, smoothing,
+                                   window, order)
+
+    def dvdq(self, label='CC_Chg', grid=None, capacity='capacity',
+             method='binned', smoothing='savgol', window=9, order=2):
+        """ Returns the differential voltage dV/dQ of the cycle.
+
+        Parameters
+        ----------
+        label : str
+            Type of the steps to be analysed, e.g. 'CC_Chg' or 'CC_DChg'
+        grid : np.ndarray, optional
+            Uniform capacity grid, covering the steps if None
+        capacity, method, smoothing, window, order
+            See CellReadings.dqdv
+
+        Returns
+        -------
+        grid : np.ndarray
+            Capacity grid
+        values : np.ndarray
+            dV/dQ on the grid, see CellReadings.dvdq
+        """
+        return _steps_differential(self.steps_by_label.get(label, []),
+                                   'dvdq', grid, capacity, method, smoothing,
+                                   window, order)
+
+    def get_duration(self, label=None):
         """ Returns total duration of a battery (rest)-charge-discharge cycle.
 
+        Parameters
+        ----------
+        label : str, optional
+            Only sum the duration of steps of this type.
+
         Returns
         -------
         dt.timedelta
             timedelta object containing total duration of the battery cycle.
         """
 
-        return np.sum([step.duration for step in self.steps.values()])
+        return sum((step.duration for step in self.get_steps(label)),
+                   dt.timedelta())
 
     def get_efficiency(self, mode = 'standard'):
         """ Returns efficiency of the cycle.
@@ -354,8 +1698,8 @@ class Cycle(object):
             efficiency of the cycle
         """
         
-        discharge_time = self.steps['CC_DChg'].duration
-        charge_time = self.steps['CC_Chg'].duration
+        discharge_time = self.get_duration('CC_DChg')
+        charge_time = self.get_duration('CC_Chg')
 
         if mode == 'standard':
             return discharge_time/charge_time
@@ -365,43 +1709,56 @@ class Cycle(object):
             raise ValueError(
                 "'mode' argument accepts only 'standard' or 'inverse' parameters.") 
        
-    def plot_voltage(self, step='all'):
+    def plot_voltage(self, step='all', points=decimate.POINTS, ax=None,
+                     show=None):
         """ Plot voltage of a cycle as a function of the record index.
 
         Parameters
         ----------
         step : str {'all', 'charge', 'discharge'}
             Defines which step of a cycle should be plotted.
+        points : int or None
+            Resolution of the plot, see decimate.decimate. If None, all
+            records are plotted.
+        ax : matplotlib.axes.Axes, optional
+            Axes to draw on, the current pyplot axes if None
+        show : bool, optional
+            If True, call plt.show() once drawn. By default, only called
+            if ax is None.
+
+        Returns
+        -------
+        list
+            Artists added to the axes
         """
 
-        #--- Take all values in cycle step dictionary is step is 'all'
-        if step == 'all':
-            idx = []
-            voltages = []
-
-            for step in self.steps.values():
-                idx.extend(step.records['id'])
-                voltages.extend(step.records['volt'])
-        elif step == 'charge':
-            idx = self.steps['CC_Chg'].records['id']
-            voltages = self.steps['CC_Chg'].records['volt']
-        elif step == 'discharge':
-            idx = self.steps['CC_DChg'].records['id']
-            voltages = self.steps['CC_DChg'].records['volt']
-        else:
+        #--- Take records of all steps of the requested type
+        labels = {'all': None, 'charge': 'CC_Chg', 'discharge': 'CC_DChg'}
+        if step not in labels:
             raise ValueError(
                 "'step' argument can take 'all', 'charge', discharge' parameters only.")
 
+        records = self.get_records(labels[step])
+        idx, voltages = decimate.decimate(records['id'], records['volt'],
+                                          points)
+
         #--- Plot with matplotlib
-        plt.plot(idx, voltages)
-        plt.show()
+        artists = _axes(ax).plot(idx, voltages)
+        _show(ax, show)
+        return artists
 
 
 class Step(object):
     """ Contains informations about either a rest, charge or discharge step.
     """
 
-    def __init__(self, step_header, parent_cycle_id):
+    __slots__ = ('parent_cycle_id', 'step_id', 'label', 'capacity',
+                 'specific_capacity', 'energy', 'specific_energy',
+                 'capacitance', 'voltage_start', 'voltage_end', 'store',
+                 'record_start', 'record_end', '_duration')
+
+    def __init__(self, step_header, parent_cycle_id, duration=None,
+                 schema=None):
         """ Initialize a step object.
 
         Parameters
@@ -410,34 +1767,41 @@ class Step(object):
             Contains the header preceeding all records in a step
         parent_cycle_id : str
             Id of the cycle whose the step belongs.
+        duration : float, optional
+            Duration of the step in seconds, parsed from the header if None.
+            Durations of many steps are faster parsed at once with
+            helper.parse_times.
+        schema : schema.Schema, optional
+            Columns of the file, those of schema.DEFAULT_HEADERS if None
         """
 
-        #--- Attributes are quite self explanatory
+        #--- Locate fields with the schema and convert them to SI units
         header = step_header.split('\t')
+        columns = (schema or get_schema()).step
+        value = lambda name: (float(header[columns[name].position])
+                              / columns[name].divisor)
+
+        #--- Attributes are quite self explanatory
         self.parent_cycle_id = int(parent_cycle_id)
-        self.step_id = int(header[1])
-        self.label = header[2]
-        self.capacity = float(header[4])
-        self.specific_capacity = float(header[5])
-        self.energy = float(header[6])
-        self.specific_energy = float(header[7])
-        self.capacitance = float(header[8])
-        self.voltage_start = float(header[9])
-        self.voltage_end = float(header[10])
-
-        #--- Variables defined outside __init__
-        self.id_range = None
-
-        #--- Contains data for each record
-        self.records = collections.OrderedDict()
-
-        #--- Compute volt(end) - volt(start)
-        self.voltage_delta = self.voltage_end - self.voltage_start
-
-        #--- Duration of the step
-        hours, minutes, seconds, milliseconds = header[3].split(':')
-        self.duration = dt.timedelta(hours=int(hours), minutes=int(minutes),
-                                     seconds=int(seconds))
+        self.step_id = int(header[columns['step_id'].position])
+        self.label = sys.intern(header[columns['label'].position])
+        self.capacity = value('capacity')
+        self.specific_capacity = value('specific_capacity')
+        self.energy = value('energy')
+        self.specific_energy = value('specific_energy')
+        self.capacitance = value('capacitance')
+        self.voltage_start = value('voltage_start')
+        self.voltage_end = value('voltage_end')
+
+        #--- Record store and offsets of the records of the step
+        self.store = None
+        self.record_start = 0
+        self.record_end = 0
+
+        #--- Duration of the step in seconds
+        if duration is None:
+            duration = helper.parse_time(header[columns['duration'].position])
+        self._duration = float(duration)
 
     def __str__(self):
         #--- Returns pretty representation of a Step object
@@ -445,37 +1809,91 @@ class Step(object):
         return ("Step " + str(self.step_id) + " type "
                 + self.label + " of Cycle " + str(self.parent_cycle_id))
 
-    def _add_records(self, record_list):
-        #--- Adds records to a step object
-
-        # str: contains all record lines of a step in one single string
-        # replace the space between date and time in the last column with a T
-        # so that the datetime format is iso compliant
-        string = ''.join(record_list).replace(' ', 'T')
-
-        # --- Create a StringIO object that can be parsed by numpy.loadtxt()
-        csv = StringIO(string)
-
-        # func : lambda function to conver bytestring to string on the fly
-        bstr2str = lambda x: str(x, encoding='utf-8')
-
-        # For the sake of brevity (sigh...)
-        records = self.records
-
-        # Read records into keys of the step records dictionary
-        records['id'], \
-            records['rel_time'], \
-            records['volt'], \
-            records['capacity'], \
-            records['sp_capacity'] = np.loadtxt(csv,
-                                                usecols=(0, 1, 2, 5, 6, 9),
-                                                unpack=True,
-                                                dtype=[('id', np.int),
-                                                       ('rel_time', np.float64),
-                                                       ('volt', np.float64),
-                                                       ('capacity', np.float64),
-                                                       ('sp_capacity', np.float64)],
-                                                converters={1: bstr2seconds})
-
-        #--- Save the minimum and maximum record id of the step
-        self.id_range = (self.records['id'][1], self.records['id'][-1])
+    @property
+    def voltage_delta(self):
+        """ float: volt(end) - volt(start).
+        """
+        return self.voltage_end - self.voltage_start
+
+    @property
+    def duration(self):
+        """ datetime.timedelta: duration of the step.
+        """
+        return dt.timedelta(seconds=self._duration)
+
+    @property
+    def records(self):
+        """ collections.OrderedDict: views of the record columns of the step.
+        """
+        if self.store is None:
+            return collections.OrderedDict()
+        return self.store.view(self.record_start, self.record_end)
+
+    @property
+    def id_range(self):
+        """ tuple: minimum and maximum record id of the step.
+        """
+        ids = self.records['id']
+        return (ids[0], ids[-1])
+
+    def dqdv(self, grid=None, capacity='capacity', method='binned',
+             smoothing='savgol', window=9, order=2):
+        """ Returns the incremental capacity dQ/dV of the step.
+
+        Parameters
+        ----------
+        grid : np.ndarray, optional
+            Uniform voltage grid (V), covering the step if None
+        capacity, method, smoothing, window, order
+            See CellReadings.dqdv
+
+        Returns
+        -------
+        grid : np.ndarray
+            Voltage grid
+        values : np.ndarray
+            dQ/dV on the grid, see CellReadings.dqdv
+        """
+        return _steps_differential([self], 'dqdv', grid, capacity, method,
+                                   smoothing, window, order)
+
+    def dvdq(self, grid=None, capacity='capacity', method='binned',
+             smoothing='savgol', window=9, order=2):
+        """ Returns the differential voltage dV/dQ of the step.
+
+        Parameters
+        ----------
+        grid : np.ndarray, optional
+            Uniform capacity grid, covering the step if None
+        capacity, method, smoothing, window, order
+            See CellReadings.dqdv
+
+        Returns
+        -------
+        grid : np.ndarray
+            Capacity grid
+        values : np.ndarray
+            dV/dQ on the grid, see CellReadings.dvdq
+        """
+        return _steps_differential([self], 'dvdq', grid, capacity, method,
+                                   smoothing, window, order)
+
+    def _add_records(self, record_list, store, schema=None, columns=None,
+                     stats=None):
+        #--- Parses record lines and appends them to the store
+
+        # bytes: contains all record lines of a step in one single string
+        start = time.perf_counter()
+        timings = {} if stats is not None else None
+        records = parser.parse_records(''.join(record_list).encode('utf-8'),
+                                       schema, columns, timings)
+        if stats is not None:
+            stats.add_step(time.perf_counter() - start, timings)
+
+        self._set_records(store, *store.append(records, len(record_list)))
+
+    def _set_records(self, store, start, end):
+        #--- Sets the store and the offsets of the step records
+        self.store = store
+        self.record_start = start
+        self.record_end = end
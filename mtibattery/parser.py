@@ -0,0 +1,655 @@
+"""Vectorized parser for MtiCorp Battery Analyzer output files.
+
+The output of the analyzer is a tab separated text file where the kind of
+each line is given by the number of its leading tabs: cycle headers have
+none, step headers have one and records have two. This module classifies
+all the lines of a byte buffer at once and parses all the records of the
+buffer with a single numpy call.
+"""
+
+import io
+import os
+import re
+import time
+import collections
+
+import numpy as np
+
+from . import helper
+from .schema import get_schema
+
+#--- Line kinds, equal to the number of leading tabs of the line
+CYCLE = 0
+STEP = 1
+RECORD = 2
+
+#--- Chunk size used when a file is not read in one go
+CHUNK_SIZE = 64 * 2**20
+
+#--- Bytes scanned at once by split_headers, small enough to stay in cache
+SCAN_WINDOW = 2**18
+
+#--- Record columns (name, dtype) that can be stored in Step.records.
+#    Voltages are in V and times in s, whatever the units of the file
+#    (see schema)
+RECORD_DTYPES = collections.OrderedDict([
+    ('id', np.int64), ('rel_time', np.float64), ('volt', np.float64),
+    ('current', np.float64), ('temperature', np.float64),
+    ('capacity', np.float64), ('sp_capacity', np.float64),
+    ('energy', np.float64), ('sp_energy', np.float64),
+    ('realtime', 'datetime64[s]')])
+
+#--- Record columns (name, dtype) stored by default
+RECORD_COLUMNS = [(name, RECORD_DTYPES[name]) for name in
+                  ('id', 'rel_time', 'volt', 'capacity', 'sp_capacity',
+                   'realtime')]
+
+
+class ParseError(ValueError):
+    """ Raised when a file does not follow the analyzer output format.
+    """
+
+
+def record_columns(names=None):
+    """ Returns the record columns to be parsed.
+
+    Parameters
+    ----------
+    names : list of str, optional
+        Names of the columns, among RECORD_DTYPES. RECORD_COLUMNS if None.
+
+    Returns
+    -------
+    list of tuple
+        (name, dtype) of each column, in the given order
+
+    Raises
+    ------
+    ValueError
+        If a name is not a record column
+    """
+    if names is None:
+        return list(RECORD_COLUMNS)
+    if isinstance(names, str):
+        names = [names]
+    unknown = [name for name in names if name not in RECORD_DTYPES]
+    if unknown:
+        raise ValueError("Unknown record columns {}, expected some of {}"
+                         .format(unknown, list(RECORD_DTYPES)))
+    return [(name, RECORD_DTYPES[name])
+            for name in collections.OrderedDict.fromkeys(names)]
+
+
+def parse_error(filename, error):
+    """ Wraps an error raised while parsing a file in a ParseError.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the file
+    error : Exception
+        Error raised while parsing
+
+    Returns
+    -------
+    ParseError
+        Error reporting filename and the original error
+    """
+    return ParseError("Unexpected error while reading file {}: {!r}".format(
+        filename, error))
+
+
+class Block(object):
+    """ Parsed content of a byte buffer made of whole lines.
+    """
+
+    def __init__(self, headers, lead, columns, spans, end, lines=0,
+                 timings=None):
+        """ Initialize a Block object.
+
+        Parameters
+        ----------
+        headers : list of tuple
+            (kind, line, n_records) for each cycle or step header line of
+            the buffer, in file order. n_records is the number of record
+            lines following the header line.
+        lead : int
+            Number of record lines preceding the first header line.
+        columns : collections.OrderedDict or None
+            Contains an array for each record column, covering all the
+            record lines of the buffer. None if records were not parsed.
+        spans : list of tuple
+            (start, end) byte offsets in the file of the record lines
+            preceding the first header line, followed by those of the
+            record lines following each header line.
+        end : int
+            Byte offset in the file following the last line of the block.
+        lines : int
+            Number of lines of the block.
+        timings : dict, optional
+            Seconds spent in each phase of the parsing of the block, see
+            stats.PHASES
+        """
+
+        self.headers = headers
+        self.lead = lead
+        self.columns = columns
+        self.spans = spans
+        self.end = end
+        self.lines = lines
+        self.timings = timings if timings is not None else {}
+
+
+def decode(line):
+    """ Converts a raw line to the string returned by a text mode readline.
+
+    Parameters
+    ----------
+    line : bytes
+        Raw line, possibly ending with '\\r\\n'
+
+    Returns
+    -------
+    str
+        Decoded line with universal newlines
+    """
+    return str(line, encoding='utf-8').replace('\r\n', '\n')
+
+
+def split_headers(data):
+    """ Locates the header lines of a byte buffer, counting the others.
+
+    Lines are told apart by their number of leading tabs (two or more for
+    record lines). The buffer is scanned in windows of SCAN_WINDOW bytes,
+    and only the offsets of header lines are kept, so that record lines
+    are counted without building arrays over all the lines.
+
+    Parameters
+    ----------
+    data : bytes or memoryview
+        Buffer to be split
+
+    Returns
+    -------
+    starts : np.ndarray
+        Offset of the first byte of each header line
+    ends : np.ndarray
+        Offset of the byte following each header line (newline included)
+    kinds : np.ndarray
+        Number of leading tabs of each header line (CYCLE or STEP)
+    positions : np.ndarray
+        Index of each header line among all the lines
+    lines : int
+        Number of lines of the buffer
+    """
+    buf = np.frombuffer(data, dtype=np.uint8)
+    size = len(buf)
+    parts = []
+    lines = 0
+    start = 0  # start of the next line
+
+    for begin in range(0, size, SCAN_WINDOW):
+        #--- Lines ending in this window
+        ends = np.flatnonzero(buf[begin:begin + SCAN_WINDOW] == ord('\n'))
+        if not ends.size:
+            continue
+        ends += begin + 1
+        starts = np.empty_like(ends)
+        starts[0] = start
+        starts[1:] = ends[:-1]
+
+        #--- Record lines start with two tabs
+        first = buf[starts] == ord('\t')
+        heads = np.flatnonzero(~(first & (buf[np.minimum(starts + 1, size - 1)]
+                                          == ord('\t'))))
+        parts.append((starts[heads], ends[heads],
+                      first[heads].astype(np.int64), heads + lines))
+        lines += len(ends)
+        start = int(ends[-1])
+
+    if start < size:
+        #--- Last line without newline
+        first = buf[start] == ord('\t')
+        if not (first and start + 1 < size
+                and buf[start + 1] == ord('\t')):
+            parts.append((np.array([start]), np.array([size]),
+                          np.array([int(first)]), np.array([lines])))
+        lines += 1
+
+    if not parts:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty, empty, lines
+    return tuple(np.concatenate(column) for column in zip(*parts)) + (lines,)
+
+
+def _elapsed(timings, phase, start):
+    #--- Adds the time elapsed since start to a phase, returns the time
+    now = time.perf_counter()
+    if timings is not None:
+        timings[phase] = timings.get(phase, 0.0) + now - start
+    return now
+
+
+def parse_records(buffer, schema=None, columns=None, timings=None):
+    """ Parses a buffer of record lines into typed column arrays.
+
+    Only the requested columns are converted, the other fields of the
+    lines are skipped.
+
+    Parameters
+    ----------
+    buffer : bytes
+        Record lines, each one starting with two tabs
+    schema : schema.Schema, optional
+        Columns of the file, those of schema.DEFAULT_HEADERS if None
+    columns : list of tuple, optional
+        (name, dtype) of the columns to be parsed, see record_columns.
+        RECORD_COLUMNS if None.
+    timings : dict, optional
+        If given, the seconds spent reading the fields ('records') and
+        converting times, dates and units ('convert') are added to it.
+
+    Returns
+    -------
+    collections.OrderedDict
+        Contains an array for each requested column
+    """
+    columns = RECORD_COLUMNS if columns is None else columns
+    parsed = collections.OrderedDict()
+
+    if not columns or not buffer.strip():
+        for name, dtype in columns:
+            parsed[name] = np.empty(0, dtype=dtype)
+        return parsed
+
+    usecols, dtype, conversions = (schema or get_schema()).record_plan(
+        columns)
+
+    # Time columns are read as raw bytes and converted in one pass
+    start = time.perf_counter()
+    table = np.loadtxt(io.BytesIO(buffer), delimiter='\t', usecols=usecols,
+                       ndmin=1, dtype=dtype)
+    start = _elapsed(timings, 'records', start)
+
+    for name, kind, argument in conversions:
+        if kind == 'time':
+            parsed[name] = helper.parse_times(table[name], argument)
+        elif kind == 'datetime':
+            parsed[name] = helper.parse_datetimes(table[name])
+        elif kind == 'scale':
+            parsed[name] = table[name]/argument
+        else:
+            parsed[name] = np.ascontiguousarray(table[name])
+    _elapsed(timings, 'convert', start)
+
+    return parsed
+
+
+def parse_block(data, base=0, records=True, schema=None, columns=None):
+    """ Parses a byte buffer made of whole lines.
+
+    Parameters
+    ----------
+    data : bytes or memoryview
+        Buffer to be parsed
+    base : int
+        Offset of the buffer in the file
+    records : bool
+        If False, only header lines are parsed and record lines are
+        just located.
+    schema : schema.Schema, optional
+        Columns of the file, see parse_records
+    columns : list of tuple, optional
+        Record columns to be parsed, see parse_records
+
+    Returns
+    -------
+    Block
+        Header lines and record columns of the buffer, with the time spent
+        splitting lines ('split') and parsing records (see parse_records)
+    """
+    timings = {}
+    start = time.perf_counter()
+    starts, ends, kinds, positions, lines = split_headers(data)
+
+    #--- Header lines split the buffer in runs of record lines
+    counts = np.diff(np.append(positions, lines)) - 1
+    lead = int(positions[0]) if positions.size else lines
+    # runs end where the next header line starts
+    bounds = np.append(starts, len(data))
+
+    headers = []
+    spans = [(base, base + int(bounds[0]))]
+    for index, (begin, end, kind, count) in enumerate(zip(
+            starts.tolist(), ends.tolist(), kinds.tolist(),
+            counts.tolist())):
+        headers.append((kind, decode(data[begin:end]), count))
+        spans.append((base + end, base + int(bounds[index + 1])))
+    _elapsed(timings, 'split', start)
+
+    #--- Parse all records at once
+    parsed = None
+    if records:
+        buffer = b''
+        if columns is None or columns:  # no record to join otherwise
+            start = time.perf_counter()
+            buffer = b''.join(data[begin - base:end - base]
+                              for begin, end in spans if end > begin)
+            _elapsed(timings, 'records', start)
+        parsed = parse_records(buffer, schema, columns, timings)
+
+    return Block(headers, lead, parsed, spans, base + len(data), lines,
+                 timings)
+
+
+def split_file(filename, parts):
+    """ Splits a file in byte ranges starting with a cycle header line.
+
+    Cycle headers are the only lines not starting with a tab. The file is
+    cut in parts of about the same size, and each cut is moved forward to
+    the beginning of the following cycle header, so that only the bytes up
+    to the next cycle header are read. Cuts falling before the previous
+    range ends are dropped, so that long cycles give fewer ranges.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the input file
+    parts : int
+        Number of ranges to split the file in
+
+    Returns
+    -------
+    column_headers : list of str
+        The first three lines of the file
+    ranges : list of tuple
+        (start, end) byte offsets of each range, covering the file after
+        the column headers
+    """
+    with open(filename, 'rb') as data:
+        column_headers = [decode(data.readline()) for i in range(3)]
+        first = data.tell()
+        size = data.seek(0, 2)
+
+        bounds = [first]
+        for part in range(1, parts):
+            position = first + (size - first)*part//parts
+            if position <= bounds[-1]:
+                continue  # already moved past by the previous cut
+
+            #--- Look for a newline followed by something else than a tab,
+            #    scanning each chunk once (and the last byte of the
+            #    previous one, where the newline may be)
+            data.seek(position)
+            previous = b''
+            bound = None
+            while True:
+                chunk = data.read(2**16)
+                if not chunk:
+                    break
+                match = re.search(b'\n[^\t]', previous + chunk)
+                if match:
+                    bound = position - len(previous) + match.start() + 1
+                    break
+                position += len(chunk)
+                previous = chunk[-1:]
+            if bound is None:
+                break
+            bounds.append(bound)
+        bounds.append(size)
+
+    return column_headers, list(zip(bounds[:-1], bounds[1:]))
+
+
+def parse_range(filename, start, end, records=True, schema=None,
+                columns=None):
+    """ Parses a byte range of a file.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the input file
+    start : int
+        Offset of the first byte of the range, at the beginning of a line
+    end : int
+        Offset following the last byte of the range. A last line without
+        newline is not parsed.
+    records : bool
+        If False, record lines are located but not parsed.
+    schema : schema.Schema, optional
+        Columns of the file, read from its first lines if None
+    columns : list of tuple, optional
+        Record columns to be parsed, see parse_records
+
+    Returns
+    -------
+    Block
+        Parsed content of the range
+    """
+    if schema is None:
+        schema = read_schema(filename)
+    begin = time.perf_counter()
+    with open(filename, 'rb') as data:
+        data.seek(start)
+        chunk = data.read(end - start)
+    read = time.perf_counter() - begin
+    cut = chunk.rfind(b'\n') + 1
+    block = parse_block(memoryview(chunk)[:cut], start, records, schema,
+                        columns)
+    block.timings['read'] = read
+    return block
+
+
+def read_schema(filename):
+    """ Reads the column headers of a file.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the input file
+
+    Returns
+    -------
+    schema.Schema
+        Columns described by the first three lines of the file
+    """
+    with open(filename, 'rb') as data:
+        return get_schema([decode(data.readline()) for i in range(3)])
+
+
+def data_size(filename):
+    """ Returns the number of bytes following the column header lines.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the input file
+
+    Returns
+    -------
+    int
+        Bytes of the cycle, step and record lines of the file
+    """
+    with open(filename, 'rb') as data:
+        for i in range(3):
+            data.readline()
+        first = data.tell()
+        return data.seek(0, 2) - first
+
+
+def last_line(filename):
+    """ Locates the last line of a file if it does not end with a newline.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the input file
+
+    Returns
+    -------
+    start : int
+        Offset following the last newline of the file, or the end of the
+        column header lines if the rest of the file has no newline
+    line : bytes
+        Bytes following start, empty if the file ends with a newline
+    """
+    with open(filename, 'rb') as data:
+        for i in range(3):
+            data.readline()
+        first = data.tell()
+        size = data.seek(0, 2)
+
+        #--- Look for the last newline backwards, a window at a time
+        end = size
+        while end > first:
+            start = max(first, end - 2**16)
+            data.seek(start)
+            cut = data.read(end - start).rfind(b'\n')
+            if cut >= 0:
+                first = start + cut + 1
+                break
+            end = start
+
+        data.seek(first)
+        return first, data.read(size - first)
+
+
+def read_tail(filename, position=None, schema=None, columns=None):
+    """ Parses the last line of a file if it does not end with a newline.
+
+    The line is complete if the file was closed without a final newline,
+    but is cut if the file is still being written. Lines of the analyzer
+    end with a tab: a line is only parsed if it does and if its records
+    parse.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the input file
+    position : int, optional
+        Offset following the last complete line, found with last_line if
+        None
+    schema : schema.Schema, optional
+        Columns of the file, see parse_records
+    columns : list of tuple, optional
+        Record columns to be parsed, see parse_records
+
+    Returns
+    -------
+    Block or None
+        The parsed line, None if the file ends with a newline, if lines
+        were appended after position or if the line is cut
+    """
+    if position is None:
+        position, line = last_line(filename)
+    else:
+        with open(filename, 'rb') as data:
+            data.seek(position)
+            line = data.read()
+    if not line or b'\n' in line or not line.rstrip(b'\r').endswith(b'\t'):
+        return None
+
+    try:
+        block = parse_block(line, position, True, schema, columns)
+    except (ValueError, IndexError, KeyError):
+        return None
+    if any(len(column) != block.lead for column in block.columns.values()):
+        return None  # record line without fields
+    return block
+
+
+def line_kind(line):
+    """ Returns the kind of a line from its leading tabs.
+
+    Parameters
+    ----------
+    line : bytes
+        Raw line
+
+    Returns
+    -------
+    int
+        CYCLE, STEP or RECORD
+    """
+    return min(len(line) - len(line.lstrip(b'\t')), RECORD)
+
+
+def read_file(filename, chunk_size=None, records=True, columns=None):
+    """ Reads and parses a file.
+
+    Parameters
+    ----------
+    filename : str
+        Name of the input file
+    chunk_size : int, optional
+        If None, the file is read with a single bulk read. Otherwise it is
+        read and parsed in chunks of about chunk_size bytes, split on line
+        boundaries. In both cases, a last line without newline may be
+        incomplete (e.g. still being written) and is not parsed: see
+        last_line.
+    records : bool
+        If False, record lines are located but not parsed.
+    columns : list of tuple, optional
+        Record columns to be parsed, see parse_records
+
+    Returns
+    -------
+    column_headers : list of str
+        The first three lines of the file
+    blocks : generator
+        Yields a Block for each chunk of the rest of the file
+    """
+    data = open(filename, 'rb')
+
+    #--- Read first three lines of header
+    column_headers = [decode(data.readline()) for i in range(3)]
+
+    return column_headers, _iter_blocks(data, chunk_size, records,
+                                        get_schema(column_headers), columns)
+
+
+def _iter_blocks(data, chunk_size, records, schema, columns):
+    #--- Parses an open file in chunks made of whole lines
+    with data:
+        base = data.tell()  # offset of the next chunk in the file
+
+        if chunk_size is None:
+            start = time.perf_counter()
+            chunk = data.read()
+            read = time.perf_counter() - start
+            cut = chunk.rfind(b'\n') + 1
+            if cut:
+                block = parse_block(memoryview(chunk)[:cut], base, records,
+                                    schema, columns)
+                block.timings['read'] = read
+                yield block
+            return
+
+        #--- Chunks are read into a reused buffer, after the incomplete
+        #    line left by the previous chunk (blocks keep no reference to it)
+        buffer = bytearray(max(1, min(chunk_size, os.fstat(
+            data.fileno()).st_size - base)))
+        filled = 0  # bytes of the incomplete line at the start of buffer
+        read = 0.0  # time spent reading the chunks of the next block
+        while True:
+            if filled == len(buffer):
+                #--- Line longer than the buffer
+                buffer.extend(bytes(len(buffer)))
+            start = time.perf_counter()
+            with memoryview(buffer) as view:
+                count = data.readinto(view[filled:])
+            read += time.perf_counter() - start
+            if not count:
+                break
+            end = filled + count
+            cut = buffer.rfind(b'\n', 0, end) + 1
+            if cut:
+                with memoryview(buffer) as view:
+                    block = parse_block(view[:cut], base, records, schema,
+                                        columns)
+                block.timings['read'] = read
+                read = 0.0
+                buffer[:end - cut] = buffer[cut:end]
+                base += cut
+                yield block
+            filled = end - cut
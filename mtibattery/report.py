@@ -0,0 +1,173 @@
+"""Batch rendering of the standard plots of many battery analyzer files.
+
+Each file is loaded and plotted by a worker process on figures created
+without pyplot and rendered with the Agg canvas, so that no window is
+opened, no figure outlives its rendering and files are rendered in
+parallel.
+"""
+
+import os
+import concurrent.futures
+
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+
+from .mtibattery import CellReadings
+
+#--- Standard plots: name -> (CellReadings method, x label, y label)
+PLOTS = {'voltage': ('plot_voltage', 'Record ID', 'Voltage (V)'),
+         'spcapacity': ('plot_spcapacity', 'Voltage (V)',
+                        'Specific capacity (mAh/g)'),
+         'efficiency': ('plot_efficiency', 'Cycle ID', 'Efficiency'),
+         'voltage_delta': ('plot_voltage_delta', 'Cycle ID',
+                           'Voltage delta (V)')}
+
+#--- Arguments of the plot methods that are not optional
+PLOT_ARGS = {'voltage_delta': ('CC_DChg',)}
+
+
+def render(readings, directory, plots=('voltage', 'spcapacity',
+                                       'efficiency'),
+           formats=('png',), dpi=100, size=(8, 6)):
+    """ Renders the standard plots of a parsed file to image files.
+
+    Parameters
+    ----------
+    readings : CellReadings
+        Parsed file
+    directory : str
+        Output directory, created if needed
+    plots : list of str
+        Plots to be rendered, among PLOTS
+    formats : list of str
+        Image formats, e.g. 'png' or 'svg'
+    dpi : int
+        Resolution of raster images
+    size : tuple
+        Width and height of the figures in inches
+
+    Returns
+    -------
+    list of str
+        Names of the files written, '<input name>.<plot>.<format>'
+    """
+    unknown = [name for name in plots if name not in PLOTS]
+    if unknown:
+        raise ValueError("Unknown plots {}, expected some of {}".format(
+            unknown, sorted(PLOTS)))
+    os.makedirs(directory, exist_ok=True)
+    root = os.path.splitext(os.path.basename(readings.filename))[0]
+
+    written = []
+    for name in plots:
+        method, xlabel, ylabel = PLOTS[name]
+        figure = Figure(figsize=size)
+        FigureCanvasAgg(figure)
+        ax = figure.add_subplot()
+        getattr(readings, method)(*PLOT_ARGS.get(name, ()), ax=ax,
+                                  show=False)
+        ax.set_xlabel(xlabel)
+        ax.set_ylabel(ylabel)
+        ax.set_title(root)
+        for format in formats:
+            filename = os.path.join(directory, '{}.{}.{}'.format(
+                root, name, format))
+            figure.savefig(filename, format=format, dpi=dpi)
+            written.append(filename)
+    return written
+
+
+def _render_file(filename, directory, options, render_options):
+    """ Loads and renders a file (run by worker processes).
+
+    Parameters
+    ----------
+    filename : str
+        Name of the input file
+    directory : str
+        Output directory
+    options : dict
+        Keyword arguments of CellReadings
+    render_options : dict
+        Keyword arguments of render
+
+    Returns
+    -------
+    list of str
+        Names of the files written
+    """
+    return render(CellReadings(filename, **options), directory,
+                  **render_options)
+
+
+def render_many(paths, directory, workers=None, progress=None,
+                plots=('voltage', 'spcapacity', 'efficiency'),
+                formats=('png',), dpi=100, size=(8, 6), **options):
+    """ Renders the standard plots of many files in parallel.
+
+    Files are loaded and rendered by a pool of worker processes, only the
+    names of the images written are sent back. Errors are collected per
+    file and do not stop the other files from rendering.
+
+    Parameters
+    ----------
+    paths : list of str
+        Names of the input files
+    directory : str
+        Output directory, created if needed
+    workers : int, optional
+        Number of worker processes, as many as the CPUs if None. If 1, files
+        are rendered in the calling process.
+    progress : callable, optional
+        Called as progress(done, total, filename, error) each time a file
+        is rendered, error being None on success.
+    plots, formats, dpi, size
+        See render
+    **options
+        Keyword arguments of CellReadings, e.g. cache or lazy
+
+    Returns
+    -------
+    images : dict
+        Names of the files written for each path that succeeded
+    errors : dict
+        Exception raised by each file that failed, by path
+    """
+    render_options = {'plots': tuple(plots), 'formats': tuple(formats),
+                      'dpi': dpi, 'size': size}
+    images = {}
+    errors = {}
+
+    def report(filename, result, error):
+        #--- Store the outcome of a file and report progress
+        if error is None:
+            images[filename] = result
+        else:
+            errors[filename] = error
+        if progress is not None:
+            progress(len(images) + len(errors), len(paths), filename, error)
+
+    if workers == 1:
+        for filename in paths:
+            try:
+                result = _render_file(filename, directory, options,
+                                      render_options)
+            except Exception as error:
+                report(filename, None, error)
+            else:
+                report(filename, result, None)
+        return images, errors
+
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        futures = {pool.submit(_render_file, filename, directory, options,
+                               render_options): filename
+                   for filename in paths}
+        for future in concurrent.futures.as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as error:
+                report(futures[future], None, error)
+            else:
+                report(futures[future], result, None)
+
+    return images, errors
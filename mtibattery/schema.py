@@ -0,0 +1,220 @@
+"""Column layout of battery analyzer output files.
+
+The first three lines of a file name the columns of cycle header lines,
+step header lines and record lines, with their units in parentheses, e.g.
+'Vol(mV)' or 'Time(H:M:S:ms)'. Analyzers write the same columns in
+different units (dialects). A Schema locates each column by name and knows
+how to convert its values to the units used by mtibattery, so that files of
+every dialect load into the same units.
+"""
+
+import re
+import collections
+
+import numpy as np
+
+#--- Names of the columns of cycle header lines (label -> name)
+CYCLE_NAMES = {'Cycle ID': 'cycle_id', 'Cap_Chg': 'charge_capacity',
+               'Cap_DChg': 'discharge_capacity',
+               'RCap_Chg': 'charge_capacity_sp',
+               'RCap_DChg': 'discharge_capacity_sp',
+               'Efficiency': 'efficiency', 'Engy_Chg': 'charge_energy',
+               'Engy_DChg': 'discharge_energy',
+               'Mid-value Voltage': 'midval_voltage',
+               'CC_Chg_Cap': 'charge_capacity2', 'CC_Chg_Rat': 'charge_ratio',
+               'Platform_Cap': 'platform_capacity',
+               'Platform_RCap': 'platform_capacity_sp',
+               'Platform_Efficiency': 'platform_efficiency',
+               'Platform_Time': 'platform_duration',
+               'Capacitance_Chg': 'charge_capacitance',
+               'Capacitance_DChg': 'discharge_capacicance', 'rd': 'rd',
+               'REngy_Chg': 'charge_energy_sp',
+               'REngy_DChg': 'discharge_energy_sp',
+               'Energy Efficiency': 'energy_efficiency'}
+
+#--- Names of the columns of step header lines (label -> name)
+STEP_NAMES = {'Step ID': 'step_id', 'Step Type': 'label',
+              'Step Time': 'duration', 'Cap': 'capacity',
+              'CmpCap': 'specific_capacity', 'Energy': 'energy',
+              'CmpEng': 'specific_energy', 'Capacitance_Chg': 'capacitance',
+              'Start Vol': 'voltage_start', 'End Vol': 'voltage_end',
+              'Start Temperature': 'temperature_start',
+              'End Temperature': 'temperature_end'}
+
+#--- Names of the columns of record lines (label -> name)
+RECORD_NAMES = {'Record ID': 'id', 'Time': 'rel_time', 'Vol': 'volt',
+                'Cur': 'current', 'Temperature': 'temperature',
+                'Cap': 'capacity', 'CmpCap': 'sp_capacity',
+                'Energy': 'energy', 'CmpEng': 'sp_energy',
+                'Realtime': 'realtime'}
+
+#--- Units converted on load: unit -> (unit after conversion, divisor)
+UNITS = {'mV': ('V', 1000.0), 'V': ('V', 1.0)}
+
+#--- Units of elapsed times, converted to seconds by helper.parse_times
+TIME_UNITS = ('H:M:S:ms', 'H:M:S', 'H')
+
+#--- Column headers of the files written by the first supported analyzers
+DEFAULT_HEADERS = [
+    'Cycle ID\tCap_Chg(mAh)\tCap_DChg(mAh)\tRCap_Chg(mAh/g)\t'
+    'RCap_DChg(mAh/g)\tEfficiency(%)\tEngy_Chg(mWh)\tEngy_DChg(mWh)\t'
+    'Mid-value Voltage(mV)\tCC_Chg_Cap(mAh)\tCC_Chg_Rat(%)\t'
+    'Platform_Cap(mAh)\tPlatform_RCap(mAh/g)\tPlatform_Efficiency(%)\t'
+    'Platform_Time\tCapacitance_Chg(F)\tCapacitance_DChg(F)\trd(mO)\t'
+    'REngy_Chg(mWh/g)\tREngy_DChg(mWh/g)\tEnergy Efficiency(%)\t\n',
+    '\tStep ID\tStep Type\tStep Time(H:M:S:ms)\tCap(mAh)\tCmpCap(mAh/g)\t'
+    'Energy(mWh)\tCmpEng(mWh/g)\tCapacitance_Chg(F)\tStart Vol(mV)\t'
+    'End Vol(mV)\tStart Temperature(?)\tEnd Temperature(?)\t\n',
+    '\t\tRecord ID\tTime(H:M:S:ms)\tVol(mV)\tCur(mA)\tTemperature(?)\t'
+    'Cap(mAh)\tCmpCap(mAh/g)\tEnergy(mWh)\tCmpEng(mWh/g)\tRealtime\t\n']
+
+#--- Schemas already built, by column headers
+_SCHEMAS = {}
+
+
+class Column(collections.namedtuple('Column',
+                                    'label unit position divisor')):
+    """ Column of a line: label and unit as written in the file, position
+    in the tab separated fields of the line and divisor converting its
+    values to the units used by mtibattery.
+    """
+    __slots__ = ()
+
+
+def parse_label(field):
+    """ Splits a column header field in label and unit.
+
+    Parameters
+    ----------
+    field : str
+        Column header field, e.g. 'Vol(mV)'
+
+    Returns
+    -------
+    tuple
+        (label, unit), unit is None if not given
+    """
+    match = re.match(r'^(.*?)\((.*)\)$', field.strip())
+    if match:
+        return match.group(1).strip(), match.group(2)
+    return field.strip(), None
+
+
+def parse_columns(line, names):
+    """ Locates the columns of a column header line.
+
+    Parameters
+    ----------
+    line : str
+        Column header line
+    names : dict
+        Name of the known columns, by label. Unknown columns are named
+        after their label.
+
+    Returns
+    -------
+    collections.OrderedDict
+        Column of each name, in file order
+    """
+    columns = collections.OrderedDict()
+    for position, field in enumerate(line.rstrip('\r\n').split('\t')):
+        if not field.strip():
+            continue
+        label, unit = parse_label(field)
+        divisor = UNITS[unit][1] if unit in UNITS else 1.0
+        columns[names.get(label, label)] = Column(label, unit, position,
+                                                  divisor)
+    return columns
+
+
+class Schema(object):
+    """ Columns of the cycle header, step header and record lines of a file.
+    """
+
+    def __init__(self, column_headers):
+        """ Initialize a Schema object.
+
+        Parameters
+        ----------
+        column_headers : list of str
+            First three lines of the file
+        """
+
+        self.column_headers = list(column_headers)
+        self.cycle = parse_columns(column_headers[0], CYCLE_NAMES)
+        self.step = parse_columns(column_headers[1], STEP_NAMES)
+        self.record = parse_columns(column_headers[2], RECORD_NAMES)
+
+        self._plans = {}  # record columns -> parse plan
+
+    @property
+    def dialect(self):
+        """ tuple: units of the record voltage and time columns.
+        """
+        return (self.record['volt'].unit, self.record['rel_time'].unit)
+
+    def record_plan(self, columns):
+        """ Returns how to parse record lines into columns.
+
+        Plans are built once per schema and set of columns.
+
+        Parameters
+        ----------
+        columns : list of tuple
+            (name, dtype) of each column to be parsed
+
+        Returns
+        -------
+        usecols : tuple
+            Position of each column in record lines
+        dtype : list of tuple
+            (name, dtype) of each column as read by np.loadtxt. Times and
+            dates are read as raw bytes.
+        conversions : list of tuple
+            (name, kind, argument) of each column. kind is 'time' (argument
+            is the time unit), 'datetime', 'scale' (argument is the
+            divisor) or None.
+
+        Raises
+        ------
+        KeyError
+            If a column is missing from the file
+        """
+        key = tuple(columns)
+        if key not in self._plans:
+            usecols, dtype, conversions = [], [], []
+            for name, target in columns:
+                column = self.record[name]
+                usecols.append(column.position)
+                if column.unit in TIME_UNITS:
+                    dtype.append((name, 'S16'))
+                    conversions.append((name, 'time', column.unit))
+                elif np.dtype(target).kind == 'M':
+                    dtype.append((name, 'S24'))
+                    conversions.append((name, 'datetime', None))
+                else:
+                    dtype.append((name, target))
+                    conversions.append(
+                        (name, 'scale' if column.divisor != 1 else None,
+                         column.divisor))
+            self._plans[key] = (tuple(usecols), dtype, conversions)
+        return self._plans[key]
+
+
+def get_schema(column_headers=None):
+    """ Returns the schema of a file, shared by files with the same headers.
+
+    Parameters
+    ----------
+    column_headers : list of str, optional
+        First three lines of the file, DEFAULT_HEADERS if None
+
+    Returns
+    -------
+    Schema
+        Schema of the file
+    """
+    key = tuple(column_headers or DEFAULT_HEADERS)
+    if key not in _SCHEMAS:
+        _SCHEMAS[key] = Schema(key)
+    return _SCHEMAS[key]
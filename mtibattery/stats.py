@@ -0,0 +1,197 @@
+"""Instrumentation of the loading of battery analyzer files.
+
+A ParseStats object collects the time spent in each phase of a load,
+counts the bytes, lines, records, cycles and steps parsed, the time spent
+parsing the records of single steps and the peak memory of the process.
+Phases are timed by the parser for each block, also in worker processes,
+and added up by CellReadings. Loads are reported to the 'mtibattery'
+logger and to an optional callback.
+"""
+
+import sys
+import time
+import logging
+import contextlib
+import collections
+
+import numpy as np
+
+#--- Phases of a load
+#    read: reading the file, split: locating and classifying lines,
+#    records: reading record fields (np.loadtxt), convert: converting
+#    times, dates and units, objects: creating Cycle and Step objects,
+#    store: copying records to the record store
+PHASES = ('read', 'split', 'records', 'convert', 'objects', 'store')
+
+#--- Counters of a load
+COUNTERS = ('bytes', 'lines', 'records', 'cycles', 'steps', 'blocks')
+
+logger = logging.getLogger(__name__)
+
+
+def peak_memory():
+    """ Returns the peak resident memory of the process.
+
+    Returns
+    -------
+    float or None
+        Peak resident memory in MB, None where the resource module is not
+        available
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak/2**20 if sys.platform == 'darwin' else peak/2**10
+
+
+class ParseStats(object):
+    """ Timers and counters of the loads of a file.
+    """
+
+    def __init__(self, callback=None):
+        """ Initialize an empty ParseStats object.
+
+        Parameters
+        ----------
+        callback : callable, optional
+            Called as callback(stats) at the end of each load (the initial
+            read and each refresh)
+        """
+
+        self.callback = callback
+        self.timers = collections.OrderedDict((phase, 0.0)
+                                              for phase in PHASES)
+        self.counters = collections.OrderedDict((name, 0)
+                                                for name in COUNTERS)
+        self.step_times = []  # seconds to parse the records of single steps
+        self.total = 0.0  # seconds spent in loads
+        self.loads = 0  # number of loads
+        self.peak_memory = None  # MB, at the end of the last load
+
+    def add(self, phase, seconds):
+        """ Adds time to a phase.
+
+        Parameters
+        ----------
+        phase : str
+            Phase, see PHASES
+        seconds : float
+            Time spent in the phase
+        """
+        self.timers[phase] = self.timers.get(phase, 0.0) + seconds
+
+    @contextlib.contextmanager
+    def phase(self, phase):
+        """ Times the code of a with statement as a phase.
+
+        Parameters
+        ----------
+        phase : str
+            Phase, see PHASES
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(phase, time.perf_counter() - start)
+
+    def add_block(self, block):
+        """ Adds the timings and counters of a parsed block.
+
+        Parameters
+        ----------
+        block : parser.Block
+            Parsed block
+        """
+        for phase, seconds in block.timings.items():
+            self.add(phase, seconds)
+        counters = self.counters
+        counters['bytes'] += block.end - block.spans[0][0]
+        counters['lines'] += block.lines
+        counters['records'] += block.lead + sum(
+            count for _, _, count in block.headers)
+        steps = sum(1 for kind, _, _ in block.headers if kind)
+        counters['steps'] += steps
+        counters['cycles'] += len(block.headers) - steps
+        counters['blocks'] += 1
+
+    def add_step(self, seconds, timings=None):
+        """ Adds the parsing of the records of a single step.
+
+        Parameters
+        ----------
+        seconds : float
+            Time spent parsing the records of the step
+        timings : dict, optional
+            Seconds spent in each phase, see parser.parse_records
+        """
+        self.step_times.append(seconds)
+        for phase, elapsed in (timings or {}).items():
+            self.add(phase, elapsed)
+
+    def histogram(self, bins=10):
+        """ Returns the histogram of the parse times of single steps.
+
+        Steps are parsed one by one by the 'python' engine and on first
+        access in lazy mode. The 'numpy' engine parses all the steps of a
+        block at once, see timers.
+
+        Parameters
+        ----------
+        bins : int or sequence
+            Bins of the histogram, see np.histogram
+
+        Returns
+        -------
+        counts : np.ndarray
+            Number of steps in each bin
+        edges : np.ndarray
+            Edges of the bins in seconds
+        """
+        return np.histogram(self.step_times, bins)
+
+    def finish(self, filename, seconds):
+        """ Ends a load: snapshots memory, logs and calls the callback.
+
+        Parameters
+        ----------
+        filename : str
+            Name of the loaded file
+        seconds : float
+            Duration of the load
+        """
+        self.total += seconds
+        self.loads += 1
+        self.peak_memory = peak_memory()
+        logger.debug("Read %s in %.3f s: %s", filename, seconds,
+                     ', '.join('{} {:.3f} s'.format(phase, elapsed)
+                               for phase, elapsed in self.timers.items()))
+        if self.callback is not None:
+            self.callback(self)
+
+    def as_dict(self):
+        """ Returns the stats as plain Python objects (e.g. for JSON).
+
+        Returns
+        -------
+        dict
+            Contains 'timers', 'counters', 'total', 'loads', 'peak_memory'
+            and the 'step_times' summary (count, mean and max)
+        """
+        times = np.asarray(self.step_times)
+        return {'timers': dict(self.timers), 'counters': dict(self.counters),
+                'total': self.total, 'loads': self.loads,
+                'peak_memory': self.peak_memory,
+                'step_times': {'count': len(times),
+                               'mean': float(times.mean()) if len(times)
+                               else None,
+                               'max': float(times.max()) if len(times)
+                               else None}}
+
+    def __repr__(self):
+        return 'ParseStats({})'.format(', '.join(
+            '{}={}'.format(name, count)
+            for name, count in self.counters.items()))
@@ -0,0 +1,437 @@
+"""Columnar storage of the records of a battery analyzer file.
+"""
+
+import os
+import time
+import shutil
+import tempfile
+import weakref
+import collections
+
+import numpy as np
+
+from . import parser
+
+
+class RecordStore(object):
+    """ Contiguous columnar storage for all the records of a file.
+
+    Records are appended in chunks while a file is parsed. Once the store is
+    closed, each column is a single contiguous array (in memory or memory
+    mapped from disk) and steps access their records through views.
+    """
+
+    def __init__(self, directory=None, columns=None):
+        """ Initialize an empty RecordStore object.
+
+        Parameters
+        ----------
+        directory : str or bool, optional
+            If given, columns are written to raw binary files in a new
+            subdirectory of this directory (so that stores sharing it never
+            overwrite each other's files) and memory mapped when the store
+            is closed. If True, the subdirectory is created in the default
+            temporary directory. In both cases it is removed together with
+            the store.
+        columns : list of tuple, optional
+            (name, dtype) of the columns, so that they exist (empty) even if
+            no record is appended. Otherwise given by the first append.
+        """
+
+        if directory:
+            if directory is True:
+                directory = None
+            else:
+                os.makedirs(directory, exist_ok=True)
+            directory = tempfile.mkdtemp(prefix='mtibattery-', dir=directory)
+            weakref.finalize(self, shutil.rmtree, directory, True)
+
+        self.directory = directory or None
+        self.columns = collections.OrderedDict()  # name -> array
+        self.size = 0  # number of records
+
+        self._dtypes = collections.OrderedDict(  # name -> dtype
+            (name, np.dtype(dtype)) for name, dtype in columns or [])
+        self._chunks = []  # in memory chunks waiting to be concatenated
+        self._buffers = None  # in memory columns with spare capacity
+        self._files = {}  # name -> open file (memory mapped stores only)
+
+    def __len__(self):
+        return self.size
+
+    def _path(self, name):
+        return os.path.join(self.directory, name + '.bin')
+
+    def append(self, columns, length=None):
+        """ Appends a chunk of records to the store.
+
+        Parameters
+        ----------
+        columns : collections.OrderedDict
+            Contains an array for each record column, all with the same
+            length.
+        length : int, optional
+            Number of records, needed only if columns is empty
+
+        Returns
+        -------
+        tuple
+            (start, end) offsets of the appended records in the store
+        """
+        start = self.size
+        if length is None:
+            length = len(next(iter(columns.values()))) if columns else 0
+
+        for name, column in columns.items():
+            self._dtypes.setdefault(name, column.dtype)
+
+        if self.directory is None:
+            self._chunks.append(columns)
+        else:
+            for name, column in columns.items():
+                if name not in self._files:
+                    self._files[name] = open(self._path(name), 'wb')
+                np.ascontiguousarray(column, self._dtypes[name]).tofile(
+                    self._files[name])
+
+        self.size += length
+        return start, self.size
+
+    def append_block(self, block):
+        """ Appends the records of a parsed block to the store.
+
+        Parameters
+        ----------
+        block : parser.Block
+            Block parsed with its records
+
+        Returns
+        -------
+        tuple
+            (start, end) offsets of the appended records in the store
+        """
+        return self.append(block.columns, block.lead + sum(
+            count for _, _, count in block.headers))
+
+    def truncate(self, size, end=None):
+        """ Drops the records following an offset.
+
+        Used to parse again the last line of a file once it is complete.
+
+        Parameters
+        ----------
+        size : int
+            Number of records kept
+        end : int, optional
+            Byte offset in the file following the kept records, only
+            needed by LazyRecordStore
+        """
+        self.close()
+        if self.directory is not None:
+            #--- Later appends overwrite the dropped records
+            for name, handle in self._files.items():
+                handle.seek(size*self._dtypes[name].itemsize)
+        self.columns = collections.OrderedDict(
+            (name, column[:size]) for name, column in self.columns.items())
+        self.size = size
+
+    def close(self):
+        """ Makes every column a single contiguous array.
+
+        Can be called again after further appends: in memory columns are
+        then grown geometrically, so that repeated appends of few records
+        cost amortized constant time.
+        """
+        if self.directory is None:
+            if not self.columns and len(self._chunks) == 1:
+                #--- Use a single chunk as is
+                self.columns = collections.OrderedDict(self._chunks[0])
+            elif self._chunks and self._dtypes:
+                self._grow()
+            self._chunks = []
+        else:
+            for handle in self._files.values():
+                handle.flush()
+            for name, dtype in self._dtypes.items():
+                if self.size:
+                    self.columns[name] = np.memmap(self._path(name),
+                                                   dtype=dtype, mode='r',
+                                                   shape=(self.size,))
+                else:
+                    self.columns[name] = np.empty(0, dtype=dtype)
+
+        for name, dtype in self._dtypes.items():
+            self.columns.setdefault(name, np.empty(0, dtype=dtype))
+
+    def _grow(self):
+        #--- Copies pending chunks in buffers with spare capacity
+        filled = len(next(iter(self.columns.values()))) if self.columns else 0
+        buffers = self._buffers
+        if buffers is None or len(next(iter(buffers.values()))) < self.size:
+            capacity = max(self.size, 2 * filled)
+            buffers = collections.OrderedDict(
+                (name, np.empty(capacity, dtype=dtype))
+                for name, dtype in self._dtypes.items())
+            for name, column in self.columns.items():
+                buffers[name][:filled] = column
+
+        for chunk in self._chunks:
+            length = len(next(iter(chunk.values())))
+            for name, column in chunk.items():
+                buffers[name][filled:filled + length] = column
+            filled += length
+
+        self._buffers = buffers
+        self.columns = collections.OrderedDict(
+            (name, buffer[:self.size]) for name, buffer in buffers.items())
+
+    def view(self, start, end):
+        """ Returns views of all the columns between two offsets.
+
+        Parameters
+        ----------
+        start : int
+            Offset of the first record
+        end : int
+            Offset following the last record
+
+        Returns
+        -------
+        collections.OrderedDict
+            Contains a view of each column
+        """
+        return collections.OrderedDict(
+            (name, column[start:end]) for name, column in self.columns.items())
+
+    def take(self, ranges, name):
+        """ Gathers a column over several (start, end) ranges.
+
+        Parameters
+        ----------
+        ranges : list of tuple
+            (start, end) offsets of the records to be gathered
+        name : str
+            Name of the column
+
+        Returns
+        -------
+        np.ndarray
+            A view if ranges are adjacent, a copy otherwise
+        """
+        column = self.columns[name]
+        if not ranges:
+            return column[:0]
+
+        #--- Merge adjacent ranges so that a single slice is enough
+        merged = [list(ranges[0])]
+        for start, end in ranges[1:]:
+            if start == merged[-1][1]:
+                merged[-1][1] = end
+            else:
+                merged.append([start, end])
+
+        if len(merged) == 1:
+            return column[merged[0][0]:merged[0][1]]
+        return np.concatenate([column[start:end] for start, end in merged])
+
+
+class LazyRecordStore(object):
+    """ Record store that parses records from the file on demand.
+
+    The store only knows where the records of each step are located in the
+    file. The records of a step are parsed the first time they are accessed
+    and kept afterwards. Accessing the whole columns parses the whole file.
+    """
+
+    def __init__(self, filename, columns=None, stats=None):
+        """ Initialize an empty LazyRecordStore object.
+
+        Parameters
+        ----------
+        filename : str
+            Name of the file containing the records
+        columns : list of tuple, optional
+            (name, dtype) of the record columns to be parsed,
+            parser.RECORD_COLUMNS if None
+        stats : stats.ParseStats, optional
+            Where the parse time of each run of records is added
+        """
+
+        self.filename = filename
+        self.stats = stats
+        self.directory = None
+        self.size = 0  # number of records
+
+        self._starts = [0]  # offset in the store of the first record of runs
+        self._spans = []  # (start, end) byte offsets of runs in the file
+        self._runs = {}  # run index -> parsed columns
+        self._columns = None  # whole columns, once parsed
+        self._schema = None  # columns of the file, read when first needed
+        self._dtypes = collections.OrderedDict(  # name -> dtype
+            (name, np.dtype(dtype))
+            for name, dtype in (parser.RECORD_COLUMNS if columns is None
+                                else columns))
+
+    def __len__(self):
+        return self.size
+
+    def append_block(self, block):
+        """ Appends the records of a block parsed without records.
+
+        Parameters
+        ----------
+        block : parser.Block
+            Block parsed with records=False
+
+        Returns
+        -------
+        tuple
+            (start, end) offsets of the appended records in the store
+        """
+        start = self.size
+        counts = [block.lead] + [count for _, _, count in block.headers]
+
+        #--- Whole columns no longer cover all the records
+        self._columns = None
+
+        for count, span in zip(counts, block.spans):
+            if not count:
+                continue
+            if self._spans and self._spans[-1][1] == span[0]:
+                #--- Run continuing the last one (e.g. split between chunks)
+                self._spans[-1] = (self._spans[-1][0], span[1])
+                self._starts[-1] += count
+                self._runs.pop(len(self._spans) - 1, None)
+            else:
+                self._spans.append(span)
+                self._starts.append(self._starts[-1] + count)
+            self.size += count
+
+        return start, self.size
+
+    def truncate(self, size, end=None):
+        """ Drops the records following an offset.
+
+        Parameters
+        ----------
+        size : int
+            Number of records kept
+        end : int
+            Byte offset in the file following the kept records
+        """
+        self._columns = None
+        while self._starts[-1] > size:
+            index = len(self._spans) - 1
+            self._runs.pop(index, None)
+            if self._starts[-2] >= size:
+                #--- Whole run dropped
+                self._spans.pop()
+                self._starts.pop()
+            else:
+                self._spans[-1] = (self._spans[-1][0], end)
+                self._starts[-1] = size
+        self.size = size
+
+    def close(self):
+        """ Provided for compatibility with RecordStore.
+        """
+        self._offsets = np.array(self._starts)
+
+    @property
+    def columns(self):
+        """ collections.OrderedDict: whole record columns (parses the file).
+        """
+        if self._columns is None:
+            columns = list(self._dtypes.items())
+            store = RecordStore(columns=columns)
+            for block in parser.read_file(self.filename,
+                                          columns=columns)[1]:
+                store.append_block(block)
+            store.close()
+            self._columns = collections.OrderedDict(
+                (name, column[:self.size])
+                for name, column in store.columns.items())
+            self._runs = {}
+        return self._columns
+
+    def _run(self, index):
+        #--- Returns the columns of a run, parsing it if needed
+        if index not in self._runs:
+            if self._schema is None:
+                self._schema = parser.read_schema(self.filename)
+            start, end = self._spans[index]
+            begin = time.perf_counter()
+            timings = {} if self.stats is not None else None
+            with open(self.filename, 'rb') as data:
+                data.seek(start)
+                self._runs[index] = parser.parse_records(
+                    data.read(end - start), self._schema,
+                    list(self._dtypes.items()), timings)
+            if self.stats is not None:
+                self.stats.add_step(time.perf_counter() - begin, timings)
+        return self._runs[index]
+
+    def view(self, start, end):
+        """ Returns views of all the columns between two offsets.
+
+        Parameters
+        ----------
+        start : int
+            Offset of the first record
+        end : int
+            Offset following the last record
+
+        Returns
+        -------
+        collections.OrderedDict
+            Contains a view of each column if the records belong to a single
+            run of the file, a copy otherwise
+        """
+        if self._columns is not None:
+            return collections.OrderedDict(
+                (name, column[start:end])
+                for name, column in self._columns.items())
+
+        if end <= start:
+            return collections.OrderedDict(
+                (name, np.empty(0, dtype=dtype))
+                for name, dtype in self._dtypes.items())
+
+        first = int(np.searchsorted(self._offsets, start, 'right')) - 1
+        last = int(np.searchsorted(self._offsets, end, 'left')) - 1
+
+        parts = []
+        for index in range(first, last + 1):
+            offset = self._offsets[index]
+            parts.append(collections.OrderedDict(
+                (name, column[max(start - offset, 0):end - offset])
+                for name, column in self._run(index).items()))
+
+        if len(parts) == 1:
+            return parts[0]
+        return collections.OrderedDict(
+            (name, np.concatenate([part[name] for part in parts]))
+            for name in parts[0])
+
+    def take(self, ranges, name):
+        """ Gathers a column over several (start, end) ranges.
+
+        Parameters
+        ----------
+        ranges : list of tuple
+            (start, end) offsets of the records to be gathered
+        name : str
+            Name of the column
+
+        Returns
+        -------
+        np.ndarray
+            Gathered column
+        """
+        if self._columns is not None:
+            return RecordStore.take(self, ranges, name)
+        parts = [self.view(start, end)[name] for start, end in ranges]
+        if len(parts) == 1:
+            return parts[0]
+        return np.concatenate(parts) if parts else \
+            np.empty(0, dtype=self._dtypes[name])
@@ -20,6 +20,7 @@ setup(name='mtibattery',
           "Topic :: Scientific/Engineering"
       ],
       install_requires=['numpy', 'matplotlib'],
+      extras_require={'hdf5': ['h5py'], 'arrow': ['pyarrow']},
       #packages=find_packages(exclude=["*.tests", "*.tests.*", "tests.*", "tests"]),
       packages=['mtibattery'],
       zip_safe=False)
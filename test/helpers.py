@@ -0,0 +1,79 @@
+import os
+import shutil
+
+import numpy as np
+
+DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+
+FILES = sorted(name for name in os.listdir(DATA) if name.endswith('.txt'))
+
+
+def data_file(name):
+    return os.path.join(DATA, name)
+
+
+def copy_data(name, directory):
+    #--- Copy of a data file, that tests may modify
+    target = os.path.join(str(directory), name)
+    shutil.copyfile(data_file(name), target)
+    return target
+
+
+def assert_same_readings(first, second):
+    #--- Same headers, cycles, steps and records
+    assert first.headers == second.headers
+    assert len(first.cycles) == len(second.cycles)
+    for cycle, other in zip(first.cycles, second.cycles):
+        assert cycle.properties == other.properties
+        assert list(cycle.steps_by_label) == list(other.steps_by_label)
+        assert len(cycle.steps) == len(other.steps)
+        for step, other_step in zip(cycle.steps, other.steps):
+            for name in ('step_id', 'label', 'capacity', 'energy',
+                         'voltage_start', 'voltage_end', 'duration'):
+                assert getattr(step, name) == getattr(other_step, name)
+            records = step.records
+            other_records = other_step.records
+            assert list(records) == list(other_records)
+            for name in records:
+                assert records[name].dtype == other_records[name].dtype
+                assert np.array_equal(records[name], other_records[name])
+
+
+def _time(seconds):
+    #--- H:M:S:ms time of the analyzer
+    return '{}:{:02d}:{:02d}:000'.format(seconds//3600, seconds//60 % 60,
+                                         seconds % 60)
+
+
+def write_file(path, cycles):
+    """ Writes a small file in the dialect of 20151125_CuHcF_1B.txt.
+
+    cycles is a list of cycles, each a list of (label, duration in seconds,
+    number of records) steps. Record ids and times increase along the file,
+    the voltage of the n-th record of a step is 0.1*n V and its capacity n
+    mAh. Returns path.
+    """
+    with open(data_file('20151125_CuHcF_1B.txt'), 'rb') as data:
+        lines = [data.readline() for i in range(4)]
+    cycle_fields = lines[3].decode().split('\t')
+    record_id = 1
+    step_id = 1
+    with open(str(path), 'wb') as output:
+        output.write(b''.join(lines[:3]))
+        for cycle_id, steps in enumerate(cycles, 1):
+            cycle_fields[0] = str(cycle_id)
+            output.write('\t'.join(cycle_fields).encode())
+            for label, duration, count in steps:
+                output.write('\t{}\t{}\t{}\t{:.4f}\t0.0000\t0.0000\t0.0000\t'
+                             '0.0\t100.0\t{:.1f}\t0.0\t0.0\t\r\n'.format(
+                                 step_id, label, _time(duration), count,
+                                 100.0*count).encode())
+                for index in range(1, count + 1):
+                    output.write('\t\t{}\t{}\t{:.1f}\t0.0000\t0.0\t{:.4f}\t'
+                                 '0.0000\t0.0000\t0.0\t2015-11-25 11:43:{:02d}'
+                                 '\t\r\n'.format(record_id, _time(index),
+                                                 100.0*index, index,
+                                                 record_id % 60).encode())
+                    record_id += 1
+                step_id += 1
+    return str(path)
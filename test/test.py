@@ -1,27 +1,30 @@
 #!/usr/bin/env python
 import os
 import sys
-sys.path.insert(0, os.path.abspath('../mtibattery'))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(
+    __file__))))
 
 from mtibattery import CellReadings
 
 
-filename='../data/20151123_CuHcF_3A_for_elettra.txt'
-filename='../data/20151126_graphite_foil_blank.txt'
-filename='../../../angelo/20160621_AM15.txt'
-readings = CellReadings(filename)
+data = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+filename = os.path.join(data, '20151125_CuHcF_1B.txt')
 
 
-#readings.plot_voltage_delta('CC_Chg')
+if __name__ == '__main__':
+    readings = CellReadings(filename)
 
-#print(readings.cycle_number)
+    #readings.plot_voltage_delta('CC_Chg')
 
-#readings.cycles[1].plot_voltage(step='charge')
-#readings.plot_efficiency(step=1)
+    #print(readings.cycle_number)
 
-#print(readings.get_duration())
+    #readings.cycles[1].plot_voltage(step='charge')
+    #readings.plot_efficiency(step=1)
 
+    #print(readings.get_duration())
 
-#readings.plot_spcapacity(stride=50)
 
-readings.save()
+    #readings.plot_spcapacity(step=50)
+
+    readings.save_cycles()
+    readings.save_records()
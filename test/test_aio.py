@@ -0,0 +1,87 @@
+import os
+import time
+import asyncio
+
+from mtibattery import CellReadings, Monitor
+
+from helpers import assert_same_readings, data_file
+
+
+def start_file(name, directory, cut):
+    #--- Copy of the lines of a data file before cut, and the rest
+    with open(data_file(name), 'rb') as data:
+        content = data.read()
+    cut = content.rfind(b'\n', 0, cut) + 1
+    target = os.path.join(str(directory), name)
+    with open(target, 'wb') as output:
+        output.write(content[:cut])
+    return target, content[cut:]
+
+
+def record_calls(readings, calls, name, delay=0.0):
+    #--- Logs (and slows down) each refresh of readings
+    refresh = readings.refresh
+
+    def logged(max_bytes=None):
+        calls.append(name)
+        time.sleep(delay)
+        return refresh(max_bytes)
+    readings.refresh = logged
+
+
+def test_aload():
+    readings = asyncio.run(CellReadings.aload(data_file('CuNP.txt'),
+                                              columns=['volt']))
+    assert_same_readings(readings, CellReadings(data_file('CuNP.txt'),
+                                                columns=['volt']))
+
+
+def test_arefresh_coalesces(tmp_path):
+    target, rest = start_file('CuNP.txt', tmp_path, 600000)
+    readings = CellReadings(target)
+    with open(target, 'ab') as output:
+        output.write(rest)
+    calls = []
+    record_calls(readings, calls, 'cell', 0.1)
+
+    async def main():
+        return await asyncio.gather(readings.arefresh(),
+                                    readings.arefresh())
+    first, second = asyncio.run(main())
+    assert calls == ['cell']
+    assert first and first is second
+    assert_same_readings(readings, CellReadings(data_file('CuNP.txt')))
+    assert asyncio.run(readings.arefresh()) == []
+
+
+def test_monitor_is_fair(tmp_path):
+    big, big_rest = start_file('20151125_CuHcF_1B.txt', tmp_path, 10**6)
+    small, small_rest = start_file('CuNP.txt', tmp_path, 1220000)
+    readings = [CellReadings(big), CellReadings(small)]
+    for target, rest in ((big, big_rest), (small, small_rest)):
+        with open(target, 'ab') as output:
+            output.write(rest)
+    calls = []
+    record_calls(readings[0], calls, 'big')
+    record_calls(readings[1], calls, 'small')
+
+    monitor = Monitor(readings, concurrency=1, max_bytes=2**19)
+
+    async def main():
+        return await asyncio.gather(monitor.refresh(), monitor.refresh())
+    first, second = asyncio.run(main())
+
+    #--- The small file is refreshed in the first round, only once
+    rounds = -(-len(big_rest)//2**19)
+    assert calls[:2] == ['big', 'small']
+    assert calls.count('small') == 1
+    assert calls.count('big') in (rounds, rounds + 1)
+    assert first == second
+    assert_same_readings(readings[0],
+                         CellReadings(data_file('20151125_CuHcF_1B.txt')))
+    assert_same_readings(readings[1], CellReadings(data_file('CuNP.txt')))
+
+    #--- Each new object is returned once
+    created = first[0]
+    assert len(created) == len(set(map(id, created)))
+    assert asyncio.run(monitor.refresh()) == [[], []]
@@ -0,0 +1,88 @@
+import os
+
+import numpy as np
+import pytest
+
+from mtibattery import CellReadings, FileCache
+
+from helpers import assert_same_readings, copy_data, data_file
+
+FILENAME = data_file('CuNP.txt')
+
+
+def test_failed_save_still_loads(tmp_path, monkeypatch, caplog):
+    #--- A full disk only skips caching
+    def full(*args, **kwargs):
+        raise OSError(28, 'No space left on device')
+    monkeypatch.setattr(np, 'save', full)
+
+    cache = FileCache(str(tmp_path))
+    readings = CellReadings(FILENAME, cache=cache)
+    reference = CellReadings(FILENAME)
+    assert len(readings.cycles) == len(reference.cycles)
+    assert np.array_equal(readings.store.columns['volt'],
+                          reference.store.columns['volt'])
+    assert cache.entries() == []
+    assert not [name for name in os.listdir(str(tmp_path))
+                if name.startswith('.tmp-')]
+    assert 'Could not cache' in caplog.text
+
+
+def _entries(cache):
+    return [path for path, _, _ in cache.entries()]
+
+
+def test_cache_hit_matches_parse(tmp_path):
+    cache = FileCache(str(tmp_path / 'cache'))
+    first = CellReadings(FILENAME, cache=cache)
+    assert len(_entries(cache)) == 1
+    second = CellReadings(FILENAME, cache=cache)
+    assert_same_readings(second, first)
+    assert isinstance(second.store.columns['volt'], np.memmap)
+
+
+@pytest.mark.parametrize('change', ['append', 'same_size', 'touch'])
+def test_invalidation(tmp_path, change):
+    source = copy_data('CuNP.txt', tmp_path)
+    cache = FileCache(str(tmp_path / 'cache'))
+    CellReadings(source, cache=cache)
+    entry = _entries(cache)[0]
+
+    stat = os.stat(source)
+    with open(source, 'r+b') as data:
+        content = data.read()
+        if change == 'append':
+            data.write(b'\t\t')
+        elif change == 'same_size':
+            #--- Change a digit of the first record, keeping size and mtime
+            position = content.index(b'\n\t\t1\t') + 3
+            data.seek(position)
+            data.write(b'9')
+    if change == 'same_size':
+        os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    elif change == 'touch':
+        os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+    assert cache.load(source) is None
+    assert not os.path.exists(entry)
+    readings = CellReadings(source, cache=cache)
+    assert_same_readings(readings, CellReadings(source))
+
+
+def test_cache_disabled(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path))
+    CellReadings(FILENAME, cache=False)
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_eviction(tmp_path):
+    #--- Room for a single entry: the least recently used one goes
+    first = copy_data('CuNP.txt', tmp_path)
+    second = os.path.join(str(tmp_path), 'copy.txt')
+    with open(first, 'rb') as data, open(second, 'wb') as output:
+        output.write(data.read())
+    cache = FileCache(str(tmp_path / 'cache'), max_size=1)
+    CellReadings(first, cache=cache)
+    CellReadings(second, cache=cache)
+    assert cache.load(first) is None
+    assert cache.load(second) is not None
@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+
+from mtibattery import CellCollection, CellReadings
+from mtibattery.collection import group_by
+
+from helpers import FILES, assert_same_readings, data_file
+
+
+@pytest.fixture(scope='module')
+def cells():
+    paths = [data_file(name) for name in FILES]
+    return [CellReadings(path) for path in paths], \
+        CellCollection(paths, workers=1, cache=False)
+
+
+def test_collection_tables(cells):
+    readings, collection = cells
+    assert len(collection) == len(FILES)
+    assert collection.errors == {}
+    assert np.array_equal(collection.cycle_table,
+                          np.concatenate([elem.cycle_table
+                                          for elem in readings]))
+    for cell, elem in enumerate(readings):
+        start, end = collection.offsets[cell:cell + 2]
+        rows = collection.step_table[collection.step_cells == cell]
+        assert np.array_equal(rows['cycle_index'] - start,
+                              elem.step_table['cycle_index'])
+        assert np.all(collection.cycle_cells[start:end] == cell)
+
+
+def test_collection_metrics(cells):
+    readings, collection = cells
+    for name in ('coulombic_efficiency', 'efficiency', 'capacity_fade'):
+        values = collection.ragged(name)
+        for elem, cell_values in zip(readings, values):
+            expected = getattr(elem, 'get_' + name)()
+            assert np.allclose(cell_values, expected, equal_nan=True), name
+
+    #--- Cells without the reference cycle give nan
+    retention = collection.ragged(collection.metric('retention', 2))
+    for elem, cell_values in zip(readings, retention):
+        capacity = elem.cycle_table['discharge_capacity_sp']
+        if len(capacity) > 2:
+            assert np.allclose(cell_values, capacity/capacity[2],
+                               equal_nan=True)
+        else:
+            assert np.all(np.isnan(cell_values))
+
+
+def test_collection_padded(cells):
+    readings, collection = cells
+    padded = collection.padded('cycle_id', fill=-1)
+    lengths = [len(elem.cycles) for elem in readings]
+    assert padded.shape == (len(readings), max(lengths))
+    for row, elem, length in zip(padded, readings, lengths):
+        assert np.array_equal(row[:length], elem.cycle_table['cycle_id'])
+        assert np.all(row[length:] == -1)
+
+
+def test_group_by():
+    keys = np.array([2, 0, 2, 1, 0, 2])
+    values = np.array([1., 2., 3., np.nan, 4., 5.])
+    groups, result = group_by(keys, values)
+    assert np.array_equal(groups, [0, 1, 2])
+    assert np.allclose(result, [3., np.nan, 3.], equal_nan=True)
+    assert np.array_equal(group_by(keys, values, 'count')[1], [2, 0, 3])
+    assert np.allclose(group_by(keys, values, 'percentile', [0, 100])[1],
+                       [[2., 4.], [np.nan, np.nan], [1., 5.]],
+                       equal_nan=True)
+
+    groups, result = group_by([keys % 2, keys], values, 'sum')
+    assert groups.tolist() == [(0, 0), (0, 2), (1, 1)]
+    assert np.allclose(result, [6., 9., 0.])
+
+    with pytest.raises(ValueError):
+        group_by(keys, values, 'mode')
+
+
+def test_group_cycles_and_steps(cells):
+    readings, collection = cells
+    groups, result = collection.group_cycles('discharge_capacity', 'cell',
+                                             statistic='max')
+    assert np.array_equal(groups, np.arange(len(readings)))
+    assert np.allclose(result, [np.nanmax(elem.cycle_table[
+        'discharge_capacity']) for elem in readings])
+
+    #--- Mean over the cells of each bucket of 2 cycles
+    groups, result = collection.group_cycles('cycle_id', bucket=2)
+    positions = collection.cycle_positions
+    for group, value in zip(groups, result):
+        mask = positions // 2 == group
+        assert value == np.mean(collection.cycle_table['cycle_id'][mask])
+
+    groups, result = collection.group_steps('duration', ('cell', 'label'),
+                                            statistic='count')
+    for (cell, label), count in zip(groups.tolist(), result):
+        assert count == sum(len(cycle.steps_by_label.get(label, ()))
+                            for cycle in readings[cell].cycles)
+
+
+def test_collection_readings(cells, tmp_path):
+    readings, _ = cells
+    collection = CellCollection.from_readings(readings[:1],
+                                              cache=str(tmp_path))
+    assert collection.names == [FILES[0][:-4]]
+    assert_same_readings(collection.readings(FILES[0][:-4]), readings[0])
+    with pytest.raises(KeyError):
+        collection.cell('missing')
@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from mtibattery import CellReadings, FileCache, parser
+
+from helpers import data_file
+
+NAME = '20151125_CuHcF_1B.txt'
+
+#--- Options of the loads that project columns
+OPTIONS = [{}, {'engine': 'python'}, {'lazy': True}, {'workers': 2},
+           {'mmap': True}]
+
+
+@pytest.fixture(scope='module')
+def full():
+    return CellReadings(data_file(NAME), columns=list(parser.RECORD_DTYPES))
+
+
+def steps(readings):
+    return [step for cycle in readings.cycles for step in cycle.steps]
+
+
+def assert_same_steps(readings, other):
+    #--- Same cycles and steps, whatever the record columns
+    assert [cycle.properties for cycle in readings.cycles] \
+        == [cycle.properties for cycle in other.cycles]
+    for step, other_step in zip(steps(readings), steps(other)):
+        for name in ('step_id', 'label', 'capacity', 'duration',
+                     'record_start', 'record_end'):
+            assert getattr(step, name) == getattr(other_step, name)
+
+
+@pytest.mark.parametrize('options', OPTIONS)
+def test_projected_columns(full, options):
+    columns = ['realtime', 'current', 'energy']
+    readings = CellReadings(data_file(NAME), columns=columns, **options)
+    assert readings.record_columns == [(name, parser.RECORD_DTYPES[name])
+                                       for name in columns]
+    assert_same_steps(readings, full)
+    for step, other in zip(steps(readings), steps(full)):
+        assert list(step.records) == columns
+        for name in columns:
+            assert step.records[name].dtype == other.records[name].dtype
+            assert np.array_equal(step.records[name], other.records[name])
+
+
+@pytest.mark.parametrize('options', OPTIONS)
+def test_no_columns(full, options):
+    readings = CellReadings(data_file(NAME), columns=[], **options)
+    assert readings.record_columns == []
+    assert_same_steps(readings, full)
+    assert all(len(step.records) == 0 for step in steps(readings))
+    assert np.array_equal(readings.cycle_table, full.cycle_table)
+
+
+def test_default_columns():
+    readings = CellReadings(data_file('CuNP.txt'))
+    assert readings.record_columns == parser.RECORD_COLUMNS
+    assert parser.record_columns('volt') == [('volt', np.float64)]
+    assert parser.record_columns(['volt', 'id', 'volt']) \
+        == [('volt', np.float64), ('id', np.int64)]
+
+
+def test_unknown_column():
+    with pytest.raises(ValueError):
+        CellReadings(data_file('CuNP.txt'), columns=['volt', 'unknown'])
+
+
+def test_cache_by_columns(tmp_path):
+    cache = FileCache(str(tmp_path))
+    filename = data_file('CuNP.txt')
+    CellReadings(filename, cache=cache, columns=['volt'])
+    CellReadings(filename, cache=cache)
+    assert len(cache.entries()) == 2
+
+    cached = CellReadings.from_cache(filename, cache, columns=['volt'])
+    assert [name for name, _ in cached.record_columns] == ['volt']
+    assert CellReadings.from_cache(filename, cache, columns=['current']) \
+        is None
@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from mtibattery import decimate
+
+
+def series(size, seed=0):
+    generator = np.random.default_rng(seed)
+    return np.cumsum(generator.random(size)), generator.normal(size=size)
+
+
+def test_short_series_unchanged():
+    x, y = series(40)
+    assert np.array_equal(decimate.minmax_indices(x, y, 10), np.arange(40))
+    xs, ys = decimate.decimate(x, y, 10)
+    assert xs is x and ys is y
+    assert decimate.decimate(x, y, None) == (x, y)
+    assert len(decimate.minmax_indices(x[:0], y[:0])) == 0
+
+
+@pytest.mark.parametrize('size', [41, 1000, 1003])
+def test_minmax_indices(size):
+    x, y = series(size)
+    x[::7] *= -1  # x is not monotonic
+    points = 10
+    indices = decimate.minmax_indices(x, y, points)
+    assert len(indices) <= 5*points + 1
+    assert np.array_equal(indices, np.unique(indices))
+    assert indices[0] == 0 and indices[-1] == size - 1
+
+    #--- Extremes of each bucket are kept
+    width = -(-size // points)
+    for start in range(0, size, width):
+        kept = indices[(indices >= start) & (indices < start + width)]
+        for values in (x, y):
+            bucket = values[start:start + width]
+            assert values[kept].min() == bucket.min()
+            assert values[kept].max() == bucket.max()
+
+
+def test_segments():
+    x, y = series(300)
+    bounds = [100, 0, 150, 50]
+    result = decimate.segments(x, y, np.array(bounds), points=5)
+    assert len(result) == 3
+    for points, start, end in zip(result, (0, 100, 250), (100, 250, 300)):
+        assert points.shape[1] == 2
+        assert len(points) <= 5*5 + 1
+        assert tuple(points[0]) == (x[start], y[start])
+        assert tuple(points[-1]) == (x[end - 1], y[end - 1])
+        assert np.isin(points[:, 1], y[start:end]).all()
@@ -0,0 +1,63 @@
+import numpy as np
+import pytest
+
+from mtibattery import differential
+
+
+#--- Q = 2 V**2 sampled every mV from 0 to 4 V: dQ/dV = 4 V, dV/dQ = 1/(4 V)
+VOLT = np.linspace(0, 4, 4001)
+CAPACITY = 2*VOLT**2
+
+
+@pytest.mark.parametrize('method', differential.METHODS)
+@pytest.mark.parametrize('smoothing', differential.SMOOTHINGS)
+def test_dqdv_analytic(method, smoothing):
+    grid = differential.uniform_grid(0, 4, 200)
+    table = differential.differentiate(VOLT, CAPACITY, [len(VOLT)], [0], 1,
+                                       grid, method, smoothing)
+    assert table.shape == (1, 200)
+    # edges included
+    np.testing.assert_allclose(table[0], 4*grid, rtol=0, atol=0.75)
+    np.testing.assert_allclose(table[0, [0, -1]], [0, 16], rtol=0, atol=0.2)
+
+
+def test_savgol_exact_on_quadratic():
+    grid = differential.uniform_grid(0, 4, 200)
+    table = differential.differentiate(VOLT, CAPACITY, [len(VOLT)], [0], 1,
+                                       grid, 'resampled', 'savgol')
+    np.testing.assert_allclose(table[0], 4*grid, rtol=0, atol=1e-4)
+
+
+def test_discharge_is_negative():
+    #--- Capacity grows while the voltage decreases
+    grid = differential.uniform_grid(0, 4, 100)
+    table = differential.differentiate(VOLT[::-1],
+                                       CAPACITY[-1] - CAPACITY[::-1],
+                                       [len(VOLT)], [0], 1, grid)
+    np.testing.assert_allclose(table[0], -4*grid, rtol=0, atol=0.75)
+
+
+def test_rows_within_their_range():
+    #--- Second row covers 1-2 V only: nan elsewhere, exact within
+    grid = differential.uniform_grid(0, 4, 201)
+    volt = np.linspace(1, 2, 1001)
+    table = differential.differentiate(
+        np.concatenate([VOLT, volt]), np.concatenate([CAPACITY,
+                                                      2*volt**2]),
+        [len(VOLT), len(volt)], [0, 1], 2, grid, 'resampled', 'savgol')
+    inside = (grid >= 1) & (grid <= 2)
+    assert np.isnan(table[1, ~inside]).all()
+    np.testing.assert_allclose(table[1, inside], 4*grid[inside], rtol=0,
+                               atol=1e-6)
+
+
+def test_binned_integral():
+    #--- Binned increments add up to the total capacity
+    grid = differential.uniform_grid(0, 4, 200)
+    table = differential.binned(VOLT, CAPACITY,
+                                np.zeros(len(VOLT) - 1, dtype=np.int64), 1,
+                                np.ones(len(VOLT) - 1), grid)
+    spacing = grid[1] - grid[0]
+    widths = np.full(len(grid), spacing)
+    widths[[0, -1]] /= 2  # edge bins are half covered
+    assert np.isclose((table[0]*widths).sum(), CAPACITY[-1], rtol=1e-3)
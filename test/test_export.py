@@ -0,0 +1,142 @@
+import io
+import gzip
+
+import numpy as np
+import pytest
+
+from mtibattery import CellReadings
+from mtibattery import export
+
+from helpers import data_file, write_file
+
+#--- Optional dependency of each export format
+REQUIRES = {'npy': None, 'hdf5': 'h5py', 'arrow': 'pyarrow',
+            'parquet': 'pyarrow'}
+
+
+@pytest.fixture
+def readings(tmp_path):
+    return CellReadings(write_file(tmp_path / 'cell.txt', [
+        [('Charge CC', 60, 3), ('Rest', 30, 2)],
+        [('Charge CC', 90, 4)]]))
+
+
+def expected_records(readings):
+    #--- Records of all the steps, with the cycle_id and step_id columns
+    steps = [step for cycle in readings.cycles for step in cycle.steps]
+    sizes = [step.record_end - step.record_start for step in steps]
+    records = {}
+    records['cycle_id'] = np.repeat(
+        [cycle.properties['cycle_id'] for cycle in readings.cycles
+         for step in cycle.steps], sizes)
+    records['step_id'] = np.repeat([step.step_id for step in steps],
+                                   sizes)
+    for name, _ in readings.record_columns:
+        records[name] = np.concatenate([step.records[name]
+                                        for step in steps])
+    return records
+
+
+@pytest.mark.parametrize('format', export.FORMATS)
+def test_export_round_trip(readings, tmp_path, format):
+    if REQUIRES[format]:
+        pytest.importorskip(REQUIRES[format])
+    path = str(tmp_path / ('export.h5' if format == 'hdf5' else 'export'))
+    readings.export(path, format)
+    records, cycle_table, step_table = export.read_export(path)
+
+    expected = expected_records(readings)
+    assert list(records) == list(expected)
+    for name in expected:
+        assert records[name].dtype == expected[name].dtype, name
+        assert np.array_equal(records[name], expected[name]), name
+    for table, other in ((cycle_table, readings.cycle_table),
+                         (step_table, readings.step_table)):
+        assert table.dtype.names == other.dtype.names
+        for name in other.dtype.names:
+            assert np.array_equal(table[name], other[name]), name
+
+
+def test_export_unknown_format(readings, tmp_path):
+    with pytest.raises(ValueError):
+        readings.export(str(tmp_path / 'export'), 'csv')
+
+
+def test_save_records_to_file_objects(readings):
+    text = io.StringIO()
+    assert readings.save_records(text, ['step_id', 'id']) is text
+    lines = text.getvalue().splitlines()
+    assert lines[0] == '# 1. step_id | 2. id'
+    assert lines[1:] == ['{} {}'.format(step_id, record_id)
+                         for step_id, record_id in zip(
+                             expected_records(readings)['step_id'],
+                             range(1, 10))]
+
+    binary = io.BytesIO()
+    readings.save_records(binary, ['step_id', 'id'])
+    assert binary.getvalue().decode() == text.getvalue()
+
+
+def test_save_records_delimiter_and_precision(readings):
+    text = io.StringIO()
+    readings.save_records(text, ['id', 'volt'], delimiter=',', precision=2)
+    lines = text.getvalue().splitlines()
+    assert lines[1] == '1,1.00e-01'
+    assert lines[3] == '3,3.00e-01'
+    assert len(lines) == 10
+
+
+def test_save_records_unknown_column(readings):
+    with pytest.raises(ValueError):
+        readings.save_records(io.StringIO(), ['id', 'unknown'])
+
+
+def test_save_cycles(readings):
+    text = io.StringIO()
+    readings.save_cycles(text, delimiter='\t', precision=1)
+    lines = text.getvalue().splitlines()
+    assert lines[0].startswith('# 1. cycle_id | ')
+    assert len(lines) == 1 + len(readings.cycles)
+    assert [line.split('\t')[0] for line in lines[1:]] == ['1', '2']
+
+
+def test_save_records_gzip(readings, tmp_path):
+    path = str(tmp_path / 'records.dat.gz')
+    readings.save_records(path)
+    text = io.StringIO()
+    readings.save_records(text)
+    with gzip.open(path, 'rt', encoding='utf-8') as saved:
+        assert saved.read() == text.getvalue()
+
+
+def test_save_cycles_zstd(readings, tmp_path):
+    zstandard = pytest.importorskip('zstandard')
+    path = str(tmp_path / 'cycles.dat.zst')
+    readings.save_cycles(path)
+    text = io.StringIO()
+    readings.save_cycles(text)
+    with open(path, 'rb') as saved:
+        reader = zstandard.ZstdDecompressor().stream_reader(saved)
+        assert reader.read().decode() == text.getvalue()
+
+
+def test_compressed_text_file_object(readings):
+    with pytest.raises(ValueError):
+        readings.save_cycles(io.StringIO(), compression='gzip')
+    binary = io.BytesIO()
+    readings.save_cycles(binary, compression='gzip')
+    text = io.StringIO()
+    readings.save_cycles(text)
+    assert gzip.decompress(binary.getvalue()).decode() == text.getvalue()
+
+
+def test_export_real_file(tmp_path):
+    readings = CellReadings(data_file('CuNP.txt'))
+    path = str(tmp_path / 'export')
+    readings.export(path)
+    records, cycle_table, _ = export.read_export(path, mmap_mode=None)
+    assert len(records['cycle_id']) == sum(
+        step.record_end - step.record_start for cycle in readings.cycles
+        for step in cycle.steps)
+    assert np.array_equal(cycle_table['cycle_id'],
+                          readings.cycle_table['cycle_id'])
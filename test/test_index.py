@@ -0,0 +1,105 @@
+import numpy as np
+import pytest
+
+from mtibattery import CellReadings
+from mtibattery.index import SortedColumn
+
+from helpers import data_file, write_file
+
+#--- Three cycles of three steps, records numbered along the file
+CYCLES = [[('Rest', 10, 2), ('CC_Chg', 60, 4), ('CC_DChg', 60, 3)]]*3
+
+
+@pytest.mark.parametrize('values', [
+    [1, 2, 2, 5, 9], [5, 1, 9, 2, 2], [3], [],
+    np.array(['2015-11-25T11:43:07', '2015-11-25T11:43:05',
+              '2015-11-25T11:43:09'], dtype='datetime64[s]')])
+def test_sorted_column(values):
+    values = np.asarray(values)
+    column = SortedColumn(values)
+    assert column.sorted == bool((np.diff(values.astype(np.int64)) >= 0)
+                                 .all())
+    for value in np.unique(np.concatenate([values, values + 1])):
+        linear = np.flatnonzero(values == value)
+        found = column.find(value)
+        assert found == (int(linear[0]) if linear.size else None)
+    bounds = [None] + list(np.unique(values)) + \
+        ([values.max() + 1] if len(values) else [])
+    for low in bounds:
+        for high in bounds:
+            mask = np.ones(len(values), dtype=bool)
+            if low is not None:
+                mask &= values >= low
+            if high is not None:
+                mask &= values < high
+            selection = column.between(low, high)
+            assert np.arange(len(values))[selection].tolist() == \
+                np.flatnonzero(mask).tolist()
+
+
+def _reordered(tmp_path, order):
+    #--- File whose cycles are written in the given order
+    path = write_file(tmp_path / 'sorted.txt', CYCLES)
+    with open(path, 'rb') as data:
+        lines = data.read().split(b'\n')[:-1]
+    cycles = []
+    for line in lines[3:]:
+        if not line.startswith(b'\t'):
+            cycles.append([])
+        cycles[-1].append(line)
+    target = tmp_path / 'reordered.txt'
+    with open(str(target), 'wb') as output:
+        output.write(b'\n'.join(lines[:3] + [line for index in order
+                                             for line in cycles[index]])
+                     + b'\n')
+    return str(target)
+
+
+@pytest.fixture(params=[[0, 1, 2], [2, 0, 1]], ids=['sorted', 'unsorted'])
+def readings(request, tmp_path):
+    return CellReadings(_reordered(tmp_path, request.param))
+
+
+def test_cycle_lookup(readings):
+    for cycle in readings.cycles:
+        cycle_id = cycle.properties['cycle_id']
+        assert readings.cycle(cycle_id) is cycle
+    with pytest.raises(KeyError):
+        readings.cycle(4)
+
+
+def test_locate(readings):
+    for cycle in readings.cycles:
+        for step in cycle.steps:
+            for offset, record_id in enumerate(step.records['id'].tolist()):
+                assert readings.locate(record_id) == (cycle, step, offset)
+    for record_id in (0, 28, -1):
+        with pytest.raises(KeyError):
+            readings.locate(record_id)
+
+
+def test_slice_time(readings):
+    dates = readings.store.columns['realtime']
+    ids = readings.store.columns['id']
+    bounds = [None, dates.min(), dates[5], dates.max(),
+              dates.max() + np.timedelta64(1, 's')]
+    for start in bounds:
+        for stop in bounds:
+            mask = np.ones(len(dates), dtype=bool)
+            if start is not None:
+                mask &= dates >= start
+            if stop is not None:
+                mask &= dates < stop
+            records = readings.slice_time(start, stop)
+            assert records['id'].tolist() == ids[mask].tolist()
+    records = readings.slice_time(str(dates[5]))
+    assert np.shares_memory(records['id'], ids) == \
+        readings.index.column('realtime').sorted
+
+
+def test_id_range():
+    readings = CellReadings(data_file('20151125_CuHcF_1B.txt'))
+    for step in readings.cycles[0].steps:
+        ids = step.records['id']
+        assert step.id_range == (ids[0], ids[-1])
+    assert readings.cycles[0].steps[0].id_range == (1, 25)
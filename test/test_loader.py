@@ -0,0 +1,63 @@
+import os
+
+from mtibattery import CellReadings, FileCache, load_many
+
+from helpers import FILES, assert_same_readings, data_file
+
+
+def test_load_many_collects_errors(tmp_path):
+    broken = os.path.join(str(tmp_path), 'broken.txt')
+    with open(data_file('CuNP.txt'), 'rb') as data:
+        lines = data.read().split(b'\n')
+    with open(broken, 'wb') as output:
+        output.write(b'\n'.join(lines[:3] + [b'not a cycle\tline']
+                                + lines[3:]))
+    missing = os.path.join(str(tmp_path), 'missing.txt')
+    paths = [data_file('CuNP.txt'), missing, broken,
+             data_file('20151125_CuHcF_1B.txt')]
+
+    calls = []
+    readings, errors = load_many(
+        paths, workers=1, progress=lambda *args: calls.append(args))
+
+    assert readings[1] is None and readings[2] is None
+    assert sorted(errors) == sorted([missing, broken])
+    assert isinstance(errors[missing], OSError)
+    for index in (0, 3):
+        assert_same_readings(readings[index], CellReadings(paths[index]))
+
+    #--- One call per file, errors included
+    assert [call[:2] for call in calls] == [(done, 4) for done in
+                                            range(1, 5)]
+    assert sorted(call[2] for call in calls) == sorted(paths)
+    for done, total, filename, error in calls:
+        assert error is errors.get(filename)
+
+
+def test_load_many_summary():
+    paths = [data_file(name) for name in FILES]
+    readings, errors = load_many(paths, workers=1, summary=True)
+    assert errors == {}
+    for elem, path in zip(readings, paths):
+        assert_same_readings(elem, CellReadings(path))
+
+
+def test_load_many_cache(tmp_path):
+    cache = FileCache(str(tmp_path))
+    paths = [data_file('CuNP.txt')]
+    first, _ = load_many(paths, workers=1, cache=cache)
+    assert len(cache.entries()) == 1
+
+    calls = []
+    second, errors = load_many(paths, workers=1, cache=cache,
+                               progress=lambda *args: calls.append(args))
+    assert errors == {}
+    assert calls == [(1, 1, paths[0], None)]
+    assert_same_readings(first[0], second[0])
+
+
+def test_load_many_columns():
+    readings, errors = load_many([data_file('CuNP.txt')], workers=1,
+                                 columns=['volt'])
+    assert errors == {}
+    assert [name for name, _ in readings[0].record_columns] == ['volt']
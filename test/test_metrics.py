@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from mtibattery import CellReadings, metrics
+
+from helpers import FILES, data_file, write_file
+
+
+def assert_same_table(table, other):
+    assert table.dtype == other.dtype
+    for name in table.dtype.names:
+        assert np.array_equal(table[name], other[name]), name
+
+
+@pytest.mark.parametrize('name', FILES)
+def test_summary_matches_full_parse(name):
+    cycle_table, step_table = CellReadings.summary(data_file(name), True)
+    readings = CellReadings(data_file(name))
+    assert_same_table(cycle_table, readings.cycle_table)
+    assert_same_table(step_table, readings.step_table)
+    assert_same_table(CellReadings.summary(data_file(name)), cycle_table)
+
+
+def test_summary_without_final_newline(tmp_path):
+    with open(data_file('CuNP.txt'), 'rb') as data:
+        content = data.read()
+    target = str(tmp_path / 'CuNP.txt')
+    with open(target, 'wb') as output:
+        output.write(content.rstrip(b'\r\n'))
+    cycle_table, step_table = CellReadings.summary(target, True)
+    readings = CellReadings(data_file('CuNP.txt'))
+    assert_same_table(cycle_table, readings.cycle_table)
+    assert_same_table(step_table, readings.step_table)
+
+
+@pytest.mark.parametrize('name', FILES)
+def test_tables_match_objects(name):
+    readings = CellReadings(data_file(name))
+    cycle_table, step_table = readings.cycle_table, readings.step_table
+    assert len(cycle_table) == len(readings.cycles)
+    rows = iter(step_table)
+    for index, cycle in enumerate(readings.cycles):
+        row = cycle_table[index]
+        for field, value in cycle.properties.items():
+            assert row[field] == value, field
+        assert row['n_steps'] == len(cycle.steps)
+        assert row['duration'] == pytest.approx(sum(
+            step.duration.total_seconds() for step in cycle.steps))
+        for step in cycle.steps:
+            step_row = next(rows)
+            assert step_row['cycle_index'] == index
+            assert step_row['label'] == step.label
+            assert step_row['duration'] == step.duration.total_seconds()
+            for field in ('cycle_id', 'step_id', 'capacity', 'energy',
+                          'voltage_start', 'voltage_end', 'record_start',
+                          'record_end'):
+                expected = step.parent_cycle_id if field == 'cycle_id' \
+                    else getattr(step, field)
+                assert step_row[field] == expected, field
+    assert next(rows, None) is None
+
+
+@pytest.fixture
+def charges(tmp_path):
+    return CellReadings(write_file(tmp_path / 'cell.txt', [
+        [(metrics.CHARGE, 60, 2), (metrics.DISCHARGE, 30, 2),
+         (metrics.DISCHARGE, 15, 1)],
+        [(metrics.CHARGE, 40, 3), ('Rest', 10, 1)],
+        [(metrics.DISCHARGE, 20, 1), (metrics.CHARGE, 80, 2)]]))
+
+
+def test_sum_by_cycle(charges):
+    cycle_table, step_table = charges.cycle_table, charges.step_table
+    assert np.array_equal(metrics.sum_by_cycle(cycle_table, step_table,
+                                               'duration'),
+                          cycle_table['duration'])
+    assert np.array_equal(metrics.sum_by_cycle(cycle_table, step_table,
+                                               'capacity', metrics.DISCHARGE),
+                          [3., np.nan, 1.], equal_nan=True)
+
+
+def test_efficiency(charges):
+    assert np.array_equal(charges.get_efficiency(),
+                          [45/60, np.nan, 20/80], equal_nan=True)
+    assert np.array_equal(charges.get_efficiency('inverse'),
+                          [60/45, np.nan, 80/20], equal_nan=True)
+    with pytest.raises(ValueError):
+        charges.get_efficiency('other')
+
+
+def test_capacity_metrics():
+    readings = CellReadings(data_file('20151125_CuHcF_1B.txt'))
+    charge = np.array([cycle.properties['charge_capacity_sp']
+                       for cycle in readings.cycles])
+    discharge = np.array([cycle.properties['discharge_capacity_sp']
+                          for cycle in readings.cycles])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        assert np.array_equal(readings.get_coulombic_efficiency(),
+                              100*discharge/charge, equal_nan=True)
+        assert np.array_equal(readings.get_capacity_fade(3),
+                              1 - discharge/discharge[3], equal_nan=True)
@@ -0,0 +1,138 @@
+import numpy as np
+import pytest
+
+from mtibattery import CellReadings, parser
+
+from helpers import FILES, assert_same_readings, data_file
+
+
+@pytest.fixture(scope='module', params=FILES)
+def python_readings(request):
+    return CellReadings(data_file(request.param), engine='python')
+
+
+def test_numpy_engine_matches_python(python_readings):
+    readings = CellReadings(python_readings.filename)
+    assert_same_readings(readings, python_readings)
+
+
+def test_chunk_boundaries(python_readings, monkeypatch):
+    #--- Small chunks split cycles, steps and lines
+    monkeypatch.setattr(parser, 'CHUNK_SIZE', 4099)
+    readings = CellReadings(python_readings.filename, mmap=True)
+    assert_same_readings(readings, python_readings)
+    lazy = CellReadings(python_readings.filename, lazy=True)
+    assert_same_readings(lazy, python_readings)
+
+
+def test_workers(python_readings):
+    readings = CellReadings(python_readings.filename, workers=3)
+    assert_same_readings(readings, python_readings)
+
+
+def test_record_values():
+    #--- Values of the first records of 20151125_CuHcF_1B.txt
+    readings = CellReadings(data_file('20151125_CuHcF_1B.txt'))
+    cycle = readings.cycles[0]
+    assert cycle.properties['cycle_id'] == 1
+    assert cycle.properties['midval_voltage'] == pytest.approx(0.1274)
+    step = cycle.steps[0]
+    assert step.label == 'Rest'
+    assert step.voltage_start == pytest.approx(0.2322)
+    assert step.duration.total_seconds() == 120
+    records = step.records
+    assert records['id'][:3].tolist() == [1, 2, 3]
+    assert records['rel_time'][:3].tolist() == [0, 5, 10]
+    np.testing.assert_allclose(records['volt'][:3], [0.2322, 0.2309, 0.2291])
+    assert records['realtime'][0] == np.datetime64('2015-11-25T11:43:07')
+
+
+def test_volt_dialect():
+    #--- CuNP.txt is written in V and decimal hours
+    readings = CellReadings(data_file('CuNP.txt'))
+    with open(data_file('CuNP.txt'), encoding='utf-8') as data:
+        lines = data.read().splitlines()
+    first = next(line for line in lines[3:] if line.startswith('\t\t'))
+    fields = first.split('\t')
+    records = readings.cycles[0].steps[0].records
+    assert records['id'][0] == int(fields[2])
+    assert records['rel_time'][0] == pytest.approx(float(fields[3])*3600)
+    assert records['volt'][0] == pytest.approx(float(fields[4]))
+
+
+@pytest.mark.parametrize('data', [
+    b'', b'\n', b'1\t\n', b'\t\t1\n', b'1\t\n\t1\n\t\t2\n\t\t3\n',
+    b'1\t\n\t1\n\t\t2\n\t', b'\t\t1\n\t\t2\n1\t\n', b'x\n\n\t\t\n1'])
+def test_split_headers(data, monkeypatch):
+    lines = data.split(b'\n')
+    if lines[-1] == b'':
+        lines = lines[:-1]
+    expected = [index for index, line in enumerate(lines)
+                if not line.startswith(b'\t\t')]
+    for window in (parser.SCAN_WINDOW, 3, 1):
+        monkeypatch.setattr(parser, 'SCAN_WINDOW', window)
+        starts, ends, kinds, positions, count = parser.split_headers(data)
+        assert count == len(lines)
+        assert positions.tolist() == expected
+        assert [data[start:end].rstrip(b'\n') for start, end
+                in zip(starts, ends)] == [lines[index] for index in expected]
+        assert kinds.tolist() == [int(lines[index].startswith(b'\t'))
+                                  for index in expected]
+
+
+def test_split_file_long_cycles(tmp_path):
+    #--- Two cycles of many records: cuts within a cycle are dropped
+    with open(data_file('20151125_CuHcF_1B.txt'), 'rb') as data:
+        lines = data.read().split(b'\n')
+    kinds = [parser.line_kind(line) for line in lines]
+    cycle = lines[kinds.index(parser.CYCLE, 3)]
+    step = lines[kinds.index(parser.STEP, 3)]
+    record = lines[kinds.index(parser.RECORD, 3)]
+    body = b'\n'.join([step] + [record]*20000) + b'\n'
+    target = str(tmp_path / 'long.txt')
+    with open(target, 'wb') as output:
+        output.write(b'\n'.join(lines[:3]) + b'\n')
+        first = output.tell()
+        output.write(cycle + b'\n' + body)
+        second = output.tell()
+        output.write(cycle + b'\n' + body)
+        size = output.tell()
+
+    headers, ranges = parser.split_file(target, 16)
+    assert ranges == [(first, second), (second, size)]
+    assert_same_readings(CellReadings(target, workers=3),
+                         CellReadings(target, engine='python'))
+
+
+def _edge_cases():
+    #--- Files made of the first lines of 20151125_CuHcF_1B.txt
+    with open(data_file('20151125_CuHcF_1B.txt'), 'rb') as data:
+        lines = data.read().split(b'\n')
+    kinds = [parser.line_kind(line) for line in lines]
+    second = kinds.index(parser.STEP, kinds.index(parser.STEP, 3) + 1)
+    cycle = kinds.index(parser.CYCLE, 4)
+    lines = lines[:cycle + 5]
+    join = lambda part: b'\n'.join(part) + b'\n'
+    return {
+        'headers_only': join(lines[:3]),
+        'no_final_newline': join(lines[:20]).rstrip(b'\r\n'),
+        'ends_with_cycle': join(lines[:cycle + 1]),
+        'ends_with_step': join(lines[:second + 1]),
+        'ends_with_step_no_newline': join(lines[:second + 1])[:-2],
+        'step_without_records': join(lines[:second + 1] + lines[cycle:]),
+    }
+
+
+@pytest.mark.parametrize('case', sorted(_edge_cases()))
+def test_engines_agree_on_edge_cases(tmp_path, case):
+    target = str(tmp_path / 'edge.txt')
+    with open(target, 'wb') as output:
+        output.write(_edge_cases()[case])
+    python = CellReadings(target, engine='python')
+    for options in ({}, {'lazy': True}, {'workers': 2}, {'mmap': True}):
+        assert_same_readings(CellReadings(target, **options), python)
+
+    n_lines = len(_edge_cases()[case].rstrip(b'\n').split(b'\n')) - 3
+    assert sum(len(cycle.steps) + 1 + sum(len(step.records['id'])
+                                         for step in cycle.steps)
+               for cycle in python.cycles) == n_lines
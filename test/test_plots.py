@@ -0,0 +1,122 @@
+import os
+
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+from matplotlib.collections import LineCollection
+from matplotlib.figure import Figure
+import numpy as np
+import pytest
+
+from mtibattery import CellReadings, render_many
+from mtibattery import report
+
+from helpers import data_file
+
+NAME = '20151125_CuHcF_1B.txt'
+
+
+@pytest.fixture(scope='module')
+def readings():
+    return CellReadings(data_file(NAME))
+
+
+@pytest.fixture
+def shown(monkeypatch):
+    calls = []
+    monkeypatch.setattr(plt, 'show', lambda: calls.append(True))
+    return calls
+
+
+def axes():
+    return Figure().add_subplot()
+
+
+@pytest.mark.parametrize('method, args', [
+    ('plot_voltage', ()), ('plot_spcapacity', ()), ('plot_efficiency', ()),
+    ('plot_voltage_delta', ('CC_DChg',))])
+def test_plot_on_axes(readings, shown, method, args):
+    figures = plt.get_fignums()
+    ax = axes()
+    artists = getattr(readings, method)(*args, ax=ax)
+    assert artists
+    assert all(artist.axes is ax for artist in artists)
+    assert shown == []
+    assert plt.get_fignums() == figures
+
+    getattr(readings, method)(*args, ax=axes(), show=True)
+    assert shown == [True]
+
+
+def test_plot_on_pyplot(readings, shown):
+    artists = readings.plot_efficiency()
+    assert shown == [True]
+    assert artists[0].axes is plt.gca()
+    plt.close('all')
+
+
+def test_plot_voltage_decimated(readings):
+    ax = axes()
+    line, = readings.plot_voltage(0, 20, ax=ax, points=10)
+    assert len(line.get_xdata()) <= 5*10 + 1
+    full, = readings.plot_voltage(0, 20, ax=ax, points=None)
+    steps = [step for cycle in readings.cycles[:20] for step in cycle.steps]
+    ids = np.concatenate([step.records['id'] for step in steps])
+    assert np.array_equal(full.get_xdata(), ids)
+    assert np.array_equal(full.get_ydata(), np.concatenate(
+        [step.records['volt'] for step in steps]))
+    assert np.isin(line.get_xdata(), ids).all()
+
+    #--- Series are decimated once per selection and resolution
+    cached = dict(readings._plots)
+    again, = readings.plot_voltage(0, 20, ax=ax, points=10)
+    assert list(readings._plots) == list(cached)
+    assert all(readings._plots[key] is cached[key] for key in cached)
+    assert np.array_equal(again.get_xdata(), line.get_xdata())
+
+
+def test_plot_spcapacity_collections(readings):
+    collections = readings.plot_spcapacity(0, 10, ax=axes())
+    assert all(isinstance(elem, LineCollection) for elem in collections)
+    colors = [tuple(elem.get_colors()[0]) for elem in collections]
+    assert len(set(colors)) == len(colors)
+    steps = [step for cycle in readings.cycles[:10] for step in cycle.steps
+             if step.record_end > step.record_start]
+    assert sum(len(elem.get_segments()) for elem in collections) \
+        == len(steps)
+
+
+def test_cycle_plot_voltage(readings, shown):
+    cycle = readings.cycles[1]
+    line, = cycle.plot_voltage('charge', ax=axes())
+    assert np.array_equal(line.get_ydata(),
+                          cycle.get_records('CC_Chg')['volt'])
+    assert shown == []
+    with pytest.raises(ValueError):
+        cycle.plot_voltage('rest', ax=axes())
+
+
+def test_render(readings, tmp_path):
+    written = report.render(readings, str(tmp_path / 'images'),
+                            formats=('png', 'svg'))
+    root = os.path.splitext(NAME)[0]
+    assert written == [
+        os.path.join(str(tmp_path / 'images'), '{}.{}.{}'.format(
+            root, name, format))
+        for name in ('voltage', 'spcapacity', 'efficiency')
+        for format in ('png', 'svg')]
+    assert all(os.path.getsize(name) for name in written)
+    with pytest.raises(ValueError):
+        report.render(readings, str(tmp_path), plots=['unknown'])
+
+
+def test_render_many(tmp_path):
+    paths = [data_file('CuNP.txt'), str(tmp_path / 'missing.txt')]
+    calls = []
+    images, errors = render_many(paths, str(tmp_path), workers=1,
+                                 plots=['efficiency'],
+                                 progress=lambda *args: calls.append(args))
+    assert list(images) == paths[:1]
+    assert os.path.exists(images[paths[0]][0])
+    assert list(errors) == paths[1:]
+    assert [call[:2] for call in calls] == [(1, 2), (2, 2)]
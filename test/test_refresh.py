@@ -0,0 +1,132 @@
+import os
+
+import numpy as np
+import pytest
+
+from mtibattery import CellReadings, Cycle, FileCache, Step, load_many, parser
+
+from helpers import assert_same_readings, data_file
+
+NAME = '20151125_CuHcF_1B.txt'
+
+
+def test_refresh_appended_pieces(tmp_path):
+    with open(data_file(NAME), 'rb') as data:
+        content = data.read()
+    target = os.path.join(str(tmp_path), NAME)
+
+    #--- Start with a third of the file, cut within a line
+    cut = len(content)//3 + 7
+    with open(target, 'wb') as output:
+        output.write(content[:cut])
+    readings = CellReadings(target)
+    complete = content.rfind(b'\n', 0, cut) + 1
+    assert readings.refresh() == []
+
+    #--- Append the rest in pieces, each cut within a line
+    created = []
+    for end in (cut + 1, len(content)//2 + 3, len(content)):
+        with open(target, 'ab') as output:
+            output.write(content[cut:end])
+        cut = end
+        created.extend(readings.refresh())
+
+    assert_same_readings(readings, CellReadings(data_file(NAME)))
+    assert all(isinstance(obj, (Cycle, Step)) for obj in created)
+    cycles = [obj for obj in created if isinstance(obj, Cycle)]
+    assert len(cycles) == sum(1 for line in
+                              content[complete:].split(b'\n')[:-1]
+                              if not line.startswith(b'\t'))
+
+
+def test_refresh_extends_last_step(tmp_path):
+    with open(data_file(NAME), 'rb') as data:
+        lines = data.read().split(b'\n')
+    target = os.path.join(str(tmp_path), NAME)
+
+    #--- Cut within the records of a step
+    with open(target, 'wb') as output:
+        output.write(b'\n'.join(lines[:10]) + b'\n')
+    readings = CellReadings(target)
+    step = readings.cycles[-1].steps[-1]
+    before = len(step.records['id'])
+
+    with open(target, 'ab') as output:
+        output.write(b'\n'.join(lines[10:12]) + b'\n')
+    new = readings.refresh()
+    assert new == [step]
+    assert len(step.records['id']) == before + 2
+    assert np.all(np.diff(step.records['id']) == 1)
+
+
+@pytest.mark.parametrize('options', [
+    {}, {'engine': 'python'}, {'lazy': True}, {'workers': 2},
+    {'mmap': True}])
+def test_last_line_without_newline(tmp_path, options):
+    #--- A finished export without final newline keeps its last record
+    with open(data_file(NAME), 'rb') as data:
+        content = data.read()
+    target = os.path.join(str(tmp_path), NAME)
+    with open(target, 'wb') as output:
+        output.write(content.rstrip(b'\r\n'))
+    readings = CellReadings(target, **options)
+    assert_same_readings(readings, CellReadings(data_file(NAME)))
+
+
+def _line_end(content, kind):
+    #--- Offset of the '\r\n' ending a line of some kind, past the middle
+    offset = 0
+    lines = content.split(b'\n')
+    for index, line in enumerate(lines):
+        if index > len(lines)//2 and parser.line_kind(line) == kind:
+            return offset + len(line) - 1
+        offset += len(line) + 1
+
+
+@pytest.mark.parametrize('kind', [parser.RECORD, parser.STEP, parser.CYCLE])
+@pytest.mark.parametrize('options', [
+    {}, {'engine': 'python'}, {'lazy': True}, {'mmap': True}])
+def test_refresh_completes_last_line(tmp_path, kind, options):
+    #--- The last line parsed by the load is parsed again once complete
+    with open(data_file(NAME), 'rb') as data:
+        content = data.read()
+    cut = _line_end(content, kind)
+    target = os.path.join(str(tmp_path), NAME)
+    with open(target, 'wb') as output:
+        output.write(content[:cut])
+
+    readings = CellReadings(target, **options)
+    assert readings._tail == kind
+    assert readings.refresh() == []
+    with open(target, 'ab') as output:
+        output.write(content[cut:])
+    new = readings.refresh()
+    assert new
+    assert_same_readings(readings, CellReadings(data_file(NAME)))
+
+
+@pytest.mark.parametrize('engine', ['numpy', 'python'])
+def test_refresh_from_cache(tmp_path, engine):
+    #--- Readings loaded from the cache refresh, lazy or not
+    with open(data_file(NAME), 'rb') as data:
+        content = data.read()
+    cut = content.index(b'\n', len(content)//2) + 1
+    target = os.path.join(str(tmp_path), NAME)
+    with open(target, 'wb') as output:
+        output.write(content[:cut])
+    cache = FileCache(str(tmp_path / 'cache'))
+    CellReadings(target, engine=engine, cache=cache)
+
+    loaded = [CellReadings(target, cache=cache),
+              CellReadings(target, cache=cache, lazy=True),
+              CellReadings.from_cache(target, cache, lazy=True),
+              load_many([target], workers=1, summary=True,
+                        cache=cache)[0][0]]
+    assert all(readings._position == cut for readings in loaded)
+
+    with open(target, 'ab') as output:
+        output.write(content[cut:])
+    complete = CellReadings(data_file(NAME))
+    for readings in loaded:
+        assert readings.refresh()
+        assert_same_readings(readings, complete)
@@ -0,0 +1,90 @@
+import numpy as np
+import pytest
+
+from mtibattery import CellReadings
+
+from helpers import write_file
+
+#--- Five cycles of a charge and a discharge, cycle n has n+1 records a step
+CYCLES = [[('CC_Chg', 60, count), ('CC_DChg', 60, count)]
+          for count in range(2, 7)]
+
+
+@pytest.fixture(scope='module')
+def filename(tmp_path_factory):
+    return write_file(tmp_path_factory.mktemp('select') / 'cycles.txt',
+                      CYCLES)
+
+
+@pytest.fixture(scope='module')
+def readings(filename):
+    return CellReadings(filename)
+
+
+def _ids(steps):
+    return [(step.parent_cycle_id, step.label) for step in steps]
+
+
+def test_select_steps_by_cycle(readings):
+    assert _ids(readings.select_steps(slice(2, 4))) == [
+        (2, 'CC_Chg'), (2, 'CC_DChg'), (3, 'CC_Chg'), (3, 'CC_DChg')]
+    assert _ids(readings.select_steps(4)) == [(4, 'CC_Chg'), (4, 'CC_DChg')]
+    assert _ids(readings.select_steps([5, 1], 'CC_DChg')) == [
+        (5, 'CC_DChg'), (1, 'CC_DChg')]
+    assert len(readings.select_steps()) == 10
+
+
+def test_select_every_nth_cycle(readings):
+    steps = readings.select_steps(slice(None, None, 2), ['CC_DChg'])
+    assert _ids(steps) == [(1, 'CC_DChg'), (3, 'CC_DChg'), (5, 'CC_DChg')]
+    steps = readings.select_steps(slice(2, None, 3), 'CC_Chg')
+    assert _ids(steps) == [(2, 'CC_Chg'), (5, 'CC_Chg')]
+
+
+def test_select_records(readings):
+    records = readings.select(2, 'CC_DChg')
+    assert list(records) == [name for name, _ in readings.record_columns]
+    step = readings.cycle(2).steps[1]
+    assert records['id'].tolist() == step.records['id'].tolist()
+    assert readings.select(slice(1, 3), columns=['volt'])['volt'].tolist() \
+        == pytest.approx([0.1, 0.2]*2 + [0.1, 0.2, 0.3]*2)
+
+
+def test_select_where(readings):
+    records = readings.select(step_type='CC_DChg', columns=['id'],
+                              where=lambda records: records['volt'] > 0.45)
+    assert list(records) == ['id']
+    expected = [record for cycle in readings.cycles
+                for step in cycle.steps if step.label == 'CC_DChg'
+                for record, volt in zip(step.records['id'],
+                                        step.records['volt'])
+                if volt > 0.45]
+    assert records['id'].tolist() == expected
+    assert len(expected) == 3
+
+
+def test_select_views_and_copies(readings):
+    volt = readings.store.columns['volt']
+    contiguous = readings.select(slice(2, 4), columns=['volt'])['volt']
+    assert np.shares_memory(contiguous, volt)
+    scattered = readings.select(step_type='CC_Chg', columns=['volt'])['volt']
+    assert not np.shares_memory(scattered, volt)
+    where = readings.select(3, where=lambda records: records['volt'] > 0)
+    assert not np.shares_memory(where['volt'], volt)
+
+
+def test_select_missing(readings):
+    with pytest.raises(KeyError):
+        readings.select_steps([1, 9])
+    with pytest.raises(KeyError):
+        readings.select(1, columns=['current'])
+    assert readings.select(step_type='Rest')['id'].tolist() == []
+
+
+def test_lazy_select_parses_selected_runs(filename):
+    readings = CellReadings(filename, lazy=True)
+    records = readings.select(4, 'CC_DChg', columns=['id'])
+    # every step has a run of records, in file order
+    assert list(readings.store._runs) == [7]
+    assert records['id'].tolist() == \
+        CellReadings(filename).select(4, 'CC_DChg')['id'].tolist()
@@ -0,0 +1,21 @@
+import os
+
+import pytest
+
+from mtibattery import CellReadings
+
+from helpers import data_file
+
+
+@pytest.mark.parametrize('name', ['20151125_CuHcF_1B.txt', 'CuNP.txt'])
+def test_engines_count_the_same_bytes(name):
+    filename = data_file(name)
+    counters = [CellReadings(filename, stats=True, **options).stats.counters
+                for options in ({}, {'engine': 'python'}, {'lazy': True})]
+    for other in counters[1:]:
+        for key in ('bytes', 'lines', 'records', 'cycles', 'steps'):
+            assert other[key] == counters[0][key], key
+
+    with open(filename, 'rb') as data:
+        header = sum(len(data.readline()) for i in range(3))
+    assert counters[0]['bytes'] == os.path.getsize(filename) - header
@@ -0,0 +1,69 @@
+import datetime as dt
+
+import numpy as np
+import pytest
+
+from mtibattery import CellReadings
+
+from helpers import write_file
+
+#--- Cycles with several steps of the same type
+CYCLES = [[('Rest', 60, 3), ('CC_Chg', 100, 4), ('Rest', 30, 2),
+           ('CC_Chg', 50, 3), ('CC_DChg', 120, 5)],
+          [('CC_Chg', 80, 2), ('CC_DChg', 40, 2), ('CC_DChg', 40, 1)]]
+
+
+@pytest.fixture(scope='module', params=['numpy', 'python'])
+def readings(request, tmp_path_factory):
+    path = tmp_path_factory.mktemp('steps') / 'repeated.txt'
+    return CellReadings(write_file(path, CYCLES), engine=request.param)
+
+
+def test_steps_in_file_order(readings):
+    for cycle, steps in zip(readings.cycles, CYCLES):
+        assert [step.label for step in cycle.steps] == \
+            [label for label, _, _ in steps]
+    assert [step.step_id for cycle in readings.cycles
+            for step in cycle.steps] == list(range(1, 9))
+
+
+def test_steps_by_label(readings):
+    cycle = readings.cycles[0]
+    assert list(cycle.steps_by_label) == ['Rest', 'CC_Chg', 'CC_DChg']
+    for label, steps in cycle.steps_by_label.items():
+        assert steps == [step for step in cycle.steps if step.label == label]
+    assert cycle.get_steps('Rest') == [cycle.steps[0], cycle.steps[2]]
+    with pytest.raises(KeyError):
+        cycle.get_steps('CV_Chg')
+
+
+def test_records_and_durations(readings):
+    cycle = readings.cycles[0]
+    assert cycle.get_records('CC_Chg')['id'].tolist() == \
+        [4, 5, 6, 7, 10, 11, 12]
+    assert cycle.get_records('Rest')['volt'].tolist() == \
+        pytest.approx([0.1, 0.2, 0.3, 0.1, 0.2])
+    assert cycle.get_records()['id'].tolist() == list(range(1, 18))
+    assert cycle.get_duration('CC_Chg') == dt.timedelta(seconds=150)
+    assert cycle.get_duration() == dt.timedelta(seconds=360)
+    assert readings.get_duration() == dt.timedelta(seconds=520)
+
+
+def test_step_table(readings):
+    table = readings.step_table
+    assert table['label'].tolist() == [label for steps in CYCLES
+                                       for label, _, _ in steps]
+    assert table['cycle_id'].tolist() == [1]*5 + [2]*3
+    assert table['duration'].tolist() == [duration for steps in CYCLES
+                                          for _, duration, _ in steps]
+    counts = [count for steps in CYCLES for _, _, count in steps]
+    assert np.diff(table['record_start']).tolist() == counts[:-1]
+    assert (table['record_end'] - table['record_start']).tolist() == counts
+    assert readings.cycle_table['n_steps'].tolist() == [5, 3]
+
+
+def test_efficiency(readings):
+    assert readings.cycles[0].get_efficiency() == pytest.approx(120/150)
+    assert readings.cycles[1].get_efficiency('inverse') == \
+        pytest.approx(80/80)
+    np.testing.assert_allclose(readings.get_efficiency(), [120/150, 1.0])
@@ -0,0 +1,30 @@
+import os
+
+import numpy as np
+
+from mtibattery import CellReadings
+from mtibattery.store import RecordStore
+
+from helpers import assert_same_readings, data_file
+
+
+def test_shared_mmap_directory(tmp_path):
+    #--- Readings memory mapped in the same directory keep their own files
+    directory = str(tmp_path)
+    first = CellReadings(data_file('20151125_CuHcF_1B.txt'), mmap=directory)
+    second = CellReadings(data_file('CuNP.txt'), mmap=directory)
+    assert first.store.directory != second.store.directory
+    assert isinstance(first.store.columns['volt'], np.memmap)
+    assert_same_readings(first,
+                         CellReadings(data_file('20151125_CuHcF_1B.txt')))
+    assert_same_readings(second, CellReadings(data_file('CuNP.txt')))
+
+
+def test_mmap_directory_removed(tmp_path):
+    store = RecordStore(str(tmp_path))
+    store.append({'id': np.arange(3)})
+    store.close()
+    assert store.columns['id'].tolist() == [0, 1, 2]
+    assert len(os.listdir(str(tmp_path))) == 1
+    del store
+    assert os.listdir(str(tmp_path)) == []